@@ -0,0 +1,210 @@
+"""Columnar snapshots of the library for analytics (Arrow IPC and Parquet).
+
+The JSON API is shaped for the UI: one object per item, metadata as a nested
+dict, tags as objects. For questions like "average rating by genre per year"
+a notebook would have to page through it and parse every item. A snapshot
+instead holds one typed column per field:
+
+    id, title, category_id, category (dictionary), status, rating, notes,
+    cover_image_url, date_started, date_finished, created_at, updated_at,
+    owned_at, rated_at (timestamps), tags (list<string>),
+    one column per known metadata field — strings, ``year``/``runtime`` as
+    integers, ``cast`` as list<string> — and the raw ``metadata`` JSON for
+    any other keys.
+
+Rows are streamed from SQLite in ``BATCH_ROWS`` record batches, so memory
+stays bounded by one batch whatever the library size. The Arrow file is
+written uncompressed: ``pyarrow.ipc.open_file(pyarrow.memory_map(path))``
+(or DuckDB, Polars, ...) then maps it without copying or decoding anything.
+Parquet is zstd-compressed and smaller, for copying elsewhere.
+
+Snapshots are cached in the library's ``exports`` folder (``data/exports``
+for the default library) under the change_log sequence number they
+reflect; every write logs a change, so a request after any write builds a
+new file and one without reuses the last.
+
+pyarrow is an optional dependency: without it ``AnalyticsUnavailable`` is
+raised.
+"""
+import json
+import os
+import threading
+from pathlib import Path
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .database import current_library
+
+BATCH_ROWS = 8192
+FORMATS = {"arrow": ".arrow", "parquet": ".parquet"}
+
+# Metadata keys (see frontend/js/components/modal.js) and their column kind.
+METADATA_FIELDS = {
+    "author": "string", "publisher": "string", "format": "string", "isbn": "string",
+    "director": "string", "studio": "string", "developer": "string", "platform": "string",
+    "artist": "string", "label": "string", "label_code": "string",
+    "genre": "string", "sub_genre": "string",
+    "year": "int", "runtime": "int", "cast": "list",
+}
+
+_ITEM_COLUMNS = ("id", "title", "category_id", "status", "rating", "notes", "cover_image_url",
+                 "date_started", "date_finished")
+_TIMESTAMP_COLUMNS = ("created_at", "updated_at", "owned_at", "rated_at")
+
+_ROWS_SQL = text("""
+    SELECT m.id, m.title, m.category_id, m.status, m.rating, m.notes, m.cover_image_url,
+           m.date_started, m.date_finished, m.created_at, m.updated_at, m.owned_at, m.rated_at,
+           m.metadata,
+           (SELECT json_group_array(t.name) FROM media_tags mt JOIN tags t ON t.id = mt.tag_id
+             WHERE mt.media_id = m.id) AS tags
+    FROM media_items m ORDER BY m.id
+""")
+
+# One snapshot build per library and format at a time; concurrent requests
+# wait and then find the file already written.
+_locks: dict[tuple[str, str], threading.Lock] = {}
+
+
+class AnalyticsUnavailable(RuntimeError):
+    """pyarrow is not installed."""
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as e:
+        raise AnalyticsUnavailable(
+            "Analytics export needs pyarrow: pip install pyarrow") from e
+    return pyarrow
+
+
+def _schema(pa):
+    kinds = {"string": pa.string(), "int": pa.int32(), "list": pa.list_(pa.string())}
+    return pa.schema([
+        ("id", pa.int64()), ("title", pa.string()), ("category_id", pa.int32()),
+        ("category", pa.dictionary(pa.int32(), pa.string())),
+        ("status", pa.string()), ("rating", pa.string()), ("notes", pa.string()),
+        ("cover_image_url", pa.string()), ("date_started", pa.string()), ("date_finished", pa.string()),
+        *[(name, pa.timestamp("us")) for name in _TIMESTAMP_COLUMNS],
+        ("tags", pa.list_(pa.string())),
+        *[(key, kinds[kind]) for key, kind in METADATA_FIELDS.items()],
+        ("metadata", pa.string()),
+    ])
+
+
+def _field(value, kind):
+    """Coerce one metadata value to its column kind; unusable values become null."""
+    if value is None or value == "" or value == []:
+        return None
+    if kind == "int":
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+    if kind == "list":
+        return [str(v) for v in value] if isinstance(value, list) else [str(value)]
+    return ", ".join(map(str, value)) if isinstance(value, list) else str(value)
+
+
+def _batch(pa, schema, rows, category_index, category_names):
+    # Transposed once, so plain columns go to Arrow without per-row work;
+    # positions follow _ROWS_SQL.
+    plain = _ITEM_COLUMNS + _TIMESTAMP_COLUMNS
+    columns = dict(zip(plain + ("metadata", "tags"), zip(*rows)))
+    columns["tags"] = [json.loads(tags) if tags else [] for tags in columns["tags"]]
+
+    fields = {key: [] for key in METADATA_FIELDS}
+    for raw in columns["metadata"]:
+        try:
+            metadata = json.loads(raw) if raw else {}
+        except ValueError:
+            metadata = {}
+        if not isinstance(metadata, dict):
+            metadata = {}
+        for key, kind in METADATA_FIELDS.items():
+            fields[key].append(_field(metadata.get(key), kind))
+    columns.update(fields)
+
+    # Every batch shares the one category dictionary, which the IPC file
+    # format requires (it cannot replace a dictionary between batches).
+    columns["category"] = pa.DictionaryArray.from_arrays(
+        pa.array([category_index.get(c) for c in columns["category_id"]], pa.int32()),
+        pa.array(category_names, pa.string()))
+    arrays = []
+    for field in schema:
+        values = columns[field.name]
+        if field.name in _TIMESTAMP_COLUMNS:
+            # SQLite stores DateTime as ISO text; Arrow parses it natively.
+            arrays.append(pa.array(values, pa.string()).cast(field.type))
+        elif isinstance(values, pa.Array):
+            arrays.append(values)
+        else:
+            arrays.append(pa.array(values, field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _current_seq(db: Session) -> int:
+    return db.execute(text("SELECT COALESCE(MAX(seq), 0) FROM change_log")).scalar()
+
+
+def _export_dir() -> Path:
+    return current_library().data_dir / "exports"
+
+
+def _path(fmt: str, seq: int) -> Path:
+    return _export_dir() / f"library-{seq}{FORMATS[fmt]}"
+
+
+def _write(db: Session, fmt: str) -> Path:
+    """Stream every item into a new snapshot file; returns its path."""
+    pa = _pyarrow()
+    # A dedicated connection in one read transaction, so the categories, the
+    # sequence number and every batch come from the same snapshot.
+    with Session(bind=db.get_bind()) as snap:
+        snap.execute(text("BEGIN"))
+        seq = _current_seq(snap)
+        categories = snap.execute(text("SELECT id, name FROM categories ORDER BY id")).all()
+        category_names = [name for _, name in categories]
+        category_index = {id_: i for i, (id_, _) in enumerate(categories)}
+        schema = _schema(pa)
+
+        dest = _path(fmt, seq)
+        partial = dest.with_name(f"{dest.name}.{os.getpid()}.{threading.get_ident()}.partial")
+        if fmt == "arrow":
+            writer = pa.ipc.new_file(str(partial), schema)
+        else:
+            writer = pa.parquet.ParquetWriter(str(partial), schema, compression="zstd")
+        try:
+            for rows in snap.execute(_ROWS_SQL).partitions(BATCH_ROWS):
+                writer.write_batch(_batch(pa, schema, rows, category_index, category_names))
+        finally:
+            writer.close()
+        snap.rollback()
+    partial.replace(dest)
+    return dest
+
+
+def snapshot(db: Session, fmt: str = "arrow") -> Path:
+    """Path of an up-to-date snapshot in ``fmt``, building it if needed."""
+    _pyarrow()
+    path = _path(fmt, _current_seq(db))
+    if path.exists():
+        return path
+    with _locks.setdefault((current_library().name, fmt), threading.Lock()):
+        path = _path(fmt, _current_seq(db))
+        if path.exists():
+            return path
+        _export_dir().mkdir(parents=True, exist_ok=True)
+        # Named after the seq read inside the snapshot transaction, which is
+        # newer than the one just checked if a write landed in between.
+        path = _write(db, fmt)
+        for old in _export_dir().glob(f"library-*{FORMATS[fmt]}"):
+            if old != path:
+                try:
+                    old.unlink()
+                except OSError:
+                    pass  # still open elsewhere (Windows); removed next time
+        return path
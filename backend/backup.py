@@ -0,0 +1,251 @@
+"""Online backups of the library, and restoring them.
+
+Copying media_tracker.db while the server runs is unsafe: recent commits may
+still live only in the -wal file, and a copy taken mid-checkpoint can be torn.
+Backups therefore go through SQLite's online backup API, which copies the
+database ``PAGES_PER_STEP`` pages at a time. Between steps the source is
+unlocked, so writers are held up for one step at most rather than for the
+whole copy (if a write lands mid-backup, SQLite restarts the copy so the
+snapshot stays consistent).
+
+The snapshot is integrity-checked and then packed with the cover images it
+references into one .tar.gz:
+
+    manifest.json        created_at, schema version, counts, sha256 of each file
+    media_tracker.db     the snapshot
+    uploads/<file>       every cover referenced by the snapshot
+
+Restoring verifies an archive completely — checksums, integrity check,
+schema version — before anything in the data directory is touched, keeps a
+backup of the current library, and writes the database through the backup
+API as well so an existing WAL cannot leave stale pages behind.
+"""
+import hashlib
+import io
+import json
+import shutil
+import sqlite3
+import tarfile
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from .database import SCHEMA_VERSION, Library, current_library
+
+PAGES_PER_STEP = 1024
+
+# One backup at a time; a second request gets BackupBusy instead of
+# doubling the I/O.
+_lock = threading.Lock()
+
+
+class BackupBusy(RuntimeError):
+    pass
+
+
+class BackupError(RuntimeError):
+    """The archive is unusable: corrupt, incomplete or from a newer version."""
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _copy_database(source: Path, target: Path, pages: int = PAGES_PER_STEP) -> int:
+    """Copy ``source`` into ``target`` with the online backup API; returns restarts."""
+    restarts = 0
+    remaining_before = None
+
+    def progress(status, remaining, total):
+        nonlocal restarts, remaining_before
+        # The remaining count only goes up when a concurrent write made
+        # SQLite start the copy over.
+        if remaining_before is not None and remaining > remaining_before:
+            restarts += 1
+        remaining_before = remaining
+
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst, pages=pages, progress=progress)
+    finally:
+        dst.close()
+        src.close()
+    return restarts
+
+
+def _check_database(path: Path) -> dict:
+    """Integrity-check a database file; returns its schema version and item count."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        if result != "ok":
+            raise BackupError(f"database integrity check failed: {result}")
+        return {
+            "schema_version": conn.execute("PRAGMA user_version").fetchone()[0],
+            "items": conn.execute("SELECT COUNT(*) FROM media_items").fetchone()[0],
+        }
+    finally:
+        conn.close()
+
+
+def _referenced_uploads(db_path: Path) -> list[str]:
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute(
+            "SELECT DISTINCT cover_image_url FROM media_items WHERE cover_image_url LIKE '/uploads/%'"
+        ).fetchall()
+    finally:
+        conn.close()
+    names = {row[0].removeprefix("/uploads/") for row in rows}
+    # Only plain file names; anything else was never written by the upload endpoint.
+    return sorted(n for n in names if n and "/" not in n and "\\" not in n and n not in (".", ".."))
+
+
+def backup_dir(library: Library) -> Path:
+    return library.data_dir / "backups"
+
+
+def create_backup(dest: Optional[Path] = None, library: Optional[Library] = None) -> dict:
+    """Write a backup archive of the live library; returns its manifest plus path and timings.
+
+    ``library`` defaults to the current one; ``dest`` to a timestamped file
+    in its ``backups`` folder.
+    """
+    library = library or current_library()
+    if not _lock.acquire(blocking=False):
+        raise BackupBusy("a backup is already running")
+    try:
+        started = time.perf_counter()
+        created = datetime.utcnow()
+        if dest is None:
+            dest = backup_dir(library) / f"media-tracker-{created:%Y%m%d-%H%M%S}.tar.gz"
+        dest = Path(dest)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+
+        with tempfile.TemporaryDirectory(prefix="media-tracker-backup-") as tmp:
+            snapshot = Path(tmp) / "media_tracker.db"
+            restarts = _copy_database(library.db_path, snapshot)
+            copied_at = time.perf_counter()
+            info = _check_database(snapshot)
+
+            uploads, missing = {}, 0
+            for name in _referenced_uploads(snapshot):
+                path = library.uploads_dir / name
+                if path.is_file():
+                    uploads[name] = _sha256(path)
+                else:
+                    missing += 1  # referenced, but already gone before the backup
+
+            manifest = {
+                "format": 1,
+                "created_at": created.isoformat(timespec="seconds") + "Z",
+                "schema_version": info["schema_version"],
+                "items": info["items"],
+                "database_sha256": _sha256(snapshot),
+                "uploads": uploads,
+                "missing_uploads": missing,
+            }
+
+            # Written under a temporary name and renamed, so a half-written
+            # archive never looks like a backup.
+            partial = dest.with_name(dest.name + ".partial")
+            with tarfile.open(partial, "w:gz", compresslevel=6) as tar:
+                data = json.dumps(manifest, indent=2).encode()
+                entry = tarfile.TarInfo("manifest.json")
+                entry.size, entry.mtime = len(data), int(time.time())
+                tar.addfile(entry, io.BytesIO(data))
+                tar.add(snapshot, arcname="media_tracker.db")
+                for name in uploads:
+                    tar.add(library.uploads_dir / name, arcname=f"uploads/{name}")
+            partial.replace(dest)
+
+        return {
+            **manifest,
+            "path": str(dest),
+            "size_bytes": dest.stat().st_size,
+            "copy_restarts": restarts,
+            "copy_ms": round((copied_at - started) * 1000, 1),
+            "total_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+    finally:
+        _lock.release()
+
+
+def _extract(archive: Path, target: Path) -> dict:
+    """Unpack and fully verify ``archive`` into ``target``; returns the manifest."""
+    try:
+        with tarfile.open(archive, "r:gz") as tar:
+            members = {m.name: m for m in tar.getmembers()}
+            db_member = members.get("media_tracker.db")
+            if "manifest.json" not in members or db_member is None or not db_member.isfile():
+                raise BackupError("not a Media Tracker backup (manifest or database missing)")
+            manifest = json.load(tar.extractfile(members["manifest.json"]))
+            if not isinstance(manifest, dict) or not isinstance(manifest.get("uploads"), dict):
+                raise BackupError("malformed manifest")
+            (target / "uploads").mkdir()
+            # Only the expected, plain-file members are extracted, so names
+            # like "../x" or links in a crafted archive are never written.
+            tar.extract(db_member, target, filter="data")
+            for name in manifest.get("uploads", {}):
+                member = members.get(f"uploads/{name}")
+                if member is None or "/" in name or name in (".", "..") or not member.isfile():
+                    raise BackupError(f"upload {name} is missing from the archive")
+                tar.extract(member, target, filter="data")
+    except (tarfile.TarError, OSError, EOFError, json.JSONDecodeError) as e:
+        raise BackupError(f"cannot read archive: {e}") from e
+
+    db = target / "media_tracker.db"
+    if _sha256(db) != manifest.get("database_sha256"):
+        raise BackupError("database checksum does not match the manifest")
+    for name, digest in manifest["uploads"].items():
+        if _sha256(target / "uploads" / name) != digest:
+            raise BackupError(f"checksum mismatch for upload {name}")
+    info = _check_database(db)
+    if info["schema_version"] > SCHEMA_VERSION:
+        raise BackupError(f"backup is from a newer version (schema {info['schema_version']}, "
+                          f"this version understands up to {SCHEMA_VERSION})")
+    return manifest
+
+
+def verify_backup(archive: Path) -> dict:
+    """Check an archive without restoring it; raises BackupError if unusable."""
+    with tempfile.TemporaryDirectory(prefix="media-tracker-verify-") as tmp:
+        return _extract(Path(archive), Path(tmp))
+
+
+def restore_backup(archive: Path, keep_current: bool = True, library: Optional[Library] = None) -> dict:
+    """Replace the library (default: the current one) with the contents of ``archive``.
+
+    The server must not be running. The archive is verified in full first;
+    with ``keep_current`` the existing library is backed up before it is
+    overwritten. Uploads from the archive are added to the uploads folder —
+    covers the restored library no longer references are cleaned up by the
+    orphan purge at the next start.
+    """
+    library = library or current_library()
+    with tempfile.TemporaryDirectory(prefix="media-tracker-restore-") as tmp:
+        tmp = Path(tmp)
+        manifest = _extract(Path(archive), tmp)
+
+        previous = None
+        if keep_current and library.db_path.exists():
+            name = f"pre-restore-{datetime.utcnow():%Y%m%d-%H%M%S}.tar.gz"
+            previous = create_backup(backup_dir(library) / name, library)["path"]
+
+        library.uploads_dir.mkdir(parents=True, exist_ok=True)
+        for name in manifest["uploads"]:
+            shutil.copy2(tmp / "uploads" / name, library.uploads_dir / name)
+        # Through the backup API rather than a file copy: it goes through
+        # SQLite's locking and WAL, so no stale -wal pages survive.
+        _copy_database(tmp / "media_tracker.db", library.db_path)
+
+    info = _check_database(library.db_path)
+    return {**manifest, "restored_items": info["items"], "previous_library_backup": previous}
@@ -0,0 +1,242 @@
+"""Cross-worker change feed built on the change_log table.
+
+Every committed write appends a change_log row (see ``crud._log_change``). A
+``ChangeFeed`` tails that table and hands new rows to its listeners — the SSE
+broker, and any in-process cache that needs invalidating. Because the rows
+are read back from the database rather than passed around in memory, every
+worker process sees every change, whichever worker made it. That is what
+keeps per-process state coherent under ``run.py --workers N``.
+
+A feed is polled from two places:
+- right after each local commit (a session ``after_commit`` hook), so changes
+  made by this process are delivered immediately;
+- by ``watch()``, a background task started from ``lifespan``, which checks
+  ``PRAGMA data_version`` every POLL_INTERVAL seconds. The pragma's value
+  only moves when some *other* connection commits, so an idle check costs a
+  single pragma and no query.
+"""
+import asyncio
+import json
+import threading
+from datetime import datetime
+from typing import Callable, NamedTuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+POLL_INTERVAL = 0.5
+
+
+class Change(NamedTuple):
+    seq: int
+    entity: str
+    entity_id: int
+    op: str
+    payload: dict
+    changed_at: datetime | None
+
+
+Listener = Callable[[list[Change]], None]
+
+
+class ChangeFeed:
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self._lock = threading.Lock()
+        self._listeners: list[Listener] = []
+        # A dedicated DBAPI connection: holding it keeps PRAGMA data_version
+        # meaningful between checks, and raw cursors bypass the SQLAlchemy
+        # statement hooks so polling never shows up in metrics or the slow log.
+        self._conn = engine.raw_connection()
+        cur = self._conn.cursor()
+        try:
+            self._data_version = cur.execute("PRAGMA data_version").fetchone()[0]
+            # Start at the current end of the log: the feed delivers changes
+            # made from now on, not history.
+            self.last_seq = cur.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+        finally:
+            cur.close()
+        # The first seq this feed is guaranteed to have delivered after.
+        self.start_seq = self.last_seq
+
+    def listen(self, fn: Listener) -> None:
+        with self._lock:
+            self._listeners.append(fn)
+
+    def poll(self) -> list[Change]:
+        """Deliver change_log rows committed since the last poll."""
+        with self._lock:
+            cur = self._conn.cursor()
+            try:
+                rows = cur.execute(
+                    "SELECT seq, entity, entity_id, op, payload, changed_at "
+                    "FROM change_log WHERE seq > ? ORDER BY seq",
+                    (self.last_seq,),
+                ).fetchall()
+                # Each SELECT on a pysqlite connection in autocommit mode is
+                # its own read transaction, so the next poll sees new commits.
+            finally:
+                cur.close()
+            if not rows:
+                return []
+            changes = [
+                Change(seq, entity, entity_id, op, json.loads(payload) if payload else {},
+                       datetime.fromisoformat(changed_at) if isinstance(changed_at, str) else changed_at)
+                for seq, entity, entity_id, op, payload, changed_at in rows
+            ]
+            self.last_seq = changes[-1].seq
+            # Listeners run under the lock so every listener sees changes
+            # exactly once and in seq order, whichever thread polled.
+            for fn in self._listeners:
+                fn(changes)
+            return changes
+
+    def check(self) -> list[Change]:
+        """Poll only if another connection has committed since the last check."""
+        with self._lock:
+            cur = self._conn.cursor()
+            try:
+                version = cur.execute("PRAGMA data_version").fetchone()[0]
+            finally:
+                cur.close()
+            if version == self._data_version:
+                return []
+            self._data_version = version
+        return self.poll()
+
+    def reconnect(self) -> list[Change]:
+        """Move to a fresh connection, then poll.
+
+        For an engine whose database was replaced by a newer copy (see
+        replica.py): the old connection would keep reading the old one.
+        """
+        with self._lock:
+            old, self._conn = self._conn, self.engine.raw_connection()
+            cur = self._conn.cursor()
+            try:
+                self._data_version = cur.execute("PRAGMA data_version").fetchone()[0]
+            finally:
+                cur.close()
+            old.close()
+        return self.poll()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class DirtySet:
+    """Listener that records which ids of some entities changed.
+
+    For in-memory indexes that refresh lazily: the listener only notes ids,
+    and the index re-reads those rows the next time it is used (``take()``).
+    Nothing is recorded until ``activate()``, so an index that is never
+    loaded costs nothing.
+    """
+
+    def __init__(self, *entities: str):
+        self._entities = entities
+        self._lock = threading.Lock()
+        self.active = False
+        self._ids: dict[str, set[int]] = {e: set() for e in entities}
+
+    def __call__(self, changes: list[Change]) -> None:
+        with self._lock:
+            if not self.active:
+                return
+            for c in changes:
+                ids = self._ids.get(c.entity)
+                if ids is not None:
+                    ids.add(c.entity_id)
+
+    def activate(self) -> None:
+        """Start recording, discarding anything noted so far.
+
+        Call this *before* loading the index: a change committed before the
+        load is already in the loaded rows, and one committed during it is
+        recorded, so nothing falls in between.
+        """
+        with self._lock:
+            self.active = True
+            self._ids = {e: set() for e in self._entities}
+
+    def take(self) -> dict[str, set[int]]:
+        """Changed ids per entity since the last call."""
+        with self._lock:
+            ids, self._ids = self._ids, {e: set() for e in self._entities}
+            return ids
+
+
+_feeds: dict[Engine, ChangeFeed] = {}
+_feeds_lock = threading.Lock()
+_setup_hooks: list[Callable[[ChangeFeed], None]] = []
+_close_hooks: list[Callable[[ChangeFeed], None]] = []
+
+
+def on_new_feed(fn: Callable[[ChangeFeed], None]) -> None:
+    """Run ``fn`` for every feed, existing and future (e.g. to add listeners)."""
+    with _feeds_lock:
+        _setup_hooks.append(fn)
+        feeds = list(_feeds.values())
+    for feed in feeds:
+        fn(feed)
+
+
+def on_feed_closed(fn: Callable[[ChangeFeed], None]) -> None:
+    """Run ``fn`` when a feed is closed (e.g. to drop per-engine state)."""
+    with _feeds_lock:
+        _close_hooks.append(fn)
+
+
+def get_feed(engine: Engine) -> ChangeFeed:
+    with _feeds_lock:
+        feed = _feeds.get(engine)
+        if feed is None:
+            feed = _feeds[engine] = ChangeFeed(engine)
+            for fn in _setup_hooks:
+                fn(feed)
+        return feed
+
+
+def consumed_seq(engine: Engine) -> int | None:
+    """The last seq this process's feed for ``engine`` has delivered, if it has one."""
+    with _feeds_lock:
+        feed = _feeds.get(engine)
+    return feed.last_seq if feed is not None else None
+
+
+def close_feed(engine: Engine) -> None:
+    with _feeds_lock:
+        feed = _feeds.pop(engine, None)
+        hooks = list(_close_hooks)
+    if feed is not None:
+        feed.close()
+        for fn in hooks:
+            fn(feed)
+
+
+def _after_commit(session: Session) -> None:
+    bind = session.get_bind()
+    engine = bind if isinstance(bind, Engine) else bind.engine
+    get_feed(engine).poll()
+
+
+def install(session_factory: sessionmaker) -> None:
+    """Poll the matching feed after every commit made through ``session_factory``."""
+    if not event.contains(session_factory, "after_commit", _after_commit):
+        event.listen(session_factory, "after_commit", _after_commit)
+
+
+async def watch(interval: float = POLL_INTERVAL) -> None:
+    """Background task: pick up commits made by other processes."""
+    while True:
+        await asyncio.sleep(interval)
+        with _feeds_lock:
+            feeds = list(_feeds.values())
+        for feed in feeds:
+            try:
+                await asyncio.to_thread(feed.check)
+            except Exception:
+                # A transient "database is locked" must not kill the watcher.
+                pass
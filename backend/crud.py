@@ -1,16 +1,26 @@
 import json
 from datetime import datetime
 from typing import Optional
-from sqlalchemy import func, and_, text
+from sqlalchemy import (
+    func, and_, text, bindparam, select, insert, update, delete, literal, literal_column, tuple_,
+    DateTime, String,
+)
 from sqlalchemy.orm import Session, joinedload
 
-from .models import MediaItem, Category, Tag, MediaTag, FieldValue
+from . import rollups, smart_collections
+from .database import LIST_FIELDS, SCOPED_FIELD_TYPES
+from .models import (
+    MediaItem, Category, Tag, MediaTag, FieldValue, MediaFieldValue, ChangeLog,
+    SmartCollection, SmartCollectionItem,
+)
 from .schemas import (
     MediaItemCreate, MediaItemUpdate,
     CategoryCreate, CategoryUpdate,
     TagCreate, TagUpdate,
     FieldValueCreate, FieldValueUpdate,
+    CollectionCreate, CollectionUpdate,
 )
+from .textkeys import title_sort_key
 
 
 # ── Helpers ──────────────────────────────────────────────────────────────────
@@ -46,6 +56,51 @@ def _serialize_item(item: MediaItem) -> dict:
     }
 
 
+# Everything _serialize_row needs: the item's columns plus its category and
+# tags as correlated subqueries. Usable in INSERT/UPDATE ... RETURNING, so a
+# write gets its response from the statement that made the change.
+_ITEM_COLUMNS = (
+    *MediaItem.__table__.c,
+    *(literal_column(f"(SELECT {col} FROM categories WHERE categories.id = media_items.category_id)",
+                     String).label(f"category_{col}")
+      for col in ("name", "color", "icon")),
+    literal_column(
+        "(SELECT json_group_array(json_object('id', t.id, 'name', t.name, 'color', t.color)) "
+        "FROM media_tags mt JOIN tags t ON t.id = mt.tag_id WHERE mt.media_id = media_items.id)",
+        String,
+    ).label("tags_json"),
+)
+_TAG_NAME = literal_column("(SELECT name FROM tags WHERE tags.id = tag_id)", String)
+_TAG_COLOR = literal_column("(SELECT color FROM tags WHERE tags.id = tag_id)", String)
+
+
+def _metadata_of(row) -> dict:
+    try:
+        return json.loads(row._mapping["metadata"] or "{}")
+    except Exception:
+        return {}
+
+
+def _serialize_row(row) -> dict:
+    """_serialize_item for a row of _ITEM_COLUMNS."""
+    return {
+        "id": row.id,
+        "title": row.title,
+        "category_id": row.category_id,
+        "category_name": row.category_name or "",
+        "category_color": row.category_color or "#6366f1",
+        "category_icon": row.category_icon or "📁",
+        "status": row.status,
+        "rating": row.rating,
+        "notes": row.notes,
+        "cover_image_url": row.cover_image_url,
+        "metadata": _metadata_of(row),
+        "tags": json.loads(row.tags_json or "[]"),
+        "created_at": row.created_at,
+        "updated_at": row.updated_at,
+    }
+
+
 def _load_item(db: Session, item_id: int) -> Optional[MediaItem]:
     """Fetch a single MediaItem with its related category and tags eagerly loaded.
 
@@ -53,19 +108,34 @@ def _load_item(db: Session, item_id: int) -> Optional[MediaItem]:
     relationship, preventing the N+1 query problem when the caller accesses
     item.category or item.media_tags.
     """
-    return (
-        db.query(MediaItem)
-        .options(
-            joinedload(MediaItem.category),
-            joinedload(MediaItem.media_tags).joinedload(MediaTag.tag),
-        )
-        .filter(MediaItem.id == item_id)
-        .first()
+    return _item_query(db).filter(MediaItem.id == item_id).first()
+
+
+def _item_query(db: Session):
+    """MediaItem query with the category and tags eagerly loaded (see _load_item)."""
+    return db.query(MediaItem).options(
+        joinedload(MediaItem.category),
+        joinedload(MediaItem.media_tags).joinedload(MediaTag.tag),
     )
 
 
+def _log_change(db: Session, entity: str, entity_id: int, op: str, **payload) -> None:
+    """Append a change_log row in the caller's transaction (see ChangeLog).
+
+    ``op`` is "create", "update" or "delete". ``payload`` holds the extra
+    fields clients need to route the change without a lookup (e.g. the
+    category of a deleted item); it is carried into the SSE event.
+    """
+    db.add(ChangeLog(entity=entity, entity_id=entity_id, op=op,
+                     payload=json.dumps(payload) if payload else None))
+
+
 # ── Media CRUD ────────────────────────────────────────────────────────────────
 
+# Columns get_media_items() can sort by; anything else sorts by created_at.
+SORT_COLUMNS = {"title", "created_at", "date_finished", "date_started", "rating", "status"}
+
+
 def get_media_items(
     db: Session,
     q: Optional[str] = None,
@@ -75,16 +145,28 @@ def get_media_items(
     sort_by: str = "created_at",
     sort_dir: str = "desc",
     tag_ids: Optional[str] = None,
+    field_value_ids: Optional[str] = None,
+    collection_id: Optional[int] = None,
+    after: Optional[tuple[str, int]] = None,
     limit: int = 50,
     offset: int = 0,
-) -> tuple[list[dict], int]:
-    query = (
-        db.query(MediaItem)
-        .options(
-            joinedload(MediaItem.category),
-            joinedload(MediaItem.media_tags).joinedload(MediaTag.tag),
-        )
-    )
+) -> tuple[list[dict], int, Optional[tuple[str, int]]]:
+    """One page of items, the number matching the filters, and the keyset
+    of the page's last item when sorting by title.
+
+    ``after`` is such a keyset, (title_sort, id): the page then starts right
+    after that item instead of at ``offset`` rows, an index range read
+    however deep into the listing it is.
+    """
+    query = _item_query(db)
+
+    # A smart collection's members are stored (see smart_collections.py),
+    # so opening one is a join on its primary key rather than its filter.
+    if collection_id:
+        query = query.join(SmartCollectionItem, and_(
+            SmartCollectionItem.media_id == MediaItem.id,
+            SmartCollectionItem.collection_id == collection_id,
+        ))
 
     if q:
         like = f"%{q}%"
@@ -107,19 +189,47 @@ def get_media_items(
             sub = db.query(MediaTag.media_id).filter(MediaTag.tag_id == tid).subquery()
             query = query.filter(MediaItem.id.in_(sub))
 
+    # Field value AND-filter (e.g. director X and genre Y), answered from the
+    # media_field_values index rather than by parsing metadata JSON.
+    if field_value_ids:
+        for fid in (int(x) for x in field_value_ids.split(",") if x.strip()):
+            query = query.filter(MediaItem.id.in_(
+                select(MediaFieldValue.media_id).where(MediaFieldValue.field_value_id == fid)
+            ))
+
     total = query.count()
 
     # Sorting
-    valid_sort = {"title", "created_at", "date_finished", "date_started", "rating", "status"}
-    col = sort_by if sort_by in valid_sort else "created_at"
-    order_col = getattr(MediaItem, col)
-    if sort_dir == "asc":
-        query = query.order_by(order_col.asc().nullslast())
+    col = sort_by if sort_by in SORT_COLUMNS else "created_at"
+    if col == "title":
+        # The stored natural key (see textkeys.title_sort_key), with the id
+        # breaking ties so that the keyset below is exact.
+        keyset = tuple_(MediaItem.title_sort, MediaItem.id)
+        if after is not None:
+            query = query.filter(keyset > tuple_(*after) if sort_dir == "asc" else keyset < tuple_(*after))
+        if sort_dir == "asc":
+            query = query.order_by(MediaItem.title_sort.asc(), MediaItem.id.asc())
+        else:
+            query = query.order_by(MediaItem.title_sort.desc(), MediaItem.id.desc())
     else:
-        query = query.order_by(order_col.desc().nullslast())
+        order_col = getattr(MediaItem, col)
+        if sort_dir == "asc":
+            query = query.order_by(order_col.asc().nullslast())
+        else:
+            query = query.order_by(order_col.desc().nullslast())
 
     items = query.offset(offset).limit(limit).all()
-    return [_serialize_item(i) for i in items], total
+    last = (items[-1].title_sort, items[-1].id) if col == "title" and items else None
+    return [_serialize_item(i) for i in items], total, last
+
+
+def get_media_items_by_ids(db: Session, ids: list[int]) -> list[dict]:
+    """Fetch several items with one IN query, in the order of ``ids``.
+
+    Unknown ids are skipped, and a repeated id is returned once.
+    """
+    by_id = {item.id: item for item in _item_query(db).filter(MediaItem.id.in_(set(ids))).all()}
+    return [_serialize_item(by_id[i]) for i in dict.fromkeys(ids) if i in by_id]
 
 
 def get_media_item(db: Session, item_id: int) -> Optional[dict]:
@@ -128,99 +238,180 @@ def get_media_item(db: Session, item_id: int) -> Optional[dict]:
 
 
 def create_media_item(db: Session, data: MediaItemCreate) -> dict:
-    tag_ids = data.tag_ids or []
-    item = MediaItem(
-        title=data.title,
-        category_id=data.category_id,
-        status=data.status,
-        rating=data.rating,
-        notes=data.notes,
-        cover_image_url=data.cover_image_url,
-        metadata_json=json.dumps(data.metadata or {}),
-    )
-    db.add(item)
-    db.flush()
-    _set_tags(db, item.id, tag_ids)
+    now = datetime.utcnow()
+    # INSERT ... RETURNING hands back the stored row with its category, so
+    # the response is built without reading the item back.
+    row = db.execute(
+        insert(MediaItem).values(
+            title=data.title,
+            title_sort=title_sort_key(data.title),
+            category_id=data.category_id,
+            status=data.status,
+            rating=data.rating,
+            notes=data.notes,
+            cover_image_url=data.cover_image_url,
+            metadata_json=json.dumps(data.metadata or {}),
+            created_at=now,
+            updated_at=now,
+            owned_at=now if data.status == "owned" else None,
+            rated_at=now if data.rating else None,
+        ).returning(*_ITEM_COLUMNS)
+    ).one()
+    tags = _add_tags(db, row.id, data.tag_ids or [])
+    _set_field_links(db, row.id, row.category_id, data.metadata or {}, new=True,
+                     category_name=row.category_name)
+    smart_collections.refresh_item(db, row.id)
+    rollups.record(db, None, rollups.item_key(row))
+    _log_change(db, "media", row.id, "create", category_id=row.category_id)
     db.commit()
-    return get_media_item(db, item.id)
+    return {**_serialize_row(row), "tags": tags}
 
 
-def update_media_item(db: Session, item_id: int, data: MediaItemUpdate) -> Optional[dict]:
-    item = db.query(MediaItem).filter(MediaItem.id == item_id).first()
-    if not item:
-        return None
+def update_media_item(db: Session, item_id: int, data: MediaItemUpdate) -> tuple[Optional[dict], Optional[str]]:
+    """Apply a partial update; returns (item, cover URL before the update).
+
+    The item is None if it does not exist. The usual edit costs a primary-key
+    SELECT of the fields that drive side effects, one UPDATE ... RETURNING
+    that also yields the response, and the change_log INSERT.
+    """
+    old = db.execute(
+        select(MediaItem.category_id, MediaItem.status, MediaItem.rating, MediaItem.created_at,
+               MediaItem.owned_at, MediaItem.rated_at, MediaItem.cover_image_url)
+        .where(MediaItem.id == item_id)
+    ).first()
+    if old is None:
+        return None, None
 
     # exclude_unset=True means only fields the client explicitly sent are
     # included. Fields omitted from the request body are not touched, so a
     # partial update (e.g. just changing the rating) won't overwrite other data.
-    update_data = data.model_dump(exclude_unset=True)
-    tag_ids = update_data.pop("tag_ids", None)
-    metadata = update_data.pop("metadata", None)
-
-    for field, value in update_data.items():
-        setattr(item, field, value)
-
+    values = data.model_dump(exclude_unset=True)
+    tag_ids = values.pop("tag_ids", None)
+    metadata = values.pop("metadata", None)
     if metadata is not None:
-        item.metadata_json = json.dumps(metadata)
+        values["metadata_json"] = json.dumps(metadata)
+    if values.get("title") is not None:
+        values["title_sort"] = title_sort_key(values["title"])
 
-    item.updated_at = datetime.utcnow()
+    now = values["updated_at"] = datetime.utcnow()
+    if values.get("status", old.status) != old.status:
+        values["owned_at"] = now if values["status"] == "owned" else None
+    if values.get("rating", old.rating) != old.rating:
+        values["rated_at"] = now if values["rating"] else None
 
+    # Tags first, so the RETURNING clause below already sees the new set.
     if tag_ids is not None:
         _set_tags(db, item_id, tag_ids)
-
+    row = db.execute(
+        update(MediaItem).where(MediaItem.id == item_id).values(**values)
+        .returning(*_ITEM_COLUMNS).execution_options(synchronize_session=False)
+    ).one()
+
+    rollups.record(db, rollups.item_key(old), rollups.item_key(row))
+    if metadata is not None or row.category_id != old.category_id:
+        _set_field_links(db, item_id, row.category_id, _metadata_of(row),
+                         category_name=row.category_name)
+    smart_collections.refresh_item(db, item_id)
+
+    # previous_category_id lets clients move the item between category views.
+    _log_change(db, "media", item_id, "update", category_id=row.category_id,
+                previous_category_id=old.category_id)
+    db.commit()
+    return _serialize_row(row), old.cover_image_url
+
+
+def delete_media_item(db: Session, item_id: int) -> tuple[bool, Optional[str]]:
+    """Delete an item; returns (deleted, its cover URL) so the caller can remove the file."""
+    row = db.execute(
+        delete(MediaItem).where(MediaItem.id == item_id)
+        .returning(MediaItem.category_id, MediaItem.created_at, MediaItem.owned_at,
+                   MediaItem.rated_at, MediaItem.cover_image_url)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if row is None:
+        return False, None
+    # A Core DELETE skips the ORM cascade (and SQLite only enforces ON DELETE
+    # CASCADE with foreign_keys on), so the junction rows go explicitly.
+    db.execute(delete(MediaTag).where(MediaTag.media_id == item_id))
+    db.execute(delete(MediaFieldValue).where(MediaFieldValue.media_id == item_id))
+    smart_collections.remove_item(db, item_id)
+    rollups.record(db, rollups.item_key(row), None)
+    _log_change(db, "media", item_id, "delete", category_id=row.category_id)
     db.commit()
-    return get_media_item(db, item_id)
+    return True, row.cover_image_url
 
 
-def delete_media_item(db: Session, item_id: int) -> bool:
-    item = db.query(MediaItem).filter(MediaItem.id == item_id).first()
-    if not item:
-        return False
-    db.delete(item)
-    db.commit()
-    return True
+def _add_tags(db: Session, item_id: int, tag_ids: list[int]) -> list[dict]:
+    """Attach tags the item does not have yet; returns the newly attached ones.
+
+    Unknown tag ids are skipped rather than stored as dangling rows.
+    """
+    if not tag_ids:
+        return []
+    rows = db.execute(
+        insert(MediaTag).prefix_with("OR IGNORE")
+        .from_select(["media_id", "tag_id"],
+                     select(literal(item_id), Tag.id).where(
+                         Tag.id.in_(set(tag_ids)),
+                         # Writes nothing for a missing item (see set_media_tags).
+                         select(MediaItem.id).where(MediaItem.id == item_id).exists(),
+                     ))
+        .returning(MediaTag.tag_id, _TAG_NAME, _TAG_COLOR)
+    ).all()
+    order = {tid: i for i, tid in enumerate(tag_ids)}
+    return sorted(({"id": tid, "name": name, "color": color} for tid, name, color in rows),
+                  key=lambda t: order[t["id"]])
 
 
 def _set_tags(db: Session, item_id: int, tag_ids: list[int]):
-    # Delete-all-then-reinsert is simpler than diffing the old and new tag sets.
-    # Tag sets are small (typically < 10), so the extra deletes are negligible.
-    db.query(MediaTag).filter(MediaTag.media_id == item_id).delete()
-    for tid in tag_ids:
-        db.add(MediaTag(media_id=item_id, tag_id=tid))
+    # Diff rather than delete-all-then-reinsert: tags that stay are neither
+    # deleted nor re-inserted, and no read of the current set is needed.
+    query = delete(MediaTag).where(MediaTag.media_id == item_id)
+    if tag_ids:
+        query = query.where(MediaTag.tag_id.not_in(set(tag_ids)))
+    db.execute(query)
+    _add_tags(db, item_id, tag_ids)
 
 
 def set_media_tags(db: Session, item_id: int, tag_ids: list[int]) -> Optional[dict]:
-    item = db.query(MediaItem).filter(MediaItem.id == item_id).first()
-    if not item:
-        return None
     _set_tags(db, item_id, tag_ids)
+    row = db.execute(select(*_ITEM_COLUMNS).where(MediaItem.id == item_id)).first()
+    if row is None:
+        db.rollback()
+        return None
+    smart_collections.refresh_item(db, item_id)
+    _log_change(db, "media", item_id, "update", category_id=row.category_id,
+                previous_category_id=row.category_id)
     db.commit()
-    return get_media_item(db, item_id)
+    return _serialize_row(row)
 
 
 # ── Category CRUD ─────────────────────────────────────────────────────────────
 
+def _category_counts(db: Session) -> dict[int, int]:
+    """Items per category id, in one GROUP BY (categories without items are absent)."""
+    return dict(db.query(MediaItem.category_id, func.count()).group_by(MediaItem.category_id).all())
+
+
 def list_categories(db: Session) -> list[dict]:
     cats = db.query(Category).all()
-    result = []
-    for c in cats:
-        count = db.query(func.count(MediaItem.id)).filter(
-            MediaItem.category_id == c.id
-        ).scalar()
-        result.append({
-            "id": c.id,
-            "name": c.name,
-            "icon": c.icon,
-            "color": c.color,
-            "is_system": c.is_system,
-            "item_count": count,
-        })
-    return result
+    # One grouped count rather than a COUNT query per category.
+    counts = _category_counts(db)
+    return [{
+        "id": c.id,
+        "name": c.name,
+        "icon": c.icon,
+        "color": c.color,
+        "is_system": c.is_system,
+        "item_count": counts.get(c.id, 0),
+    } for c in cats]
 
 
 def create_category(db: Session, data: CategoryCreate) -> dict:
     cat = Category(name=data.name, icon=data.icon, color=data.color, is_system=0)
     db.add(cat)
+    db.flush()
+    _log_change(db, "category", cat.id, "create")
     db.commit()
     db.refresh(cat)
     return {"id": cat.id, "name": cat.name, "icon": cat.icon, "color": cat.color,
@@ -237,6 +428,7 @@ def update_category(db: Session, cat_id: int, data: CategoryUpdate) -> Optional[
         cat.icon = data.icon
     if data.color is not None:
         cat.color = data.color
+    _log_change(db, "category", cat.id, "update")
     db.commit()
     count = db.query(func.count(MediaItem.id)).filter(
         MediaItem.category_id == cat.id
@@ -259,6 +451,7 @@ def delete_category(db: Session, cat_id: int) -> tuple[bool, str]:
         # orphaning them. The user must move or delete the items first.
         return False, "has_items"
     db.delete(cat)
+    _log_change(db, "category", cat_id, "delete")
     db.commit()
     return True, "ok"
 
@@ -267,18 +460,17 @@ def delete_category(db: Session, cat_id: int) -> tuple[bool, str]:
 
 def list_tags(db: Session) -> list[dict]:
     tags = db.query(Tag).all()
-    result = []
-    for t in tags:
-        count = db.query(func.count(MediaTag.media_id)).filter(
-            MediaTag.tag_id == t.id
-        ).scalar()
-        result.append({"id": t.id, "name": t.name, "color": t.color, "usage_count": count})
-    return result
+    # One grouped count over the media_tags primary key rather than one per tag.
+    counts = dict(db.query(MediaTag.tag_id, func.count()).group_by(MediaTag.tag_id).all())
+    return [{"id": t.id, "name": t.name, "color": t.color, "usage_count": counts.get(t.id, 0)}
+            for t in tags]
 
 
 def create_tag(db: Session, data: TagCreate) -> dict:
     tag = Tag(name=data.name, color=data.color)
     db.add(tag)
+    db.flush()
+    _log_change(db, "tag", tag.id, "create")
     db.commit()
     db.refresh(tag)
     return {"id": tag.id, "name": tag.name, "color": tag.color, "usage_count": 0}
@@ -292,6 +484,7 @@ def update_tag(db: Session, tag_id: int, data: TagUpdate) -> Optional[dict]:
         tag.name = data.name
     if data.color is not None:
         tag.color = data.color
+    _log_change(db, "tag", tag_id, "update")
     db.commit()
     count = db.query(func.count(MediaTag.media_id)).filter(
         MediaTag.tag_id == tag_id
@@ -304,6 +497,71 @@ def delete_tag(db: Session, tag_id: int) -> bool:
     if not tag:
         return False
     db.delete(tag)
+    # Collections requiring the tag now match nothing.
+    smart_collections.rebuild_referencing(db, tag_ids=[tag_id])
+    _log_change(db, "tag", tag_id, "delete")
+    db.commit()
+    return True
+
+
+# ── Smart Collection CRUD ─────────────────────────────────────────────────────
+
+def _collection_dict(c: SmartCollection, item_count: int) -> dict:
+    return {"id": c.id, "name": c.name, "icon": c.icon, "rules": json.loads(c.rules or "{}"),
+            "item_count": item_count}
+
+
+def list_collections(db: Session) -> list[dict]:
+    counts = smart_collections.counts(db)
+    return [_collection_dict(c, counts.get(c.id, 0))
+            for c in db.query(SmartCollection).order_by(SmartCollection.name).all()]
+
+
+def _collection_count(db: Session, collection_id: int) -> int:
+    return db.query(func.count()).select_from(SmartCollectionItem).filter(
+        SmartCollectionItem.collection_id == collection_id
+    ).scalar()
+
+
+def create_collection(db: Session, data: CollectionCreate) -> tuple[Optional[dict], str]:
+    if db.query(SmartCollection.id).filter(SmartCollection.name == data.name).first():
+        return None, "exists"
+    collection = SmartCollection(name=data.name, icon=data.icon,
+                                 rules=data.rules.model_dump_json(exclude_defaults=True))
+    db.add(collection)
+    db.flush()
+    smart_collections.rebuild(db, collection)
+    _log_change(db, "collection", collection.id, "create")
+    db.commit()
+    return _collection_dict(collection, _collection_count(db, collection.id)), "ok"
+
+
+def update_collection(db: Session, collection_id: int, data: CollectionUpdate) -> tuple[Optional[dict], str]:
+    collection = db.query(SmartCollection).filter(SmartCollection.id == collection_id).first()
+    if not collection:
+        return None, "not_found"
+    if data.name is not None and data.name != collection.name:
+        if db.query(SmartCollection.id).filter(SmartCollection.name == data.name).first():
+            return None, "exists"
+        collection.name = data.name
+    if data.icon is not None:
+        collection.icon = data.icon
+    if data.rules is not None:
+        collection.rules = data.rules.model_dump_json(exclude_defaults=True)
+        db.flush()
+        smart_collections.rebuild(db, collection)
+    _log_change(db, "collection", collection.id, "update")
+    db.commit()
+    return _collection_dict(collection, _collection_count(db, collection.id)), "ok"
+
+
+def delete_collection(db: Session, collection_id: int) -> bool:
+    collection = db.query(SmartCollection).filter(SmartCollection.id == collection_id).first()
+    if not collection:
+        return False
+    db.query(SmartCollectionItem).filter(SmartCollectionItem.collection_id == collection_id).delete()
+    db.delete(collection)
+    _log_change(db, "collection", collection_id, "delete")
     db.commit()
     return True
 
@@ -311,12 +569,11 @@ def delete_tag(db: Session, tag_id: int) -> bool:
 # ── Stats ─────────────────────────────────────────────────────────────────────
 
 def get_overview_stats(db: Session) -> dict:
-    total = db.query(func.count(MediaItem.id)).scalar()
-    by_status = {}
-    for s in ("wishlist", "owned"):
-        by_status[s] = db.query(func.count(MediaItem.id)).filter(
-            MediaItem.status == s
-        ).scalar()
+    # Each breakdown is one GROUP BY; the statement count does not grow with
+    # the number of categories or grades.
+    status_counts = dict(db.query(MediaItem.status, func.count()).group_by(MediaItem.status).all())
+    total = sum(status_counts.values())
+    by_status = {s: status_counts.get(s, 0) for s in ("wishlist", "owned")}
 
     # Letter grades (A+, B-, etc.) are stored as strings, so SQLite's AVG()
     # returns NULL. This computation is a stub kept for a potential future
@@ -327,19 +584,13 @@ def get_overview_stats(db: Session) -> dict:
     avg_rating = round(float(avg), 1) if avg else 0.0
 
     cats = db.query(Category).all()
-    by_category = []
-    for c in cats:
-        count = db.query(func.count(MediaItem.id)).filter(
-            MediaItem.category_id == c.id
-        ).scalar()
-        by_category.append({"name": c.name, "color": c.color, "icon": c.icon, "count": count})
+    category_counts = _category_counts(db)
+    by_category = [{"name": c.name, "color": c.color, "icon": c.icon, "count": category_counts.get(c.id, 0)}
+                   for c in cats]
 
     grades = ["F", "D-", "D", "D+", "C-", "C", "C+", "B-", "B", "B+", "A-", "A", "A+"]
-    rating_dist = {}
-    for g in grades:
-        rating_dist[g] = db.query(func.count(MediaItem.id)).filter(
-            MediaItem.rating == g
-        ).scalar()
+    rating_counts = dict(db.query(MediaItem.rating, func.count()).group_by(MediaItem.rating).all())
+    rating_dist = {g: rating_counts.get(g, 0) for g in grades}
 
     return {
         "total_items": total,
@@ -372,6 +623,7 @@ def list_field_values(
     field_type: Optional[str] = None,
     category_id: Optional[int] = None,
     category_id_filter: bool = False,
+    with_counts: bool = False,
 ) -> list[dict]:
     query = db.query(FieldValue)
     if field_type:
@@ -379,11 +631,17 @@ def list_field_values(
     if category_id_filter:
         query = query.filter(FieldValue.category_id == category_id)
     query = query.order_by(FieldValue.field_type, FieldValue.sort_order, FieldValue.value)
-    return [
-        {"id": fv.id, "field_type": fv.field_type, "category_id": fv.category_id,
-         "value": fv.value, "sort_order": fv.sort_order}
-        for fv in query.all()
-    ]
+    counts = None
+    if with_counts:
+        # Counted from the (field_value_id, media_id) index, never from metadata.
+        count_query = db.query(MediaFieldValue.field_value_id, func.count()).group_by(
+            MediaFieldValue.field_value_id)
+        if field_type:
+            count_query = count_query.join(FieldValue, FieldValue.id == MediaFieldValue.field_value_id) \
+                                     .filter(FieldValue.field_type == field_type)
+        counts = dict(count_query.all())
+    return [_field_value_dict(fv, counts.get(fv.id, 0) if counts is not None else None)
+            for fv in query.all()]
 
 
 def create_field_value(db: Session, data: FieldValueCreate) -> dict:
@@ -395,32 +653,313 @@ def create_field_value(db: Session, data: FieldValueCreate) -> dict:
     )
     db.add(fv)
     try:
+        db.flush()
+        # Items may already hold this string (typed before the value existed,
+        # or left behind when it was deleted); link them now.
+        usage = link_field_values(db, field_type=fv.field_type, field_value_id=fv.id)
+        _log_change(db, "field_value", fv.id, "create", field_type=fv.field_type, category_id=fv.category_id)
         db.commit()
         db.refresh(fv)
     except Exception:
         db.rollback()
         raise
-    return {"id": fv.id, "field_type": fv.field_type, "category_id": fv.category_id,
-            "value": fv.value, "sort_order": fv.sort_order}
+    return _field_value_dict(fv, usage)
 
 
 def update_field_value(db: Session, fv_id: int, data: FieldValueUpdate) -> Optional[dict]:
+    """Update a value; a rename also rewrites every item that uses it.
+
+    Raises IntegrityError if the new name already exists in the same list —
+    that is a merge (merge_field_value), not a rename.
+    """
     fv = db.query(FieldValue).filter(FieldValue.id == fv_id).first()
     if not fv:
         return None
-    if data.value is not None:
+    if data.value is not None and data.value != fv.value:
+        _rewrite_items(db, fv, data.value)
         fv.value = data.value
     if data.sort_order is not None:
         fv.sort_order = data.sort_order
+    _log_change(db, "field_value", fv.id, "update", field_type=fv.field_type, category_id=fv.category_id)
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return _field_value_dict(fv, _usage_count(db, fv.id))
+
+
+def merge_field_value(db: Session, fv_id: int, into_id: int) -> tuple[Optional[dict], str]:
+    """Fold value ``fv_id`` into ``into_id`` and delete it.
+
+    Items using the old value are rewritten to the target (without creating
+    duplicates in multi-value fields like cast), their links move to the
+    target, and all of it commits as one transaction.
+    """
+    source = db.query(FieldValue).filter(FieldValue.id == fv_id).first()
+    target = db.query(FieldValue).filter(FieldValue.id == into_id).first()
+    if not source or not target:
+        return None, "not_found"
+    if source.id == target.id:
+        return None, "same"
+    if (source.field_type, source.category_id) != (target.field_type, target.category_id):
+        return None, "mismatch"
+
+    _rewrite_items(db, source, target.value)
+    db.execute(text(
+        "INSERT OR IGNORE INTO media_field_values (media_id, field_value_id, field_key) "
+        "SELECT media_id, :target, field_key FROM media_field_values WHERE field_value_id = :source"
+    ), {"source": source.id, "target": target.id})
+    db.query(MediaFieldValue).filter(MediaFieldValue.field_value_id == source.id).delete()
+    smart_collections.merge_field_value(db, source.id, target.id)
+    _log_change(db, "field_value", source.id, "delete", field_type=source.field_type,
+                category_id=source.category_id, merged_into=target.id)
+    db.delete(source)
     db.commit()
-    return {"id": fv.id, "field_type": fv.field_type, "category_id": fv.category_id,
-            "value": fv.value, "sort_order": fv.sort_order}
+    return _field_value_dict(target, _usage_count(db, target.id)), "ok"
 
 
 def delete_field_value(db: Session, fv_id: int) -> bool:
     fv = db.query(FieldValue).filter(FieldValue.id == fv_id).first()
     if not fv:
         return False
+    _log_change(db, "field_value", fv_id, "delete", field_type=fv.field_type, category_id=fv.category_id)
+    # Items keep the string in their metadata; only the link goes.
+    db.query(MediaFieldValue).filter(MediaFieldValue.field_value_id == fv_id).delete()
+    smart_collections.rebuild_referencing(db, field_value_ids=[fv_id])
     db.delete(fv)
     db.commit()
     return True
+
+
+# ── Field Value Links ─────────────────────────────────────────────────────────
+
+def _field_value_dict(fv: FieldValue, usage_count: Optional[int] = None) -> dict:
+    return {"id": fv.id, "field_type": fv.field_type, "category_id": fv.category_id,
+            "value": fv.value, "sort_order": fv.sort_order, "usage_count": usage_count}
+
+
+def _usage_count(db: Session, fv_id: int) -> int:
+    return db.query(func.count()).filter(MediaFieldValue.field_value_id == fv_id).scalar()
+
+
+def _set_field_links(db: Session, item_id: int, category_id: int, metadata: dict,
+                     new: bool = False, category_name: Optional[str] = None) -> None:
+    """Make the item's media_field_values rows match its metadata.
+
+    Values that are not in the relevant list (free text, or removed from the
+    list) are simply not linked. ``new`` skips reading existing links;
+    passing ``category_name`` skips looking it up.
+    """
+    cat_name = category_name or db.query(Category.name).filter(Category.id == category_id).scalar()
+    wanted: dict[tuple[str, str], str] = {}  # (field_type, value) → metadata key
+    for key, field_type in LIST_FIELDS.get(cat_name, {}).items():
+        raw = metadata.get(key)
+        for value in raw if isinstance(raw, list) else [raw]:
+            if isinstance(value, str) and value:
+                wanted[(field_type, value)] = key
+
+    links: dict[int, str] = {}  # field_value_id → metadata key
+    if wanted:
+        rows = db.query(FieldValue.id, FieldValue.field_type, FieldValue.category_id, FieldValue.value).filter(
+            FieldValue.field_type.in_({ft for ft, _ in wanted}),
+            FieldValue.value.in_({v for _, v in wanted}),
+        ).all()
+        for fv_id, field_type, fv_category_id, value in rows:
+            scope = category_id if field_type in SCOPED_FIELD_TYPES else None
+            key = wanted.get((field_type, value))
+            if key and fv_category_id == scope:
+                links[fv_id] = key
+
+    existing = {} if new else dict(
+        db.query(MediaFieldValue.field_value_id, MediaFieldValue.field_key)
+        .filter(MediaFieldValue.media_id == item_id).all()
+    )
+    stale = [fv_id for fv_id, key in existing.items() if links.get(fv_id) != key]
+    if stale:
+        db.query(MediaFieldValue).filter(
+            MediaFieldValue.media_id == item_id, MediaFieldValue.field_value_id.in_(stale)
+        ).delete(synchronize_session=False)
+    for fv_id, key in links.items():
+        if existing.get(fv_id) != key:
+            db.add(MediaFieldValue(media_id=item_id, field_value_id=fv_id, field_key=key))
+
+
+def link_field_values(db: Session, field_type: Optional[str] = None,
+                      field_value_id: Optional[int] = None) -> int:
+    """Link items to the list values their metadata already contains.
+
+    Set-based — one INSERT ... SELECT over json_each per category and key —
+    so it serves both the backfill of existing libraries and linking old
+    items to a newly created value. Existing links are kept. Returns the
+    number of links added.
+    """
+    added = 0
+    for cat_name, fields in LIST_FIELDS.items():
+        for key, ft in fields.items():
+            if field_type is not None and ft != field_type:
+                continue
+            scope = "fv.category_id = m.category_id" if ft in SCOPED_FIELD_TYPES else "fv.category_id IS NULL"
+            only = "AND fv.id = :fv_id" if field_value_id is not None else ""
+            # json_each yields one row for a scalar and one per element for a
+            # list (cast); rows whose metadata is not valid JSON are skipped.
+            result = db.execute(text(f"""
+                INSERT OR IGNORE INTO media_field_values (media_id, field_value_id, field_key)
+                SELECT m.id, fv.id, :key
+                FROM media_items m
+                JOIN categories c ON c.id = m.category_id AND c.name = :cat
+                JOIN json_each(CASE WHEN json_valid(m.metadata) THEN m.metadata ELSE '{{}}' END, :path) j
+                JOIN field_values fv ON fv.field_type = :field_type AND fv.value = j.value AND {scope} {only}
+            """), {"key": key, "cat": cat_name, "path": f'$."{key}"', "field_type": ft,
+                   "fv_id": field_value_id})
+            added += result.rowcount
+    return added
+
+
+# Rewrites one metadata key of every item linked to :fid. A list (cast) has
+# the old value replaced in place and duplicates dropped, keeping first
+# positions; a scalar is simply replaced.
+_REWRITE_SQL = text("""
+    UPDATE media_items SET updated_at = :now, metadata = CASE json_type(metadata, :path)
+        WHEN 'array' THEN json_set(metadata, :path, json((
+            SELECT json_group_array(v) FROM (
+                SELECT CASE WHEN value = :old THEN :new ELSE value END AS v, MIN(key) AS k
+                FROM json_each(media_items.metadata, :path) GROUP BY v ORDER BY k
+            )
+        )))
+        ELSE json_set(metadata, :path, :new)
+    END
+    WHERE id IN (SELECT media_id FROM media_field_values
+                 WHERE field_value_id = :fid AND field_key = :key)
+""").bindparams(bindparam("now", type_=DateTime()))
+
+# One change_log row per rewritten item, so caches, SSE clients and sync see
+# the new metadata.
+_LOG_REWRITE_SQL = text("""
+    INSERT INTO change_log (entity, entity_id, op, payload, changed_at)
+    SELECT 'media', id, 'update',
+           json_object('category_id', category_id, 'previous_category_id', category_id), :now
+    FROM media_items
+    WHERE id IN (SELECT media_id FROM media_field_values WHERE field_value_id = :fid)
+""").bindparams(bindparam("now", type_=DateTime()))
+
+
+def _rewrite_items(db: Session, fv: FieldValue, new_value: str) -> None:
+    """Replace ``fv.value`` with ``new_value`` in the metadata of every linked item."""
+    now = datetime.utcnow()
+    keys = [k for (k,) in db.query(MediaFieldValue.field_key)
+            .filter(MediaFieldValue.field_value_id == fv.id).distinct()]
+    for key in keys:
+        db.execute(_REWRITE_SQL, {"now": now, "path": f'$."{key}"', "old": fv.value,
+                                  "new": new_value, "fid": fv.id, "key": key})
+    if keys:
+        db.execute(_LOG_REWRITE_SQL, {"now": now, "fid": fv.id})
+
+
+# ── Delta Sync ────────────────────────────────────────────────────────────────
+
+def get_sync_token(db: Session) -> int:
+    return db.query(func.max(ChangeLog.seq)).scalar() or 0
+
+
+def get_changes_since(db: Session, since: int, limit: int = 1000) -> dict:
+    """Everything that changed after sync token ``since``.
+
+    Each entity appears at most once, in its latest state: an item edited ten
+    times is sent once, and an item created then deleted is only a tombstone.
+    At most ``limit`` change_log rows are consumed per call; when more remain
+    ``has_more`` is true and the returned token continues from where this
+    call stopped.
+    """
+    latest = get_sync_token(db)
+    oldest = db.query(func.min(ChangeLog.seq)).scalar()
+    # A token from the future means the database was replaced (e.g. restored
+    # from a backup); one older than the retained log means the history it
+    # needs has been pruned. Either way the client must start over.
+    if since > latest or (oldest is not None and since < oldest - 1):
+        return {"token": latest, "reset": True, "has_more": False}
+
+    # Upper bound of this page: the seq of the limit-th row after `since`,
+    # found by walking the primary key rather than materialising the rows.
+    upper = (
+        db.query(ChangeLog.seq)
+        .filter(ChangeLog.seq > since)
+        .order_by(ChangeLog.seq)
+        .offset(limit - 1)
+        .limit(1)
+        .scalar()
+    )
+    has_more = upper is not None and upper < latest
+    upper = upper if upper is not None else latest
+
+    # SQLite returns the other columns from the row holding MAX(seq), so `op`
+    # here is each entity's most recent operation in the window.
+    rows = db.execute(
+        text(
+            "SELECT entity, entity_id, op, MAX(seq) FROM change_log "
+            "WHERE seq > :since AND seq <= :upper GROUP BY entity, entity_id"
+        ),
+        {"since": since, "upper": upper},
+    ).fetchall()
+
+    entities = ("media", "tag", "category", "field_value", "collection")
+    upserts: dict[str, list[int]] = {e: [] for e in entities}
+    tombstones: dict[str, list[int]] = {e: [] for e in entities}
+    for entity, entity_id, op, _ in rows:
+        (tombstones if op == "delete" else upserts).setdefault(entity, []).append(entity_id)
+
+    media = []
+    ids = upserts["media"]
+    # Chunked to stay under SQLite's bound-parameter limit.
+    for start in range(0, len(ids), 500):
+        items = (
+            db.query(MediaItem)
+            .options(
+                joinedload(MediaItem.category),
+                joinedload(MediaItem.media_tags).joinedload(MediaTag.tag),
+            )
+            .filter(MediaItem.id.in_(ids[start:start + 500]))
+            .all()
+        )
+        media.extend(_serialize_item(i) for i in items)
+
+    tags = [
+        {"id": t.id, "name": t.name, "color": t.color}
+        for t in db.query(Tag).filter(Tag.id.in_(upserts["tag"])).all()
+    ] if upserts["tag"] else []
+
+    categories = [
+        {"id": c.id, "name": c.name, "icon": c.icon, "color": c.color, "is_system": c.is_system}
+        for c in db.query(Category).filter(Category.id.in_(upserts["category"])).all()
+    ] if upserts["category"] else []
+
+    field_values = [
+        {"id": fv.id, "field_type": fv.field_type, "category_id": fv.category_id,
+         "value": fv.value, "sort_order": fv.sort_order}
+        for fv in db.query(FieldValue).filter(FieldValue.id.in_(upserts["field_value"])).all()
+    ] if upserts["field_value"] else []
+
+    if upserts["collection"]:
+        counts = smart_collections.counts(db)
+        collections = [_collection_dict(c, counts.get(c.id, 0)) for c in
+                       db.query(SmartCollection).filter(SmartCollection.id.in_(upserts["collection"])).all()]
+    else:
+        collections = []
+
+    return {
+        "token": upper,
+        "reset": False,
+        "has_more": has_more,
+        "media": media,
+        "tags": tags,
+        "categories": categories,
+        "field_values": field_values,
+        "collections": collections,
+        "tombstones": {
+            "media": tombstones["media"],
+            "tags": tombstones["tag"],
+            "categories": tombstones["category"],
+            "field_values": tombstones["field_value"],
+            "collections": tombstones["collection"],
+        },
+    }
@@ -1,24 +1,79 @@
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
-from .models import Base, Category, FieldValue
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.schema import CreateColumn
+from .models import Base, Category, FieldValue, MediaItem
 
 # Resolve DB path relative to this file's location
 BASE_DIR = Path(__file__).resolve().parent.parent
-DATA_DIR = BASE_DIR / "data"
-DATA_DIR.mkdir(exist_ok=True)
+# MEDIA_TRACKER_DATA_DIR lets tooling (e.g. the benchmark suite) point the app
+# at a scratch directory without touching the user's real library.
+DATA_DIR = Path(os.environ.get("MEDIA_TRACKER_DATA_DIR") or BASE_DIR / "data")
+DATA_DIR.mkdir(parents=True, exist_ok=True)
 DB_PATH = DATA_DIR / "media_tracker.db"
 UPLOADS_DIR = DATA_DIR / "uploads"
 UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
 
-engine = create_engine(
-    f"sqlite:///{DB_PATH}",
-    # SQLite only allows one thread to use a connection by default.
-    # FastAPI can serve requests from multiple threads, so this must be False.
-    connect_args={"check_same_thread": False},
-)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def make_engine(db_path: Path, **pool_options):
+    return create_engine(
+        f"sqlite:///{db_path}",
+        # SQLite only allows one thread to use a connection by default.
+        # FastAPI can serve requests from multiple threads, so this must be False.
+        connect_args={"check_same_thread": False},
+        **pool_options,
+    )
+
+
+class Library:
+    """One library: its data folder, database file, uploads folder and engine.
+
+    The default library is the one in DATA_DIR itself; others are opened by
+    backend/libraries.py. Request handlers find theirs with current_library().
+    """
+
+    def __init__(self, name: str, data_dir: Path, engine=None):
+        self.name = name
+        self.data_dir = data_dir
+        self.db_path = data_dir / "media_tracker.db"
+        self.uploads_dir = data_dir / "uploads"
+        self.engine = engine if engine is not None else make_engine(self.db_path)
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+
+    def __repr__(self) -> str:
+        return f"<Library {self.name!r} at {self.data_dir}>"
+
+
+DEFAULT_LIBRARY = Library("default", DATA_DIR)
+engine = DEFAULT_LIBRARY.engine
+SessionLocal = DEFAULT_LIBRARY.SessionLocal
+
+# Set per request by libraries.LibraryMiddleware; anything outside a request
+# (startup, run.py commands) works on the default library.
+_current_library: ContextVar = ContextVar("current_library", default=DEFAULT_LIBRARY)
+
+
+def current_library() -> Library:
+    return _current_library.get()
+
+
+@contextmanager
+def use_library(library: Library):
+    """Make ``library`` the current one (for get_db, uploads, backups) in this context."""
+    token = _current_library.set(library)
+    try:
+        yield library
+    finally:
+        _current_library.reset(token)
+
+# Stored in the database's PRAGMA user_version once init_db() has created,
+# migrated and seeded it. Bump this whenever the models, a migration step in
+# init_db() or the first-run seeds change, so existing databases take the slow
+# path once and pick the change up.
+SCHEMA_VERSION = 6
 
 BUILTIN_CATEGORIES = [
     {"name": "Movies",   "icon": "🎬", "color": "#ef4444", "is_system": 1},
@@ -80,6 +135,26 @@ SHARED_SEEDS = {
 }
 
 
+# Metadata keys backed by a field-value list, per built-in category
+# {category_name: {metadata_key: field_type}}. Mirrors CATEGORY_FIELDS in
+# frontend/js/components/modal.js; media_field_values links are derived from it.
+LIST_FIELDS = {
+    "Books":    {"author": "author", "publisher": "publisher", "format": "format_book",
+                 "genre": "genre"},
+    "Movies":   {"director": "director", "studio": "studio", "format": "format_movie",
+                 "genre": "genre", "cast": "cast"},
+    "Games":    {"developer": "developer", "publisher": "publisher", "platform": "platform",
+                 "genre": "genre", "format": "format_game"},
+    "Albums":   {"artist": "artist", "label": "label", "genre": "genre",
+                 "sub_genre": "sub_genre", "format": "format_album"},
+    "TV Shows": {"format": "format_movie", "genre": "genre", "cast": "cast"},
+}
+
+# Field types whose lists belong to one category; all others are shared lists
+# with category_id NULL.
+SCOPED_FIELD_TYPES = {"genre", "sub_genre"}
+
+
 def _seed_field_values(db):
     """Seed default field values if the field_values table is empty."""
     existing = db.query(FieldValue).count()
@@ -90,73 +165,185 @@ def _seed_field_values(db):
 
     # Category-scoped genre + sub_genre
     cats = {c.name: c.id for c in db.query(Category).all()}
+    rows = []
 
-    for cat_name, genres in GENRE_SEEDS.items():
-        cat_id = cats.get(cat_name)
-        if cat_id is None:
-            continue
-        for i, g in enumerate(genres):
-            db.add(FieldValue(field_type="genre", category_id=cat_id, value=g, sort_order=i))
-
-    for cat_name, sub_genres in SUB_GENRE_SEEDS.items():
-        cat_id = cats.get(cat_name)
-        if cat_id is None:
-            continue
-        for i, sg in enumerate(sub_genres):
-            db.add(FieldValue(field_type="sub_genre", category_id=cat_id, value=sg, sort_order=i))
+    for field_type, seeds in (("genre", GENRE_SEEDS), ("sub_genre", SUB_GENRE_SEEDS)):
+        for cat_name, values in seeds.items():
+            cat_id = cats.get(cat_name)
+            if cat_id is None:
+                continue
+            rows += [{"field_type": field_type, "category_id": cat_id, "value": v, "sort_order": i}
+                     for i, v in enumerate(values)]
 
     # Shared (global) field values
     for field_type, values in SHARED_SEEDS.items():
-        for i, v in enumerate(values):
-            db.add(FieldValue(field_type=field_type, category_id=None, value=v, sort_order=i))
+        rows += [{"field_type": field_type, "category_id": None, "value": v, "sort_order": i}
+                 for i, v in enumerate(values)]
 
+    # One multi-row INSERT instead of an ORM flush of ~150 individual objects.
+    db.execute(insert(FieldValue), rows)
     db.commit()
 
 
-def init_db():
-    Base.metadata.create_all(bind=engine)
+def _add_missing_columns(conn) -> None:
+    """Add columns that models have gained since their table was created.
+
+    create_all() only creates missing *tables*, so an existing database would
+    otherwise never see a new column. Only nullable columns without server
+    defaults can be added with ALTER TABLE ... ADD COLUMN, which covers every
+    column added to this schema so far.
+    """
+    for table in Base.metadata.sorted_tables:
+        existing = {row[1] for row in conn.execute(text(f'PRAGMA table_info("{table.name}")'))}
+        for column in table.columns:
+            if column.name not in existing:
+                ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN {ddl}'))
+
+
+def init_db(bind=None) -> bool:
+    """Create, migrate and seed a library's database as needed.
 
-    with engine.connect() as conn:
+    ``bind`` is the library's engine (default: the default library). The
+    schema/seed version is kept in SQLite's ``user_version`` header field.
+    When it already equals SCHEMA_VERSION the database is known to be fully
+    set up and startup costs a single pragma read; otherwise the idempotent
+    slow path below runs and records the version at the end. Returns True
+    when the fast path was taken.
+    """
+    bind = engine if bind is None else bind
+    with bind.connect() as conn:
+        version = conn.execute(text("PRAGMA user_version")).scalar()
+    if version == SCHEMA_VERSION:
+        return True
+
+    Base.metadata.create_all(bind=bind)
+    with bind.begin() as conn:
+        _add_missing_columns(conn)
+
+    with bind.connect() as conn:
         # WAL (Write-Ahead Log) mode lets readers and one writer run concurrently
         # without blocking each other, which is important for a web server.
+        # The mode is stored in the database file, so setting it once is enough.
         conn.execute(text("PRAGMA journal_mode=WAL"))
         # SQLite does NOT enforce foreign keys by default; this pragma enables
         # ondelete="CASCADE" to actually work on every connection.
         conn.execute(text("PRAGMA foreign_keys=ON"))
 
     # Seed built-in categories if none exist
-    with SessionLocal() as db:
+    with Session(bind) as db:
         if db.query(Category).count() == 0:
-            for cat_data in BUILTIN_CATEGORIES:
-                db.add(Category(**cat_data))
+            db.execute(insert(Category), BUILTIN_CATEGORIES)
             db.commit()
 
         # Seed default field values
         _seed_field_values(db)
 
+    # Data migrations, keyed by the version that introduced them.
+    if version < 2:
+        # media_field_values is new: link existing items to their values.
+        from .crud import link_field_values
+        with Session(bind) as db:
+            link_field_values(db)
+            db.commit()
+    if version < 3:
+        # owned_at/rated_at are new. The last edit is the best available
+        # estimate for existing items (the dashboard's "Recently Owned" list
+        # already uses it), then the rollups are built from them.
+        from . import rollups
+        with Session(bind) as db:
+            db.execute(text("UPDATE media_items SET owned_at = COALESCE(updated_at, created_at) "
+                            "WHERE status = 'owned' AND owned_at IS NULL"))
+            db.execute(text("UPDATE media_items SET rated_at = COALESCE(updated_at, created_at) "
+                            "WHERE rating IS NOT NULL AND rated_at IS NULL"))
+            rollups.rebuild(db)
+            db.commit()
+    # Versions 4 and 5 only add tables (smart collections, maintenance runs),
+    # created above.
+    if version < 6:
+        # title_sort is new: compute it for existing items, then index it
+        # (create_all() only indexes tables it creates).
+        from .textkeys import title_sort_key
+        with Session(bind) as db:
+            rows = db.execute(text("SELECT id, title FROM media_items WHERE title_sort IS NULL")).all()
+            if rows:
+                db.execute(text("UPDATE media_items SET title_sort = :key WHERE id = :id"),
+                           [{"id": id_, "key": title_sort_key(title)} for id_, title in rows])
+            db.commit()
+        for index in MediaItem.__table__.indexes:
+            index.create(bind, checkfirst=True)
+
+    with bind.begin() as conn:
+        # Written last: a startup interrupted before this point simply runs
+        # the slow path again next time.
+        conn.execute(text(f"PRAGMA user_version = {SCHEMA_VERSION}"))
+    return False
 
-def purge_orphaned_uploads() -> None:
+
+def purge_orphaned_uploads(older_than: float | None = None, library: Library | None = None) -> None:
     """Delete upload files that are no longer referenced by any media item.
 
-    Runs at server startup so files left behind by cancelled edits, mid-edit
-    image replacements, or previous bugs are cleaned up before the app begins
-    serving requests.
+    Runs in the background after server startup (and after a library is
+    opened) so files left behind by cancelled edits, mid-edit image
+    replacements, or previous bugs are cleaned up without delaying the first
+    request. Files modified at or after ``older_than`` (a timestamp) are kept:
+    a cover uploaded since startup may simply not be saved to its item yet.
     """
+    library = library or DEFAULT_LIBRARY
     # Collect the bare filename portion of every /uploads/... URL in the DB.
-    with SessionLocal() as db:
+    with library.SessionLocal() as db:
         rows = db.execute(
             text("SELECT cover_image_url FROM media_items WHERE cover_image_url LIKE '/uploads/%'")
         ).fetchall()
     referenced = {row[0].removeprefix("/uploads/") for row in rows}
 
-    for f in UPLOADS_DIR.iterdir():
+    if not library.uploads_dir.is_dir():
+        return
+    for f in library.uploads_dir.iterdir():
         if f.is_file() and f.name not in referenced:
             try:
+                if older_than is not None and f.stat().st_mtime >= older_than:
+                    continue
                 f.unlink(missing_ok=True)
             except OSError:
                 pass  # Best-effort; a locked or missing file is not fatal
 
 
+# Set while POST /api/_batch runs its sub-requests, so they all use the
+# batch's session (and its read snapshot) instead of opening their own.
+_shared_session: ContextVar = ContextVar("shared_session", default=None)
+
+
+@contextmanager
+def shared_session(db):
+    """Make get_db() hand out ``db`` to every request dispatched in this context."""
+    token = _shared_session.set(db)
+    try:
+        yield db
+    finally:
+        _shared_session.reset(token)
+
+
+def is_shared(db) -> bool:
+    """Whether ``db`` is a batch's shared session (see shared_session())."""
+    return db is not None and _shared_session.get() is db
+
+
+@contextmanager
+def latest_session(db):
+    """``db``, or a new session on its engine while ``db`` is a batch's shared one.
+
+    For state kept across requests, such as the in-memory indexes: a batch's
+    session reads one pinned snapshot, so rows re-read through it would be
+    stored as they were before any later commit.
+    """
+    if not is_shared(db):
+        yield db
+        return
+    with Session(db.get_bind()) as latest:
+        yield latest
+
+
 def get_db():
     """FastAPI dependency that provides a database session per request.
 
@@ -164,7 +351,12 @@ def get_db():
     even if the route handler raises an exception. FastAPI calls next() to run
     the route, then resumes here after the response is sent.
     """
-    db = SessionLocal()
+    shared = _shared_session.get()
+    if shared is not None:
+        # Owned (and closed) by whoever set it; see shared_session().
+        yield shared
+        return
+    db = current_library().SessionLocal()
     try:
         yield db
     finally:
@@ -0,0 +1,283 @@
+"""Near-duplicate title detection with an in-memory trigram index.
+
+Large imported collections build up near-duplicates ("The Witcher 3" and
+"Witcher 3: Wild Hunt"). Comparing every pair of titles is O(n²), so titles
+are broken into trigrams, pg_trgm style: each folded word is padded as
+"  word " and every three-character window is a trigram. Similarity is the
+Jaccard index of two titles' trigram sets (shared / combined).
+
+The index maps each trigram to the ids of the items containing it. Candidate
+pairs come from *prefix filtering*: a title with |A| trigrams can only reach
+similarity t with titles sharing at least ceil(t·|A|) of them, so it is
+enough to look up its |A| - ceil(t·|A|) + 1 rarest trigrams. Common
+trigrams like "  t" are then never scanned, and only the candidates found
+that way are scored exactly.
+
+Numbers are not just more trigrams: "Witcher 2" and "Witcher 3" share most
+of theirs but are different games. Titles whose numbers differ (digits or
+roman numerals, so "Part II" still matches "Part 2") are never duplicates,
+whatever their similarity.
+
+Like the typeahead indexes (suggest.py) the index is loaded once and kept
+current through the change feed, so writes from any worker are reflected.
+"""
+import math
+import re
+import threading
+from functools import lru_cache
+from typing import Optional
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import changefeed
+from .database import latest_session
+from .models import MediaItem
+from .textkeys import fold
+
+DEFAULT_THRESHOLD = 0.4
+
+_WORD = re.compile(r"\w+")
+# Roman numerals up to 39 (higher ones spell words such as "mix" or "dim").
+_ROMAN = re.compile(r"x{0,3}(ix|iv|v?i{0,3})")
+_ROMAN_VALUES = {"i": 1, "v": 5, "x": 10}
+_CHUNK = 500
+
+
+def title_key(title: str) -> str:
+    """Folded words of ``title``; titles with the same key are exact duplicates."""
+    return " ".join(_WORD.findall(fold(title)))
+
+
+def _number(word: str) -> Optional[int]:
+    if word.isdigit():
+        return int(word)
+    if not _ROMAN.fullmatch(word):
+        return None
+    values = [_ROMAN_VALUES[c] for c in word]
+    # A smaller numeral before a larger one is subtracted (iv, ix, xix).
+    return sum(-v if i + 1 < len(values) and v < values[i + 1] else v for i, v in enumerate(values))
+
+
+@lru_cache(maxsize=100_000)
+def numbers(key: str) -> frozenset[int]:
+    """The numbers in a title key; titles with different ones are never duplicates."""
+    return frozenset(n for n in map(_number, key.split()) if n is not None)
+
+
+@lru_cache(maxsize=100_000)
+def _word_trigrams(word: str) -> frozenset[str]:
+    padded = f"  {word} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def trigrams(key: str) -> set[str]:
+    # Titles share far fewer distinct words than they have titles, so caching
+    # per word makes rebuilding a title's set (done for every candidate
+    # scored) a few set unions.
+    return set().union(*map(_word_trigrams, key.split()))
+
+
+def similarity(a: set[str], b: set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+class TrigramIndex:
+    """Trigram postings over the media titles of one database."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.dirty = changefeed.DirtySet("media")
+        # id → (title, category_id, title_key, trigram count)
+        self._items: dict[int, tuple[str, int, str, int]] = {}
+        # Lists rather than sets keep the postings compact; removals only
+        # happen on writes, where an O(n) list.remove is cheap enough.
+        self._postings: dict[str, list[int]] = {}
+
+    def _add(self, id_: int, title: str, category_id: int) -> None:
+        key = title_key(title)
+        grams = trigrams(key)
+        self._items[id_] = (title, category_id, key, len(grams))
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(id_)
+
+    def _remove(self, id_: int) -> None:
+        old = self._items.pop(id_, None)
+        if old is None:
+            return
+        for gram in trigrams(old[2]):
+            ids = self._postings[gram]
+            ids.remove(id_)
+            if not ids:
+                del self._postings[gram]
+
+    def _sync(self, db: Session) -> None:
+        # Caller holds _lock.
+        if not self.dirty.active:
+            self.dirty.activate()
+            self._items, self._postings = {}, {}
+            for id_, title, category_id in db.query(MediaItem.id, MediaItem.title, MediaItem.category_id):
+                self._add(id_, title, category_id)
+            return
+        changed = sorted(self.dirty.take()["media"])
+        for i in range(0, len(changed), _CHUNK):
+            ids = changed[i:i + _CHUNK]
+            rows = (db.query(MediaItem.id, MediaItem.title, MediaItem.category_id)
+                    .filter(MediaItem.id.in_(ids)).all())
+            for id_ in ids:
+                self._remove(id_)
+            for id_, title, category_id in rows:
+                self._add(id_, title, category_id)
+
+    def _candidates(self, grams: set[str], threshold: float) -> set[int]:
+        need = max(1, math.ceil(threshold * len(grams) - 1e-9))
+        rarest = sorted(grams, key=lambda g: len(self._postings.get(g, ())))
+        found = set()
+        for gram in rarest[:len(grams) - need + 1]:
+            found.update(self._postings.get(gram, ()))
+        return found
+
+    def similar(self, db: Session, title: str, threshold: float, limit: int,
+                category_id: Optional[int] = None, exclude_id: Optional[int] = None) -> list[dict]:
+        key = title_key(title)
+        grams, nums = trigrams(key), numbers(key)
+        if not grams:
+            return []
+        with self._lock:
+            with latest_session(db) as current:
+                self._sync(current)
+            scores: dict[str, float] = {}
+            matches = []
+            # Similarity can only reach the threshold between sizes within a
+            # factor of 1/threshold of each other.
+            low, high = threshold * len(grams), len(grams) / threshold
+            for id_ in self._candidates(grams, threshold):
+                item_title, item_category, key, size = self._items[id_]
+                if id_ == exclude_id or (category_id is not None and item_category != category_id):
+                    continue
+                if not low <= size <= high or numbers(key) != nums:
+                    continue
+                if key not in scores:
+                    scores[key] = similarity(grams, trigrams(key))
+                if scores[key] >= threshold:
+                    matches.append({"id": id_, "title": item_title, "category_id": item_category,
+                                    "similarity": round(scores[key], 3)})
+        matches.sort(key=lambda m: (-m["similarity"], m["title"], m["id"]))
+        return matches[:limit]
+
+    def clusters(self, db: Session, threshold: float, category_id: Optional[int] = None) -> list[dict]:
+        with self._lock:
+            with latest_session(db) as current:
+                self._sync(current)
+            # Items with the same (category, key) are exact duplicates and
+            # form one node, so similarity is computed per pair of distinct
+            # keys rather than per pair of items.
+            node_ids: dict[tuple[int, str], list[int]] = {}
+            for id_, (_, item_category, key, _) in self._items.items():
+                if category_id is None or item_category == category_id:
+                    node_ids.setdefault((item_category, key), []).append(id_)
+            nodes = list(node_ids)
+            # Each node's trigrams, rarest first by the global postings.
+            frequency = {gram: len(ids) for gram, ids in self._postings.items()}
+            grams = [sorted(trigrams(key), key=lambda g: (frequency.get(g, 0), g)) for _, key in nodes]
+            titles = {id_: self._items[id_][0] for ids in node_ids.values() for id_ in ids}
+
+        parent = list(range(len(nodes)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        # AllPairs with prefix filtering, visiting nodes from fewest trigrams
+        # to most: a node only has to meet earlier nodes through its prefix,
+        # and only prefixes are indexed. Pairs already in one cluster are
+        # skipped without scoring, since clusters only need connectivity.
+        # Prefixes are kept per category and set of numbers, so titles that
+        # differ in either never meet.
+        sets = [set(g) for g in grams]
+        prefixes: dict[tuple[tuple[int, frozenset[int]], str], list[int]] = {}
+        for i in sorted(range(len(nodes)), key=lambda n: len(grams[n])):
+            size = len(grams[i])
+            if not size:
+                continue
+            group = (nodes[i][0], numbers(nodes[i][1]))
+            prefix = grams[i][:size - max(1, math.ceil(threshold * size - 1e-9)) + 1]
+            seen = set()
+            for gram in prefix:
+                for j in prefixes.get((group, gram), ()):
+                    if j in seen:
+                        continue
+                    seen.add(j)
+                    # Earlier nodes are no larger; too small means too dissimilar.
+                    if len(grams[j]) < threshold * size or find(i) == find(j):
+                        continue
+                    if similarity(sets[i], sets[j]) >= threshold:
+                        parent[find(j)] = find(i)
+            for gram in prefix:
+                prefixes.setdefault((group, gram), []).append(i)
+
+        groups: dict[int, list[int]] = {}
+        for i in range(len(nodes)):
+            groups.setdefault(find(i), []).append(i)
+
+        result = []
+        for members in groups.values():
+            ids = [id_ for i in members for id_ in node_ids[nodes[i]]]
+            if len(ids) < 2:
+                continue
+            items = sorted(({"id": id_, "title": titles[id_]} for id_ in ids),
+                           key=lambda item: (item["title"], item["id"]))
+            result.append({"category_id": nodes[members[0]][0], "items": items})
+        result.sort(key=lambda c: (-len(c["items"]), c["items"][0]["title"]))
+        return result
+
+
+_indexes: dict[Engine, TrigramIndex] = {}
+
+
+def _attach(feed: changefeed.ChangeFeed) -> None:
+    index = _indexes[feed.engine] = TrigramIndex()
+    feed.listen(index.dirty)
+
+
+changefeed.on_new_feed(_attach)
+changefeed.on_feed_closed(lambda feed: _indexes.pop(feed.engine, None))
+
+
+def _for_engine(engine: Engine) -> TrigramIndex:
+    changefeed.get_feed(engine)  # attaches an index on first use
+    return _indexes[engine]
+
+
+def _for_session(db: Session) -> TrigramIndex:
+    bind = db.get_bind()
+    return _for_engine(bind if isinstance(bind, Engine) else bind.engine)
+
+
+def warm(engine: Engine) -> None:
+    """Build the index now instead of on the first check."""
+    index = _for_engine(engine)
+    with Session(engine) as db, index._lock:
+        index._sync(db)
+
+
+def find_similar_titles(db: Session, title: str, threshold: float = DEFAULT_THRESHOLD,
+                        limit: int = 10, category_id: Optional[int] = None,
+                        exclude_id: Optional[int] = None) -> list[dict]:
+    """Existing items whose titles are at least ``threshold`` similar to ``title``."""
+    return _for_session(db).similar(db, title, threshold, limit, category_id, exclude_id)
+
+
+def find_duplicate_clusters(db: Session, threshold: float = DEFAULT_THRESHOLD,
+                            category_id: Optional[int] = None) -> list[dict]:
+    """Groups of likely duplicates within each category, largest first.
+
+    Items are linked when their titles are at least ``threshold`` similar, and
+    linked items form one cluster (so a cluster can chain A~B~C).
+    """
+    return _for_session(db).clusters(db, threshold, category_id)
@@ -0,0 +1,165 @@
+"""Change events for ``GET /api/events``, fed by the change log.
+
+Events are not published by the code that makes a change. Instead the broker
+listens to the ``ChangeFeed`` (see changefeed.py), which reads committed
+change_log rows — so a client connected to any worker process sees changes
+made through every worker, and event ids are change_log seq values that mean
+the same thing in every process.
+
+Each SSE client holds a ``Subscriber`` with a bounded queue:
+
+- Backpressure: a client that falls more than QUEUE_SIZE events behind is not
+  allowed to grow memory without bound. Its queue is dropped and it receives
+  a single ``resync`` event, telling it to refetch instead of patching.
+- Replay: the last REPLAY_SIZE events are kept so a reconnecting client that
+  sends ``Last-Event-ID`` catches up without a full refetch; if its id has
+  already fallen out of the ring it gets ``resync`` instead.
+
+The feed is polled from threadpool workers and a background task, so
+delivery to each subscriber hops onto that subscriber's event loop with
+``call_soon_threadsafe``.
+
+Each library's database has its own feed and therefore its own broker
+(``broker_for``); MAX_SUBSCRIBERS caps the clients of all of them together.
+"""
+import asyncio
+import json
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import timezone
+
+from sqlalchemy.engine import Engine
+
+from . import changefeed
+
+QUEUE_SIZE = 256
+REPLAY_SIZE = 1024
+MAX_SUBSCRIBERS = 100
+
+# Shared by every broker, so the cap holds however many libraries are open.
+_slots = threading.BoundedSemaphore(MAX_SUBSCRIBERS)
+
+# change_log op → event type suffix
+_OP_NAMES = {"create": "created", "update": "updated", "delete": "deleted"}
+
+
+@dataclass
+class Event:
+    id: int
+    type: str
+    data: dict
+
+    def to_sse(self) -> str:
+        payload = json.dumps({"type": self.type, **self.data}, separators=(",", ":"))
+        return f"id: {self.id}\nevent: change\ndata: {payload}\n\n"
+
+
+RESYNC = Event(id=0, type="resync", data={})
+
+
+@dataclass(eq=False)
+class Subscriber:
+    loop: asyncio.AbstractEventLoop
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(QUEUE_SIZE))
+
+    def _deliver(self, event: Event) -> None:
+        # Runs on the subscriber's own loop, so queue operations are safe.
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow consumer: discard its backlog and tell it to resync.
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+
+class EventBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._replay: deque[Event] = deque(maxlen=REPLAY_SIZE)
+        # Every event with id > _floor is in the replay ring.
+        self._floor: int | None = None
+        self._latest = 0
+        self._subscribers: set[Subscriber] = set()
+
+    def attach(self, feed: changefeed.ChangeFeed) -> None:
+        with self._lock:
+            if self._floor is None:
+                self._floor = self._latest = feed.start_seq
+        feed.listen(self._on_changes)
+
+    def subscribe(self, last_event_id: int | None = None) -> Subscriber | None:
+        """Register a client; returns None when the subscriber cap is reached."""
+        sub = Subscriber(loop=asyncio.get_running_loop())
+        if not _slots.acquire(blocking=False):
+            return None
+        with self._lock:
+            self._subscribers.add(sub)
+            if last_event_id is not None:
+                if self._floor is None or last_event_id < self._floor or last_event_id > self._latest:
+                    # The gap is no longer in the replay ring, or the id is
+                    # from a database this process has never seen.
+                    missed = [RESYNC]
+                else:
+                    missed = [e for e in self._replay if e.id > last_event_id]
+                for e in missed[-QUEUE_SIZE:]:
+                    sub.queue.put_nowait(e)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        with self._lock:
+            if sub not in self._subscribers:
+                return
+            self._subscribers.discard(sub)
+        _slots.release()
+
+    def _on_changes(self, changes: list[changefeed.Change]) -> None:
+        events = [
+            Event(
+                id=c.seq,
+                type=f"{c.entity}.{_OP_NAMES.get(c.op, 'updated')}",
+                data={"id": c.entity_id, **c.payload,
+                      # changed_at is stored as naive UTC.
+                      "ts": round(c.changed_at.replace(tzinfo=timezone.utc).timestamp(), 3)
+                      if c.changed_at else None},
+            )
+            for c in changes
+        ]
+        with self._lock:
+            for e in events:
+                if len(self._replay) == self._replay.maxlen:
+                    self._floor = self._replay[0].id
+                self._replay.append(e)
+            self._latest = events[-1].id
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            for e in events:
+                try:
+                    sub.loop.call_soon_threadsafe(sub._deliver, e)
+                except RuntimeError:
+                    # The subscriber's loop has closed (server shutting down).
+                    self.unsubscribe(sub)
+                    break
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+
+_brokers: dict[Engine, EventBroker] = {}
+
+
+def _attach(feed: changefeed.ChangeFeed) -> None:
+    broker = _brokers[feed.engine] = EventBroker()
+    broker.attach(feed)
+
+
+changefeed.on_new_feed(_attach)
+changefeed.on_feed_closed(lambda feed: _brokers.pop(feed.engine, None))
+
+
+def broker_for(engine: Engine) -> EventBroker:
+    changefeed.get_feed(engine)  # attaches a broker on first use
+    return _brokers[engine]
@@ -0,0 +1,301 @@
+"""Several libraries served by one process, one SQLite file each.
+
+A household can keep separate libraries. Each one is a folder under
+``data/libraries/<name>/`` with its own ``media_tracker.db`` and ``uploads/``,
+so writes to one library never wait on another's write lock. The default
+library stays where it always was (``data/media_tracker.db``), so a
+single-library install is unaffected.
+
+A request picks its library with a path prefix, ``/lib/<name>/...`` (the
+prefix is stripped before routing, so the frontend, API and covers all work
+below it), or with an ``X-Library: <name>`` header; without either it gets
+the default library. ``LibraryMiddleware`` resolves the name and makes the
+library current for the request (see ``database.current_library``).
+
+Libraries other than the default are opened on first use through a
+``LibraryPool``: a least-recently-used set of at most ``MAX_OPEN`` open
+libraries, each with a small connection pool and its change feed. A
+library that falls off the end, or stays unused for ``IDLE_SECONDS``, is
+closed: its WAL is checkpointed into the database file, its connections,
+feed and in-memory indexes are released. So file descriptors and memory
+are bounded by the number of *open* libraries, not the number that exist.
+A library in use by a running request (or an open event stream) is never
+closed; the pool briefly exceeds ``MAX_OPEN`` instead.
+"""
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi.staticfiles import StaticFiles
+from starlette.responses import JSONResponse
+from sqlalchemy import text
+
+from . import changefeed, metrics, slowlog
+from .database import (DATA_DIR, DEFAULT_LIBRARY, Library, current_library, init_db,
+                       make_engine, purge_orphaned_uploads, use_library)
+
+LIBRARIES_DIR = DATA_DIR / "libraries"
+MAX_OPEN = int(os.environ.get("MEDIA_TRACKER_MAX_OPEN_LIBRARIES") or 32)
+IDLE_SECONDS = float(os.environ.get("MEDIA_TRACKER_LIBRARY_IDLE_SECONDS") or 300)
+SWEEP_INTERVAL = 30
+
+NAME_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+_PREFIX = re.compile(r"^/lib/([^/]+)(/.*)?$")
+
+# Connections kept open per library. Most requests need one; the rest of the
+# pool is opened on demand and closed again.
+_POOL_OPTIONS = {"pool_size": 2, "max_overflow": 8}
+
+
+class LibraryNotFound(LookupError):
+    pass
+
+
+def exists(name: str) -> bool:
+    return bool(NAME_PATTERN.match(name)) and (LIBRARIES_DIR / name / "media_tracker.db").exists()
+
+
+def list_names() -> list[str]:
+    if not LIBRARIES_DIR.is_dir():
+        return []
+    return sorted(p.name for p in LIBRARIES_DIR.iterdir() if exists(p.name))
+
+
+def open_library(name: str, create: bool = False) -> Library:
+    """A Library for ``name``, outside the pool; ``create`` makes its folder.
+
+    Does not run init_db(). The caller owns the library: ``close()`` it when
+    done.
+    """
+    if name == DEFAULT_LIBRARY.name:
+        return DEFAULT_LIBRARY
+    if not NAME_PATTERN.match(name):
+        raise LibraryNotFound(f"Invalid library name {name!r}")
+    if not create and not exists(name):
+        raise LibraryNotFound(f"Unknown library {name!r}")
+    data_dir = LIBRARIES_DIR / name
+    (data_dir / "uploads").mkdir(parents=True, exist_ok=True)
+    lib = Library(name, data_dir, make_engine(data_dir / "media_tracker.db", **_POOL_OPTIONS))
+    changefeed.install(lib.SessionLocal)
+    if metrics.ENABLED:
+        metrics.install(lib.engine)
+    if slowlog.ENABLED:
+        slowlog.install(lib.engine)
+    return lib
+
+
+def close(lib: Library) -> None:
+    """Release everything a library holds: feed, indexes, connections."""
+    if lib is DEFAULT_LIBRARY:
+        return
+    changefeed.close_feed(lib.engine)
+    try:
+        with lib.engine.connect() as conn:
+            # Fold the WAL back into the database file, so a closed library
+            # is one self-contained file again.
+            conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+    except Exception:
+        pass  # a busy checkpoint is retried by SQLite on the next open
+    lib.engine.dispose()
+
+
+class _Entry:
+    def __init__(self):
+        self.library: Optional[Library] = None
+        self.error: Optional[Exception] = None
+        self.ready = threading.Event()
+        self.users = 0
+        self.last_used = time.monotonic()
+
+
+class LibraryPool:
+    """Open libraries by name, least recently used first."""
+
+    def __init__(self, max_open: int = MAX_OPEN, idle_seconds: float = IDLE_SECONDS):
+        self.max_open = max_open
+        self.idle_seconds = idle_seconds
+        self._lock = threading.Lock()
+        self._open: OrderedDict[str, _Entry] = OrderedDict()
+        self.opened = self.closed = 0
+
+    def acquire(self, name: str) -> Library:
+        """Open (or reuse) library ``name`` for one user; pair with release()."""
+        with self._lock:
+            entry = self._open.get(name)
+            if entry is not None:
+                entry.users += 1
+                self._open.move_to_end(name)
+                opening = False
+            else:
+                if not exists(name):
+                    raise LibraryNotFound(f"Unknown library {name!r}")
+                entry = self._open[name] = _Entry()
+                entry.users = 1
+                opening = True
+        if opening:
+            # Opened outside the pool lock: init_db() may have migrations to
+            # run, and other libraries must not wait for that.
+            try:
+                lib = open_library(name)
+                init_db(lib.engine)
+                entry.library = lib
+                self.opened += 1
+            except Exception as e:
+                entry.error = e
+                with self._lock:
+                    if self._open.get(name) is entry:
+                        del self._open[name]
+            entry.ready.set()
+            if entry.library is not None:
+                threading.Thread(target=purge_orphaned_uploads, args=(time.time(), entry.library),
+                                 daemon=True).start()
+                self._evict(self._lru_victims())
+        else:
+            entry.ready.wait()
+        if entry.error is not None:
+            raise entry.error
+        return entry.library
+
+    def try_acquire(self, name: str, touch: bool = True) -> Optional[Library]:
+        """acquire() for a library that is already open; None otherwise.
+
+        ``touch=False`` (background maintenance) holds the library without
+        counting as a use, so it still closes once idle.
+        """
+        with self._lock:
+            entry = self._open.get(name)
+            if entry is None or entry.library is None:
+                return None
+            entry.users += 1
+            if touch:
+                entry.last_used = time.monotonic()
+                self._open.move_to_end(name)
+            return entry.library
+
+    def release(self, lib: Library, touch: bool = True) -> None:
+        with self._lock:
+            entry = self._open.get(lib.name)
+            if entry is not None and entry.library is lib:
+                entry.users -= 1
+                if touch:
+                    entry.last_used = time.monotonic()
+
+    def _lru_victims(self) -> list[Library]:
+        with self._lock:
+            victims = []
+            excess = len(self._open) - self.max_open
+            for name, entry in list(self._open.items()):
+                if excess <= 0:
+                    break
+                if entry.users == 0 and entry.library is not None:
+                    del self._open[name]
+                    victims.append(entry.library)
+                    excess -= 1
+            return victims
+
+    def _evict(self, victims: list[Library]) -> None:
+        for lib in victims:
+            close(lib)
+            self.closed += 1
+
+    def sweep(self) -> int:
+        """Close libraries unused for idle_seconds; returns how many."""
+        deadline = time.monotonic() - self.idle_seconds
+        with self._lock:
+            victims = []
+            for name, entry in list(self._open.items()):
+                if entry.users == 0 and entry.library is not None and entry.last_used < deadline:
+                    del self._open[name]
+                    victims.append(entry.library)
+        self._evict(victims)
+        return len(victims)
+
+    def close_all(self) -> None:
+        with self._lock:
+            victims = [e.library for e in self._open.values() if e.library is not None]
+            self._open.clear()
+        self._evict(victims)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_open": self.max_open,
+                "idle_seconds": self.idle_seconds,
+                "opened": self.opened,
+                "closed": self.closed,
+                "open": [{"name": name, "users": e.users,
+                          "idle_seconds": round(time.monotonic() - e.last_used, 1)}
+                         for name, e in self._open.items()],
+            }
+
+
+pool = LibraryPool()
+
+
+async def sweep_idle(interval: float = SWEEP_INTERVAL) -> None:
+    """Background task: close libraries nobody has used for a while."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(pool.sweep)
+        except Exception:
+            pass
+
+
+def _requested(scope) -> tuple[Optional[str], Optional[str]]:
+    """(library name, path without the /lib/<name> prefix) for a request."""
+    match = _PREFIX.match(scope["path"])
+    if match:
+        return match.group(1), match.group(2) or "/"
+    for key, value in scope.get("headers", ()):
+        if key == b"x-library":
+            return value.decode("latin-1").strip(), None
+    return None, None
+
+
+class LibraryMiddleware:
+    """Make the requested library current for the rest of the request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        name, path = _requested(scope)
+        if path is not None:
+            scope = dict(scope, path=path, raw_path=path.encode())
+        if not name or name == DEFAULT_LIBRARY.name:
+            with use_library(DEFAULT_LIBRARY):
+                await self.app(scope, receive, send)
+            return
+        try:
+            # Opening may run init_db(), so it happens off the event loop.
+            lib = pool.try_acquire(name) or await asyncio.to_thread(pool.acquire, name)
+        except LibraryNotFound as e:
+            await JSONResponse({"detail": str(e)}, status_code=404)(scope, receive, send)
+            return
+        try:
+            with use_library(lib):
+                await self.app(scope, receive, send)
+        finally:
+            pool.release(lib)
+
+
+class UploadsApp:
+    """Serves /uploads/<file> from the current library's uploads folder."""
+
+    def __init__(self):
+        self._apps: dict[str, StaticFiles] = {}
+
+    async def __call__(self, scope, receive, send):
+        lib = current_library()
+        app = self._apps.get(str(lib.uploads_dir))
+        if app is None:
+            app = self._apps[str(lib.uploads_dir)] = StaticFiles(directory=lib.uploads_dir, check_dir=False)
+        await app(scope, receive, send)
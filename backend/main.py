@@ -1,3 +1,4 @@
+import asyncio
 import time
 import uuid
 from contextlib import asynccontextmanager
@@ -8,8 +9,14 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse, JSONResponse
 
-from .database import init_db, DATA_DIR, UPLOADS_DIR, purge_orphaned_uploads
-from .routers import media, categories, tags, stats, field_values
+from . import (
+    changefeed, duplicates, libraries, maintenance, metrics, replica, similar, slowlog, suggest, workers,
+)
+from .database import DEFAULT_LIBRARY, SessionLocal, init_db, current_library, purge_orphaned_uploads
+from .routers import media, categories, tags, stats, field_values, admin, events, sync, health, batch, analytics
+from .routers import collections
+from .routers import libraries as libraries_router
+from .routers import metrics as metrics_router
 
 FRONTEND_DIR = Path(__file__).resolve().parent.parent / "frontend"
 
@@ -24,26 +31,96 @@ ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     init_db()
-    purge_orphaned_uploads()
+    background, startup = [], []
+    if replica.ENABLED:
+        # Kiosk mode: sessions read an in-memory copy, reloaded after the
+        # file changes on disk. Nothing here writes, so neither the upload
+        # purge nor maintenance runs.
+        await asyncio.to_thread(replica.start, DEFAULT_LIBRARY)
+        background.append(asyncio.create_task(replica.watch()))
+    else:
+        # Orphan cleanup scans the uploads directory, so it runs off the
+        # startup path; only files that predate this start are eligible.
+        startup.append(asyncio.create_task(asyncio.to_thread(purge_orphaned_uploads, time.time())))
+        if maintenance.ENABLED:
+            # ANALYZE, checkpoints and VACUUM when the libraries are quiet.
+            background.append(asyncio.create_task(maintenance.schedule()))
+    # The in-memory copy's engine in kiosk mode.
+    engine = DEFAULT_LIBRARY.engine
+    # Open the change feed now (rather than on the first commit) so SSE
+    # clients and caches start receiving changes from startup onwards, and
+    # watch for commits made by other worker processes.
+    changefeed.get_feed(engine)
+    watcher = asyncio.create_task(changefeed.watch())
+    # Close other libraries (see libraries.py) once they sit unused.
+    sweeper = asyncio.create_task(libraries.sweep_idle())
+    # Load the typeahead, duplicate-title and similarity indexes in the
+    # background too, so the first keystroke, save or "more like this" does
+    # not pay for reading every item.
+    startup += [asyncio.create_task(asyncio.to_thread(m.warm, engine)) for m in (suggest, duplicates, similar)]
+    workers.mark_ready()
     yield
+    workers.mark_stopped()
+    watcher.cancel()
+    sweeper.cancel()
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*startup, return_exceptions=True)
+    libraries.pool.close_all()
+    changefeed.close_feed(engine)
+    if replica.ENABLED:
+        replica.stop()
+    else:
+        # Leave a small WAL behind; other libraries were checkpointed as they closed.
+        await asyncio.to_thread(maintenance.checkpoint_on_shutdown)
 
 
 app = FastAPI(title="Media Tracker", version="1.0.0", lifespan=lifespan)
 
+# Deliver change_log rows to the change feed right after each local commit.
+changefeed.install(SessionLocal)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:8765", "http://127.0.0.1:8765"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets the frontend (and dev tools on other origins) read per-request timings.
+    expose_headers=["Server-Timing"],
 )
 
+# Instrumentation is opt-in; when disabled none of it is wired in at all.
+if metrics.ENABLED:
+    metrics.install(DEFAULT_LIBRARY.engine)
+    app.add_middleware(metrics.MetricsMiddleware)
+
+if slowlog.ENABLED:
+    slowlog.install(DEFAULT_LIBRARY.engine)
+
+# Kiosk mode refuses writes before they reach a route (see replica.py).
+if replica.ENABLED:
+    app.add_middleware(replica.ReadOnlyMiddleware)
+
+# Outermost, so the /lib/<name> prefix is gone before anything else routes.
+app.add_middleware(libraries.LibraryMiddleware)
+
 # API routers
 app.include_router(media.router, prefix="/api")
 app.include_router(categories.router, prefix="/api")
 app.include_router(tags.router, prefix="/api")
+app.include_router(collections.router, prefix="/api")
 app.include_router(stats.router, prefix="/api")
 app.include_router(field_values.router, prefix="/api")
+app.include_router(admin.router, prefix="/api")
+app.include_router(events.router, prefix="/api")
+app.include_router(sync.router, prefix="/api")
+app.include_router(health.router, prefix="/api")
+app.include_router(batch.router, prefix="/api")
+app.include_router(analytics.router, prefix="/api")
+app.include_router(libraries_router.router, prefix="/api")
+if metrics.ENABLED:
+    app.include_router(metrics_router.router, prefix="/api")
 
 
 @app.post("/api/upload/cover")
@@ -57,15 +134,15 @@ async def upload_cover(file: UploadFile = File(...)):
     # Use a UUID hex as the filename to prevent collisions and path-traversal
     # attacks (the original filename from the client is intentionally discarded).
     filename = f"{uuid.uuid4().hex}{ext}"
-    dest = UPLOADS_DIR / filename
+    dest = current_library().uploads_dir / filename
     content = await file.read()
     dest.write_bytes(content)
 
     return JSONResponse({"url": f"/uploads/{filename}"})
 
 
-# Serve uploaded covers
-app.mount("/uploads", StaticFiles(directory=UPLOADS_DIR), name="uploads")
+# Serve uploaded covers, from the folder of the library the request is for
+app.mount("/uploads", libraries.UploadsApp(), name="uploads")
 
 # Serve frontend static files
 app.mount("/css", StaticFiles(directory=FRONTEND_DIR / "css"), name="css")
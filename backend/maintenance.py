@@ -0,0 +1,366 @@
+"""Database maintenance: change_log pruning, ANALYZE, PRAGMA optimize, VACUUM, WAL checkpoints.
+
+Left alone, a SQLite library slowly degrades. Query plans are chosen from
+statistics that ANALYZE last gathered (or never did), so they drift as
+the data grows. The ``-wal`` file is checkpointed automatically but never
+shrinks. Pages freed by deletes stay in the file. ``schedule()``, started
+from ``lifespan``, looks at each open library every ``CHECK_INTERVAL``
+seconds and runs what is due:
+
+- checkpoint — when the WAL has grown past ``CHECKPOINT_WAL_BYTES``: PASSIVE
+  (never waits for anyone) while writes are coming in, TRUNCATE (which
+  also shrinks the file back to zero) once the library is idle;
+- analyze — once idle, after enough changes since the last ANALYZE
+  (``ANALYZE_MIN_CHANGES``, or ``ANALYZE_CHANGE_SHARE`` of the items);
+- optimize — ``PRAGMA optimize`` once idle, at most every ``OPTIMIZE_EVERY``;
+- vacuum — only after ``VACUUM_IDLE_SECONDS`` without writes, when at least
+  ``VACUUM_FREE_SHARE`` of the file is free pages, at most once a day;
+- prune — once idle, at most once a day: deletes change_log rows older than
+  ``CHANGE_LOG_DAYS``, always keeping the newest ``CHANGE_LOG_KEEP_ROWS``.
+
+A row is only pruned once every change feed has read it. This process's
+feed for the library is asked directly (``changefeed.consumed_seq``). Feeds
+in other workers cannot be, but a feed starts at the end of the log and
+polls every half second, so a row days old and thousands of rows behind
+the newest has long been delivered by any feed that was running when it
+was written. A sync client whose token predates the oldest kept row is
+told to reset (see ``crud.get_changes_since``).
+
+"Idle" and the write rate come from change_log, so writes made by any
+worker count. Each task's last run is recorded in maintenance_runs, which
+also lets exactly one worker claim a task at a time. On shutdown a PASSIVE
+then TRUNCATE checkpoint leaves a small WAL behind. ``python run.py
+maintain`` runs every task on demand, and ``GET /api/admin/maintenance``
+shows the last runs.
+
+Maintenance uses its own sqlite3 connections (like backup.py), outside the
+SQLAlchemy pool and its statement hooks, so a VACUUM never shows up as a
+slow request query.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from . import changefeed
+from .database import DEFAULT_LIBRARY, Library
+
+ENABLED = os.environ.get("MEDIA_TRACKER_MAINTENANCE", "1").lower() not in ("0", "false", "no", "off")
+CHECK_INTERVAL = 60
+IDLE_SECONDS = float(os.environ.get("MEDIA_TRACKER_MAINTENANCE_IDLE_SECONDS") or 120)
+
+CHECKPOINT_WAL_BYTES = 4 * 1024 * 1024
+ANALYZE_MIN_CHANGES = 1000
+ANALYZE_CHANGE_SHARE = 0.1
+OPTIMIZE_EVERY = timedelta(hours=1)
+VACUUM_IDLE_SECONDS = 15 * 60
+VACUUM_FREE_SHARE = 0.25
+VACUUM_MIN_FREE_BYTES = 8 * 1024 * 1024
+VACUUM_EVERY = timedelta(days=1)
+CHANGE_LOG_DAYS = float(os.environ.get("MEDIA_TRACKER_CHANGE_LOG_DAYS") or 30)
+CHANGE_LOG_KEEP_ROWS = 10000
+PRUNE_EVERY = timedelta(days=1)
+
+# Run in this order: pruning frees pages a VACUUM can reclaim, and a VACUUM
+# leaves the whole database in the WAL, which the checkpoint after it folds
+# back and truncates.
+TASKS = ("prune", "analyze", "optimize", "vacuum", "checkpoint")
+
+# A claim older than this belongs to a worker that died mid-task.
+_STALE_CLAIM = timedelta(hours=1)
+# Writes counted for the "changes in the last hour" figure, at most.
+_RATE_WINDOW_ROWS = 5000
+# change_log rows deleted per statement, so writers are never held up long.
+_PRUNE_BATCH = 5000
+
+
+class _State:
+    """What the due checks look at, read once per pass."""
+
+    def __init__(self, conn: sqlite3.Connection, library: Library):
+        self.library = library
+        row = conn.execute("SELECT seq, changed_at FROM change_log ORDER BY seq DESC LIMIT 1").fetchone()
+        self.seq = row[0] if row else 0
+        last_change = datetime.fromisoformat(row[1]) if row and row[1] else None
+        self.idle_seconds = (datetime.utcnow() - last_change).total_seconds() if last_change else float("inf")
+        hour_ago = _stamp(datetime.utcnow() - timedelta(hours=1))
+        # Bounded: walks at most the newest _RATE_WINDOW_ROWS rows by seq.
+        self.changes_last_hour = conn.execute(
+            "SELECT COUNT(*) FROM change_log WHERE seq > ? AND changed_at >= ?",
+            (self.seq - _RATE_WINDOW_ROWS, hour_ago),
+        ).fetchone()[0]
+        row = conn.execute("SELECT seq, changed_at FROM change_log ORDER BY seq LIMIT 1").fetchone()
+        self.oldest_seq = row[0] if row else 0
+        self.oldest_change = datetime.fromisoformat(row[1]) if row and row[1] else None
+        self.log_rows = self.seq - self.oldest_seq + 1 if row else 0
+        self.items = conn.execute("SELECT COUNT(*) FROM media_items").fetchone()[0]
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        self.size_bytes = conn.execute("PRAGMA page_count").fetchone()[0] * page_size
+        self.free_bytes = conn.execute("PRAGMA freelist_count").fetchone()[0] * page_size
+        self.wal_path = library.db_path.with_name(library.db_path.name + "-wal")
+        self.wal_bytes = _size(self.wal_path)
+
+    @property
+    def idle(self) -> bool:
+        return self.idle_seconds >= IDLE_SECONDS
+
+    def as_dict(self) -> dict:
+        return {
+            "size_bytes": self.size_bytes,
+            "free_bytes": self.free_bytes,
+            "wal_bytes": self.wal_bytes,
+            "items": self.items,
+            "changes_last_hour": self.changes_last_hour,
+            "change_log_rows": self.log_rows,
+            "idle_seconds": None if self.idle_seconds == float("inf") else round(self.idle_seconds),
+        }
+
+
+def _size(path) -> int:
+    return path.stat().st_size if path.exists() else 0
+
+
+def _stamp(dt: datetime) -> str:
+    # The text form SQLAlchemy uses for DateTime columns on SQLite.
+    return dt.isoformat(sep=" ", timespec="microseconds")
+
+
+def _connect(library: Library, timeout: float = 5.0) -> sqlite3.Connection:
+    # Autocommit: VACUUM and checkpoints cannot run inside a transaction.
+    return sqlite3.connect(library.db_path, isolation_level=None, timeout=timeout)
+
+
+def _last_runs(conn: sqlite3.Connection) -> dict[str, dict]:
+    conn.row_factory = sqlite3.Row
+    try:
+        return {row["task"]: dict(row) for row in conn.execute("SELECT * FROM maintenance_runs")}
+    finally:
+        conn.row_factory = None
+
+
+def _since(last: Optional[dict], every: timedelta) -> bool:
+    """Whether ``every`` has passed since the task last finished (or it never ran)."""
+    if not last or not last.get("last_finished_at"):
+        return True
+    return datetime.utcnow() - datetime.fromisoformat(last["last_finished_at"]) >= every
+
+
+def _due(task: str, state: _State, last: Optional[dict]) -> Optional[str]:
+    """Why ``task`` should run now, or None."""
+    if task == "checkpoint":
+        if state.wal_bytes >= CHECKPOINT_WAL_BYTES:
+            return f"WAL is {state.wal_bytes // 1024} KiB"
+        return None
+    if not state.idle:
+        return None
+    if task == "analyze":
+        changes = state.seq - (last or {}).get("change_seq", 0)
+        threshold = max(ANALYZE_MIN_CHANGES, int(state.items * ANALYZE_CHANGE_SHARE))
+        if not last and state.items:
+            return "never analyzed"
+        if changes >= threshold:
+            return f"{changes} changes since last run"
+        return None
+    if task == "prune":
+        if (state.log_rows > CHANGE_LOG_KEEP_ROWS
+                and state.oldest_change is not None
+                and datetime.utcnow() - state.oldest_change >= timedelta(days=CHANGE_LOG_DAYS)
+                and _since(last, PRUNE_EVERY)):
+            return f"oldest change is {(datetime.utcnow() - state.oldest_change).days} days old"
+        return None
+    if task == "optimize":
+        return "hourly" if _since(last, OPTIMIZE_EVERY) else None
+    if task == "vacuum":
+        if (state.idle_seconds >= VACUUM_IDLE_SECONDS
+                and state.free_bytes >= VACUUM_MIN_FREE_BYTES
+                and state.free_bytes >= state.size_bytes * VACUUM_FREE_SHARE
+                and _since(last, VACUUM_EVERY)):
+            return f"{state.free_bytes // 1024} KiB free"
+        return None
+    raise ValueError(f"unknown maintenance task {task!r}")
+
+
+# ── Tasks ────────────────────────────────────────────────────────────────────
+
+def _prune(conn: sqlite3.Connection, state: _State, truncate: bool) -> dict:
+    cutoff = _stamp(datetime.utcnow() - timedelta(days=CHANGE_LOG_DAYS))
+    # Walks the old rows by seq up to the first one inside the retention window.
+    row = conn.execute(
+        "SELECT seq FROM change_log WHERE changed_at >= ? ORDER BY seq LIMIT 1", (cutoff,)
+    ).fetchone()
+    upper = min(row[0] - 1 if row else state.seq, state.seq - CHANGE_LOG_KEEP_ROWS)
+    consumed = changefeed.consumed_seq(state.library.engine)
+    if consumed is not None:
+        upper = min(upper, consumed)
+    deleted, lower = 0, state.oldest_seq - 1
+    while lower < upper:
+        lower = min(lower + _PRUNE_BATCH, upper)
+        deleted += conn.execute("DELETE FROM change_log WHERE seq <= ?", (lower,)).rowcount
+    return {"deleted": deleted, "kept_from_seq": max(upper, state.oldest_seq - 1) + 1}
+
+
+def _checkpoint(conn: sqlite3.Connection, state: _State, truncate: bool) -> dict:
+    mode = "TRUNCATE" if truncate else "PASSIVE"
+    busy, _, _ = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+    return {"mode": mode, "busy": bool(busy),
+            "wal_bytes_before": state.wal_bytes, "wal_bytes_after": _size(state.wal_path)}
+
+
+def _analyze(conn: sqlite3.Connection, state: _State, truncate: bool) -> dict:
+    conn.execute("ANALYZE")
+    return {"items": state.items}
+
+
+def _optimize(conn: sqlite3.Connection, state: _State, truncate: bool) -> dict:
+    conn.execute("PRAGMA optimize")
+    return {}
+
+
+def _vacuum(conn: sqlite3.Connection, state: _State, truncate: bool) -> dict:
+    conn.execute("VACUUM")
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    size = conn.execute("PRAGMA page_count").fetchone()[0] * page_size
+    return {"size_bytes_before": state.size_bytes, "size_bytes_after": size,
+            "freed_bytes": state.size_bytes - size}
+
+
+_RUNNERS = {"prune": _prune, "checkpoint": _checkpoint, "analyze": _analyze, "optimize": _optimize, "vacuum": _vacuum}
+
+
+def _claim(conn: sqlite3.Connection, task: str) -> bool:
+    """Mark ``task`` as running; False if another worker already is."""
+    now = datetime.utcnow()
+    conn.execute("INSERT OR IGNORE INTO maintenance_runs (task, runs, change_seq) VALUES (?, 0, 0)", (task,))
+    claimed = conn.execute(
+        "UPDATE maintenance_runs SET running_since = ? "
+        "WHERE task = ? AND (running_since IS NULL OR running_since < ?)",
+        (_stamp(now), task, _stamp(now - _STALE_CLAIM)),
+    ).rowcount
+    return claimed == 1
+
+
+def _run_task(conn: sqlite3.Connection, task: str, state: _State, reason: str, truncate: bool) -> dict:
+    if not _claim(conn, task):
+        return {"skipped": "running in another worker"}
+    started_at = datetime.utcnow()
+    started = time.perf_counter()
+    result, error = {}, None
+    try:
+        result = _RUNNERS[task](conn, state, truncate)
+    except sqlite3.Error as e:
+        # Typically "database is locked": retried at the next due check.
+        error = str(e)
+    duration_ms = round((time.perf_counter() - started) * 1000, 1)
+    conn.execute(
+        "UPDATE maintenance_runs SET running_since = NULL, last_started_at = ?, last_finished_at = ?, "
+        "duration_ms = ?, runs = runs + 1, change_seq = ?, result = ?, error = ? WHERE task = ?",
+        (_stamp(started_at), _stamp(datetime.utcnow()), duration_ms, state.seq,
+         json.dumps({"reason": reason, **result}), error, task),
+    )
+    return {"reason": reason, "duration_ms": duration_ms, **result, **({"error": error} if error else {})}
+
+
+def run(library: Library = DEFAULT_LIBRARY, tasks: Iterable[str] = TASKS, force: bool = False) -> dict:
+    """Run the ``tasks`` that are due in ``library`` (all of them with ``force``).
+
+    Returns ``{task: outcome}`` for the tasks that ran or were skipped.
+    """
+    conn = _connect(library)
+    try:
+        state = _State(conn, library)
+        last = _last_runs(conn)
+        outcomes = {}
+        for task in (t for t in TASKS if t in set(tasks)):
+            reason = "requested" if force else _due(task, state, last.get(task))
+            if not reason:
+                continue
+            outcomes[task] = _run_task(conn, task, state, reason, truncate=force or state.idle)
+            if task == "vacuum":
+                state = _State(conn, library)  # the checkpoint after it sees the new WAL
+        return outcomes
+    finally:
+        conn.close()
+
+
+def checkpoint_on_shutdown(library: Library = DEFAULT_LIBRARY) -> dict:
+    """PASSIVE, then TRUNCATE if nothing else holds the database.
+
+    Other workers may still be serving; the TRUNCATE only waits briefly for
+    them, and a busy result is harmless: whichever closes last truncates.
+    """
+    try:
+        conn = _connect(library, timeout=0.2)
+    except sqlite3.Error:
+        return {}
+    try:
+        state = _State(conn, library)
+        outcome = {"passive": _checkpoint(conn, state, truncate=False)}
+        try:
+            outcome["truncate"] = _checkpoint(conn, state, truncate=True)
+        except sqlite3.Error as e:
+            outcome["truncate"] = {"error": str(e)}
+        return outcome
+    except sqlite3.Error as e:
+        return {"error": str(e)}
+    finally:
+        conn.close()
+
+
+def stats(library: Library = DEFAULT_LIBRARY) -> dict:
+    """Last run of every task plus the database's current size and activity."""
+    conn = _connect(library)
+    try:
+        state = _State(conn, library)
+        last = _last_runs(conn)
+    finally:
+        conn.close()
+    tasks = {}
+    for task in TASKS:
+        row = last.get(task) or {}
+        tasks[task] = {
+            "runs": row.get("runs", 0),
+            "running_since": row.get("running_since"),
+            "last_started_at": row.get("last_started_at"),
+            "last_finished_at": row.get("last_finished_at"),
+            "duration_ms": row.get("duration_ms"),
+            "result": json.loads(row["result"]) if row.get("result") else None,
+            "error": row.get("error"),
+            "due": _due(task, state, row or None),
+        }
+    return {"enabled": ENABLED, "database": state.as_dict(), "tasks": tasks}
+
+
+def _open_libraries():
+    """The default library and each pooled one that is open right now."""
+    from . import libraries
+    yield DEFAULT_LIBRARY
+    for entry in libraries.pool.stats()["open"]:
+        # Held while maintained, so the pool cannot close it meanwhile.
+        lib = libraries.pool.try_acquire(entry["name"], touch=False)
+        if lib is None:
+            continue
+        try:
+            yield lib
+        finally:
+            libraries.pool.release(lib, touch=False)
+
+
+def _run_all_due() -> None:
+    for lib in _open_libraries():
+        try:
+            run(lib)
+        except sqlite3.Error:
+            pass  # e.g. locked while reading state; tried again next interval
+
+
+async def schedule(interval: float = CHECK_INTERVAL) -> None:
+    """Background task: run due maintenance in every open library."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(_run_all_due)
+        except Exception:
+            pass
@@ -0,0 +1,217 @@
+"""Request and SQL instrumentation.
+
+Enabled with MEDIA_TRACKER_METRICS=1 (``python run.py --metrics``). When it is
+off nothing in this module is wired into the app — no middleware, no SQL
+event listeners — so the disabled cost is zero rather than merely small.
+
+When on:
+- ``MetricsMiddleware`` times every HTTP request and files it under its route
+  template (``/api/media/{item_id}``, not ``/api/media/42``) so label
+  cardinality stays bounded.
+- ``install(engine)`` hooks ``before/after_cursor_execute`` to count
+  statements and DB time, attributed to the request that issued them.
+- ``render()`` produces Prometheus text exposition for ``/api/_metrics``.
+- Each response carries a ``Server-Timing`` header (db time + statement
+  count, total app time) that browser dev tools display per request.
+"""
+import os
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from . import pagecache
+
+ENABLED = os.environ.get("MEDIA_TRACKER_METRICS", "").lower() in ("1", "true", "yes", "on")
+
+# Histogram bucket upper bounds in seconds (Prometheus convention).
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+@dataclass
+class RequestStats:
+    """Per-request accumulator, shared by reference with threadpool workers."""
+    statements: int = 0
+    db_seconds: float = 0.0
+
+
+# Holds the RequestStats of the request currently being served. Starlette runs
+# sync endpoints and dependencies in a threadpool with a copy of this context,
+# so the SQL hooks below see the same (mutable) object as the middleware.
+_current: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+
+
+class _Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency: dict[tuple[str, str], _Histogram] = {}
+        self.responses: dict[tuple[str, str, int], int] = {}
+        self.db_statements: dict[tuple[str, str], int] = {}
+        self.db_seconds: dict[tuple[str, str], float] = {}
+
+    def record(self, method: str, route: str, status: int, seconds: float, stats: RequestStats) -> None:
+        key = (method, route)
+        with self.lock:
+            hist = self.latency.get(key)
+            if hist is None:
+                hist = self.latency[key] = _Histogram()
+            hist.observe(seconds)
+            rkey = (method, route, status)
+            self.responses[rkey] = self.responses.get(rkey, 0) + 1
+            self.db_statements[key] = self.db_statements.get(key, 0) + stats.statements
+            self.db_seconds[key] = self.db_seconds.get(key, 0.0) + stats.db_seconds
+
+
+registry = _Registry()
+
+
+# ── SQL hooks ────────────────────────────────────────────────────────────────
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's own execution context, not the connection: a
+    # statement that raises never reaches after_cursor_execute, and its start
+    # time then goes away with the context instead of being paired with the
+    # next statement's end.
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    stats = _current.get()
+    if stats is not None:
+        stats.statements += 1
+        if started is not None:
+            stats.db_seconds += time.perf_counter() - started
+
+
+def install(engine: Engine) -> None:
+    """Attach the statement counters to ``engine`` (idempotent)."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# ── Middleware ───────────────────────────────────────────────────────────────
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (no BaseHTTPMiddleware) so streaming responses and
+    background tasks are not buffered or re-wrapped."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                app_ms = (time.perf_counter() - started) * 1000
+                header = (f'db;dur={stats.db_seconds * 1000:.2f};desc="{stats.statements} queries", '
+                          f"app;dur={app_ms:.2f}")
+                message.setdefault("headers", [])
+                message["headers"] = [*message["headers"], (b"server-timing", header.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            # The router stores the matched route in the scope; unmatched
+            # requests share one label instead of one per raw path.
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            registry.record(scope["method"], template, status, time.perf_counter() - started, stats)
+
+
+# ── Exposition ───────────────────────────────────────────────────────────────
+
+def _labels(**labels) -> str:
+    parts = []
+    for k, v in labels.items():
+        v = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def render() -> str:
+    """Render all metrics in Prometheus text exposition format 0.0.4."""
+    out = []
+    with registry.lock:
+        out.append("# HELP media_tracker_http_request_duration_seconds HTTP request latency by route.")
+        out.append("# TYPE media_tracker_http_request_duration_seconds histogram")
+        for (method, route), hist in sorted(registry.latency.items()):
+            cumulative = 0
+            for bound, n in zip(BUCKETS, hist.counts):
+                cumulative += n
+                out.append(f"media_tracker_http_request_duration_seconds_bucket"
+                           f"{_labels(method=method, route=route, le=bound)} {cumulative}")
+            out.append(f"media_tracker_http_request_duration_seconds_bucket"
+                       f"{_labels(method=method, route=route, le='+Inf')} {hist.count}")
+            out.append(f"media_tracker_http_request_duration_seconds_sum"
+                       f"{_labels(method=method, route=route)} {hist.total:.6f}")
+            out.append(f"media_tracker_http_request_duration_seconds_count"
+                       f"{_labels(method=method, route=route)} {hist.count}")
+
+        out.append("# HELP media_tracker_http_responses_total HTTP responses by route and status code.")
+        out.append("# TYPE media_tracker_http_responses_total counter")
+        for (method, route, status), n in sorted(registry.responses.items()):
+            out.append(f"media_tracker_http_responses_total{_labels(method=method, route=route, status=status)} {n}")
+
+        out.append("# HELP media_tracker_db_statements_total SQL statements executed, by route.")
+        out.append("# TYPE media_tracker_db_statements_total counter")
+        for (method, route), n in sorted(registry.db_statements.items()):
+            out.append(f"media_tracker_db_statements_total{_labels(method=method, route=route)} {n}")
+
+        out.append("# HELP media_tracker_db_seconds_total Time spent executing SQL, by route.")
+        out.append("# TYPE media_tracker_db_seconds_total counter")
+        for (method, route), s in sorted(registry.db_seconds.items()):
+            out.append(f"media_tracker_db_seconds_total{_labels(method=method, route=route)} {s:.6f}")
+
+    cache = pagecache.cache.stats()
+    out.append("# HELP media_tracker_page_cache_lookups_total /api/media page cache lookups by result.")
+    out.append("# TYPE media_tracker_page_cache_lookups_total counter")
+    out.append(f"media_tracker_page_cache_lookups_total{_labels(result='hit')} {cache['hits']}")
+    out.append(f"media_tracker_page_cache_lookups_total{_labels(result='miss')} {cache['misses']}")
+    out.append("# HELP media_tracker_page_cache_stale_total Cached pages dropped because their data changed.")
+    out.append("# TYPE media_tracker_page_cache_stale_total counter")
+    out.append(f"media_tracker_page_cache_stale_total {cache['stale']}")
+    out.append("# HELP media_tracker_page_cache_evictions_total Cached pages evicted to stay under the size cap.")
+    out.append("# TYPE media_tracker_page_cache_evictions_total counter")
+    out.append(f"media_tracker_page_cache_evictions_total {cache['evictions']}")
+    out.append("# HELP media_tracker_page_cache_bytes Size of the cached page bodies.")
+    out.append("# TYPE media_tracker_page_cache_bytes gauge")
+    out.append(f"media_tracker_page_cache_bytes {cache['bytes']}")
+    out.append("# HELP media_tracker_page_cache_entries Number of cached pages.")
+    out.append("# TYPE media_tracker_page_cache_entries gauge")
+    out.append(f"media_tracker_page_cache_entries {cache['entries']}")
+    return "\n".join(out) + "\n"
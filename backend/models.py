@@ -1,6 +1,6 @@
 from datetime import datetime
 from sqlalchemy import (
-    Column, Integer, String, Text, DateTime, ForeignKey, UniqueConstraint
+    Column, Integer, Float, String, Text, DateTime, ForeignKey, Index, UniqueConstraint
 )
 from sqlalchemy.orm import relationship, DeclarativeBase
 
@@ -56,6 +56,9 @@ class MediaItem(Base):
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     title = Column(String, nullable=False)
+    # textkeys.title_sort_key(title), written by crud alongside the title;
+    # what sort_by=title orders (and pages) by.
+    title_sort = Column(String, nullable=True)
     category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
     status = Column(String, nullable=False, default="wishlist")
     rating = Column(String, nullable=True)
@@ -68,11 +71,26 @@ class MediaItem(Base):
     metadata_json = Column("metadata", Text, nullable=True, default="{}")
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # When the item last became owned / received its current rating; NULL
+    # while on the wishlist / unrated. These place the item in the activity
+    # rollups (see ActivityRollup).
+    owned_at = Column(DateTime, nullable=True)
+    rated_at = Column(DateTime, nullable=True)
 
     category = relationship("Category", back_populates="media_items")
     # cascade="all, delete-orphan": deleting a MediaItem automatically removes
     # all of its MediaTag rows (junction table entries).
     media_tags = relationship("MediaTag", back_populates="media_item", cascade="all, delete-orphan")
+    # Same for the item's links to field-list values.
+    field_links = relationship("MediaFieldValue", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        # A category tab sorted by title reads this index in order; the
+        # implicit rowid at the end is the id tiebreaker of the keyset.
+        Index("ix_media_items_category_title_sort", "category_id", "title_sort"),
+        # The same for the unfiltered library.
+        Index("ix_media_items_title_sort", "title_sort"),
+    )
 
 
 class FieldValue(Base):
@@ -89,3 +107,120 @@ class FieldValue(Base):
     __table_args__ = (
         UniqueConstraint("field_type", "category_id", "value", name="uq_field_value"),
     )
+
+
+class MediaFieldValue(Base):
+    """Junction table linking media items to the field-list values in their metadata.
+
+    Item metadata stores values as plain strings; this table records which
+    FieldValue each one refers to, so usage counts and "items with this
+    director" are index lookups rather than a JSON parse of every row, and a
+    rename can find exactly the items to rewrite. crud keeps it in step with
+    each item's metadata and category.
+    """
+    __tablename__ = "media_field_values"
+
+    media_id = Column(Integer, ForeignKey("media_items.id", ondelete="CASCADE"), primary_key=True)
+    field_value_id = Column(Integer, ForeignKey("field_values.id", ondelete="CASCADE"), primary_key=True)
+    # Metadata key holding the value, e.g. "format" for field_type "format_book".
+    field_key = Column(String, nullable=False)
+
+    __table_args__ = (
+        Index("ix_media_field_values_value", "field_value_id", "media_id"),
+    )
+
+
+class ActivityRollup(Base):
+    """Per-period activity counts for one category (see backend/rollups.py).
+
+    Maintained incrementally by crud, so dashboard charts read a handful of
+    rows instead of grouping every media item by date.
+    """
+    __tablename__ = "activity_rollups"
+
+    bucket = Column(String, primary_key=True)        # "week" or "month"
+    period_start = Column(String, primary_key=True)  # ISO date: Monday / 1st of month
+    category_id = Column(Integer, ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True)
+    items_added = Column(Integer, nullable=False, default=0)
+    items_owned = Column(Integer, nullable=False, default=0)
+    ratings_given = Column(Integer, nullable=False, default=0)
+
+
+class SmartCollection(Base):
+    """A saved search shown in the sidebar (see backend/smart_collections.py).
+
+    ``rules`` is the JSON filter definition. The items matching it are kept
+    in smart_collection_items rather than found by running the filter each
+    time the collection is opened.
+    """
+    __tablename__ = "smart_collections"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String, nullable=False, unique=True)
+    icon = Column(String, default="✨")
+    rules = Column(Text, nullable=False, default="{}")
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class SmartCollectionItem(Base):
+    """Membership of a smart collection, maintained by crud on every item write."""
+    __tablename__ = "smart_collection_items"
+
+    collection_id = Column(Integer, ForeignKey("smart_collections.id", ondelete="CASCADE"), primary_key=True)
+    media_id = Column(Integer, ForeignKey("media_items.id", ondelete="CASCADE"), primary_key=True)
+
+    __table_args__ = (
+        # For removing an item from every collection it is in.
+        Index("ix_smart_collection_items_media", "media_id"),
+    )
+
+
+class ChangeLog(Base):
+    """Append-only log of committed changes, backing delta sync (/api/sync).
+
+    ``seq`` doubles as the sync token: a client that has seen everything up to
+    seq N asks for rows with seq > N. Rows are written in the same transaction
+    as the change they describe, so the log can never disagree with the data.
+    Deleted rows leave an op="delete" entry behind, which is what lets sync
+    report tombstones. Rows past the retention window are pruned by
+    maintenance.py; a token older than the oldest row left must resync.
+    """
+    __tablename__ = "change_log"
+
+    seq = Column(Integer, primary_key=True)
+    # "media" | "tag" | "category" | "field_value" | "collection"
+    entity = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    # "create" | "update" | "delete"
+    op = Column(String, nullable=False)
+    # JSON object with routing hints for clients (e.g. category_id), or NULL.
+    payload = Column(Text, nullable=True)
+    changed_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_change_log_entity", "entity", "entity_id"),
+        # AUTOINCREMENT guarantees seq values are never reused, even after the
+        # newest rows are deleted — a reused seq would corrupt client tokens.
+        {"sqlite_autoincrement": True},
+    )
+
+
+class MaintenanceRun(Base):
+    """The last run of one database maintenance task (see backend/maintenance.py).
+
+    Kept in the database rather than in memory so every worker process sees
+    the same history, and ``running_since`` lets exactly one of them claim a
+    task at a time.
+    """
+    __tablename__ = "maintenance_runs"
+
+    task = Column(String, primary_key=True)   # "checkpoint" | "optimize" | "analyze" | "vacuum"
+    running_since = Column(DateTime, nullable=True)
+    last_started_at = Column(DateTime, nullable=True)
+    last_finished_at = Column(DateTime, nullable=True)
+    duration_ms = Column(Float, nullable=True)
+    runs = Column(Integer, nullable=False, default=0)
+    # change_log seq when the task last ran; "changes since" drives ANALYZE.
+    change_seq = Column(Integer, nullable=False, default=0)
+    result = Column(Text, nullable=True)      # JSON, task specific
+    error = Column(Text, nullable=True)
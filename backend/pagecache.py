@@ -0,0 +1,191 @@
+"""Cache of /api/media list pages, invalidated by data versions.
+
+The library view asks for the same few pages over and over — the default
+sort, each category tab, a status filter — and each one runs the joined item
+query plus a ``count()``, then validates and encodes 50 items. This cache
+keeps the encoded JSON body of such pages, keyed by the normalised filter,
+sort and paging parameters, in one least-recently-used map capped at
+``MAX_BYTES`` of response bodies (``MEDIA_TRACKER_PAGE_CACHE_MB``, 0 turns it
+off).
+
+Entries are not expired by time. Each is stored with the *data version* it
+was built at and is only served while that version is current:
+
+- every change logged by a crud write (see ``crud._log_change``) bumps the
+  library's global version;
+- a media change also bumps the version of its category (and of the one it
+  moved out of); any other change — a tag, category or field value edited,
+  which can alter how items in every category are shown — bumps a shared
+  base version.
+
+A page filtered to one category depends on (base, that category) only, so
+editing a book leaves the cached movie tabs valid; an unfiltered page
+depends on the global version. Versions follow the change feed, whose rows
+come from the database, so a write made by another worker invalidates this
+worker's pages too: each lookup first runs the feed's ``check()``, a single
+``PRAGMA data_version`` when nothing has changed.
+
+Sub-requests of ``POST /api/_batch`` neither read nor fill the cache: they
+read the batch's pinned snapshot, which the versions may have moved past.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import changefeed
+from .database import is_shared
+
+MAX_BYTES = int(float(os.environ.get("MEDIA_TRACKER_PAGE_CACHE_MB") or 32) * 1024 * 1024)
+# A single page may take at most this share of the cache, so one huge page
+# cannot flush everything else.
+_MAX_ENTRY_SHARE = 8
+
+
+class DataVersions:
+    """Change-feed listener counting changes per library and per category."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.all = 0
+        self.base = 0
+        self.categories: dict[int, int] = {}
+
+    def __call__(self, changes: list[changefeed.Change]) -> None:
+        with self._lock:
+            for c in changes:
+                self.all += 1
+                touched = [c.payload.get("category_id"), c.payload.get("previous_category_id")]
+                if c.entity != "media" or touched[0] is None:
+                    self.base += 1
+                    continue
+                for category_id in set(touched):
+                    if category_id is not None:
+                        self.categories[category_id] = self.categories.get(category_id, 0) + 1
+
+    def token(self, category_id: Optional[int]) -> tuple:
+        """What a page for ``category_id`` (None = all) depends on."""
+        with self._lock:
+            if category_id is None:
+                return (self.all,)
+            return (self.base, self.categories.get(category_id, 0))
+
+
+class PageCache:
+    """LRU of encoded pages, bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes: int = MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # (engine, params) → (version token, body)
+        self._entries: OrderedDict[tuple, tuple[tuple, bytes]] = OrderedDict()
+        self.size = 0
+        self.hits = self.misses = self.stale = self.evictions = 0
+
+    def get(self, key: tuple, token: tuple) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] != token:
+                # Built before a change it depends on; dropped now rather
+                # than left to age out.
+                self._remove(key)
+                self.stale += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: tuple, token: tuple, body: bytes) -> None:
+        if len(body) > self.max_bytes // _MAX_ENTRY_SHARE:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (token, body)
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: tuple) -> None:
+        _, body = self._entries.pop(key)
+        self.size -= len(body)
+
+    def drop_engine(self, engine: Engine) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if k[0] is engine]:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.max_bytes > 0,
+                "entries": len(self._entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            }
+
+
+cache = PageCache()
+
+_versions: dict[Engine, DataVersions] = {}
+
+
+def _attach(feed: changefeed.ChangeFeed) -> None:
+    versions = _versions[feed.engine] = DataVersions()
+    feed.listen(versions)
+
+
+def _detach(feed: changefeed.ChangeFeed) -> None:
+    _versions.pop(feed.engine, None)
+    cache.drop_engine(feed.engine)
+
+
+changefeed.on_new_feed(_attach)
+changefeed.on_feed_closed(_detach)
+
+
+def get_or_build(db: Session, params: dict[str, Hashable], build: Callable[[], bytes]) -> bytes:
+    """The cached body for ``params``, or ``build()``'s, which is then cached.
+
+    ``params`` must already be normalised (equivalent requests, equal dicts);
+    its ``category_id`` decides which data version the page depends on.
+    """
+    if cache.max_bytes <= 0 or is_shared(db):
+        # A batch reads one snapshot pinned before its sub-requests run. The
+        # versions may already be past it, so a page built there could be
+        # stored under a token it does not match, and a cached page could be
+        # newer than the rest of the batch.
+        return build()
+    bind = db.get_bind()
+    engine = bind if isinstance(bind, Engine) else bind.engine
+    feed = changefeed.get_feed(engine)
+    # Picks up commits from other workers before the version is read.
+    feed.check()
+    # Read before building: a change committed while the page is built
+    # moves the version, so that page is never served as current.
+    token = _versions[engine].token(params.get("category_id"))
+    key = (engine, tuple(sorted(params.items())))
+    body = cache.get(key, token)
+    if body is None:
+        body = build()
+        cache.put(key, token, body)
+    return body
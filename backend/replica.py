@@ -0,0 +1,181 @@
+"""Read-only replica mode: serve the library from an in-memory copy.
+
+Wall displays and kiosks only browse. With ``MEDIA_TRACKER_READ_REPLICA=1``
+(``run.py --kiosk``) the default library is copied into an in-memory SQLite
+database at startup with the backup API. Every request session is bound to
+that copy, so reads never touch the disk file. Writes are refused by
+``ReadOnlyMiddleware``, and the replica's connections are ``query_only``
+as well.
+
+Another instance writes the library on disk. ``watch()`` polls the disk
+file's ``PRAGMA data_version`` every ``REFRESH_INTERVAL`` seconds. When it
+moves, a new copy is loaded next to the current one and swapped in
+atomically. Requests already running finish on the copy they started with,
+and the next session gets the new one. The engine object stays the same, so
+the change feed, page cache and in-memory indexes, all keyed by engine,
+carry on. After a swap the feed reads the new change_log rows and
+invalidates incrementally, as it does after a commit.
+
+Each copy is a shared-cache ``mode=memory`` database, kept alive by one
+anchor connection and never written after it is loaded, so readers never
+wait on each other or on a refresh. Covers are still served from the
+library's uploads folder. Other libraries (``/lib/<name>``) are read from
+disk, and writes to them are refused too.
+"""
+import asyncio
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+from starlette.responses import JSONResponse
+
+from . import changefeed, metrics, slowlog
+from .database import Library
+
+ENABLED = os.environ.get("MEDIA_TRACKER_READ_REPLICA", "").lower() in ("1", "true", "yes", "on")
+REFRESH_INTERVAL = 0.5
+
+# Still allowed: reads, and the batch endpoint, which only dispatches GETs.
+_SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+_READ_ONLY_POSTS = {"/api/_batch"}
+
+_names = itertools.count(1)
+
+
+class Replica:
+    """An in-memory copy of one library's database, refreshed by swapping."""
+
+    def __init__(self, library: Library):
+        self.library = library
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._uri: Optional[str] = None
+        self._anchor: Optional[sqlite3.Connection] = None
+        # Held open so PRAGMA data_version compares commits between checks.
+        self._disk = sqlite3.connect(library.db_path, isolation_level=None, check_same_thread=False)
+        self._disk_version: Optional[int] = None
+        self.engine = create_engine("sqlite://", creator=self._connect, poolclass=QueuePool,
+                                    pool_size=5, max_overflow=10)
+        self.loads = 0
+        self.loaded_at: Optional[datetime] = None
+        self.load_ms: Optional[float] = None
+        self.size_bytes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        with self._lock:
+            uri = self._uri
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def load(self) -> None:
+        """Copy the disk database into a new in-memory database and switch to it."""
+        with self._refresh_lock:
+            started = time.perf_counter()
+            # Read before copying: a commit during the copy moves it again,
+            # so the next check loads once more.
+            version = self._disk.execute("PRAGMA data_version").fetchone()[0]
+            uri = f"file:media-tracker-replica-{next(_names)}?mode=memory&cache=shared"
+            anchor = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            # One step: the copy is a single consistent snapshot.
+            self._disk.backup(anchor)
+            page_size = anchor.execute("PRAGMA page_size").fetchone()[0]
+            size = anchor.execute("PRAGMA page_count").fetchone()[0] * page_size
+            with self._lock:
+                old, self._anchor, self._uri = self._anchor, anchor, uri
+            # Pooled connections to the old copy are closed; checked-out ones
+            # are closed when their request returns them.
+            self.engine.dispose()
+            if old is not None:
+                # The feed keeps its own connection: point it at the new
+                # copy and deliver the change_log rows it brought.
+                changefeed.get_feed(self.engine).reconnect()
+                old.close()
+            self._disk_version = version
+            self.loads += 1
+            self.loaded_at = datetime.utcnow()
+            self.load_ms = round((time.perf_counter() - started) * 1000, 1)
+            self.size_bytes = size
+
+    def refresh(self) -> bool:
+        """Load a new copy if the disk database changed; True if it did."""
+        version = self._disk.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._disk_version:
+            return False
+        self.load()
+        return True
+
+    def close(self) -> None:
+        self.engine.dispose()
+        with self._lock:
+            if self._anchor is not None:
+                self._anchor.close()
+                self._anchor = None
+        self._disk.close()
+
+    def stats(self) -> dict:
+        return {
+            "library": self.library.name,
+            "loads": self.loads,
+            "loaded_at": self.loaded_at,
+            "load_ms": self.load_ms,
+            "size_bytes": self.size_bytes,
+        }
+
+
+replica: Optional[Replica] = None
+
+
+def start(library: Library) -> Replica:
+    """Load ``library`` into memory and bind its sessions to the copy.
+
+    Call after init_db(), before anything opens the library's change feed.
+    """
+    global replica
+    replica = Replica(library)
+    replica.load()
+    if metrics.ENABLED:
+        metrics.install(replica.engine)
+    if slowlog.ENABLED:
+        slowlog.install(replica.engine)
+    library.engine = replica.engine
+    library.SessionLocal.configure(bind=replica.engine)
+    return replica
+
+
+def stop() -> None:
+    """Drop the copy; call after the engine's change feed is closed."""
+    if replica is not None:
+        replica.close()
+
+
+async def watch(interval: float = REFRESH_INTERVAL) -> None:
+    """Background task: swap in a new copy after the disk database changes."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(replica.refresh)
+        except Exception:
+            pass  # e.g. the disk file is locked mid-checkpoint; next interval
+
+
+class ReadOnlyMiddleware:
+    """Refuse every request that could write (405), before it is routed."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] == "http" and scope["method"] not in _SAFE_METHODS
+                and scope["path"] not in _READ_ONLY_POSTS):
+            response = JSONResponse({"detail": "This instance is a read-only replica"},
+                                    status_code=405, headers={"Allow": "GET, HEAD"})
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
@@ -0,0 +1,147 @@
+"""Weekly and monthly activity rollups for the dashboard charts.
+
+Each activity_rollups row holds, for one (bucket, period, category), how many
+items were added, became owned and were rated in that period. Counting these
+on demand would mean strftime() GROUP BYs over every item on each dashboard
+load; instead the crud write path applies each change to the few rows it
+affects, and a chart reads a bounded number of periods.
+
+The counts describe the library as it is now: an item counts as added in the
+period of its created_at, as owned in the period of its owned_at and as rated
+in the period of its rated_at (the time its current rating was given).
+Deleting an item, or moving it back to the wishlist, takes it out again. That
+keeps the table exactly reproducible from media_items, which is what
+``rebuild()`` does.
+"""
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from .models import ActivityRollup
+
+BUCKETS = ("week", "month")
+DEFAULT_PERIODS = {"week": 26, "month": 12}
+
+# (category_id, created_at, owned_at, rated_at) — what an item contributes.
+ItemKey = tuple[int, Optional[datetime], Optional[datetime], Optional[datetime]]
+
+_METRICS = ("items_added", "items_owned", "ratings_given")
+
+_UPSERT = text("""
+    INSERT INTO activity_rollups (bucket, period_start, category_id, items_added, items_owned, ratings_given)
+    VALUES (:bucket, :period_start, :category_id, :items_added, :items_owned, :ratings_given)
+    ON CONFLICT (bucket, period_start, category_id) DO UPDATE SET
+        items_added   = items_added   + excluded.items_added,
+        items_owned   = items_owned   + excluded.items_owned,
+        ratings_given = ratings_given + excluded.ratings_given
+""")
+
+# Same period boundaries as period_start(), in SQLite date arithmetic:
+# 'weekday 0' moves forward to Sunday (or stays), so -6 days is that ISO
+# week's Monday.
+_PERIOD_SQL = {
+    "week": "date({col}, 'weekday 0', '-6 days')",
+    "month": "strftime('%Y-%m-01', {col})",
+}
+
+
+def period_start(bucket: str, ts: datetime | date) -> str:
+    """ISO date of the first day of the week (Monday) or month containing ``ts``."""
+    d = ts.date() if isinstance(ts, datetime) else ts
+    if bucket == "week":
+        d -= timedelta(days=d.weekday())
+    else:
+        d = d.replace(day=1)
+    return d.isoformat()
+
+
+def _previous(bucket: str, start: date) -> date:
+    if bucket == "week":
+        return start - timedelta(days=7)
+    return (start - timedelta(days=1)).replace(day=1)
+
+
+def item_key(item) -> ItemKey:
+    return (item.category_id, item.created_at, item.owned_at, item.rated_at)
+
+
+def record(db: Session, before: Optional[ItemKey], after: Optional[ItemKey]) -> None:
+    """Move an item's contribution from ``before`` to ``after`` (None = absent).
+
+    Runs in the caller's transaction. Unchanged timestamps cancel out, so a
+    typical edit writes nothing and a status change touches two rows.
+    """
+    deltas: dict[tuple[str, str, int], list[int]] = {}
+    for sign, key in ((-1, before), (1, after)):
+        if key is None:
+            continue
+        category_id, *stamps = key
+        for metric, ts in enumerate(stamps):
+            if ts is None:
+                continue
+            for bucket in BUCKETS:
+                counts = deltas.setdefault((bucket, period_start(bucket, ts), category_id), [0, 0, 0])
+                counts[metric] += sign
+    rows = [
+        {"bucket": bucket, "period_start": start, "category_id": category_id, **dict(zip(_METRICS, counts))}
+        for (bucket, start, category_id), counts in deltas.items() if any(counts)
+    ]
+    if rows:
+        db.execute(_UPSERT, rows)
+
+
+def rebuild(db: Session) -> int:
+    """Recompute every rollup row from media_items; returns the row count.
+
+    Used by the schema migration and ``run.py rebuild-rollups`` (e.g. after
+    editing the database by hand). Runs in the caller's transaction.
+    """
+    db.query(ActivityRollup).delete()
+    for bucket in BUCKETS:
+        period = _PERIOD_SQL[bucket]
+        db.execute(text(f"""
+            INSERT INTO activity_rollups (bucket, period_start, category_id, items_added, items_owned, ratings_given)
+            SELECT :bucket, period, category_id, SUM(a), SUM(o), SUM(r) FROM (
+                SELECT {period.format(col="created_at")} AS period, category_id, 1 AS a, 0 AS o, 0 AS r
+                FROM media_items WHERE created_at IS NOT NULL
+                UNION ALL
+                SELECT {period.format(col="owned_at")}, category_id, 0, 1, 0
+                FROM media_items WHERE owned_at IS NOT NULL
+                UNION ALL
+                SELECT {period.format(col="rated_at")}, category_id, 0, 0, 1
+                FROM media_items WHERE rated_at IS NOT NULL
+            ) GROUP BY period, category_id
+        """), {"bucket": bucket})
+    return db.query(func.count()).select_from(ActivityRollup).scalar()
+
+
+def timeseries(db: Session, bucket: str, category_id: Optional[int] = None,
+               periods: Optional[int] = None, today: Optional[date] = None) -> list[dict]:
+    """The last ``periods`` periods up to the current one, oldest first.
+
+    Periods without activity are included with zero counts so charts get an
+    evenly spaced axis. Reads at most ``periods`` × categories rows.
+    """
+    periods = periods or DEFAULT_PERIODS[bucket]
+    starts = [date.fromisoformat(period_start(bucket, today or datetime.utcnow().date()))]
+    for _ in range(periods - 1):
+        starts.append(_previous(bucket, starts[-1]))
+    starts.reverse()
+
+    query = db.query(
+        ActivityRollup.period_start,
+        func.sum(ActivityRollup.items_added),
+        func.sum(ActivityRollup.items_owned),
+        func.sum(ActivityRollup.ratings_given),
+    ).filter(ActivityRollup.bucket == bucket, ActivityRollup.period_start >= starts[0].isoformat())
+    if category_id is not None:
+        query = query.filter(ActivityRollup.category_id == category_id)
+    found = {row[0]: row[1:] for row in query.group_by(ActivityRollup.period_start)}
+
+    series = []
+    for start in starts:
+        counts = found.get(start.isoformat(), (0, 0, 0))
+        series.append({"period_start": start.isoformat(), **dict(zip(_METRICS, counts))})
+    return series
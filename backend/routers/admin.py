@@ -0,0 +1,57 @@
+from fastapi import APIRouter, HTTPException, Query
+
+from .. import backup, maintenance, pagecache, slowlog
+from ..database import current_library
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+@router.get("/slow-queries")
+def get_slow_queries(
+    limit: int = Query(50, ge=1, le=slowlog.MAX_RECENT),
+    full_scans_only: bool = Query(False, description="Only return queries whose plan scans a whole table"),
+):
+    """Most recent statements slower than the configured threshold, newest first."""
+    return {
+        "enabled": slowlog.ENABLED,
+        "threshold_ms": slowlog.THRESHOLD_MS,
+        "log_file": str(slowlog.LOG_PATH),
+        "entries": slowlog.recent(limit, full_scans_only),
+    }
+
+
+@router.delete("/slow-queries", status_code=204)
+def clear_slow_queries():
+    # Only clears the in-memory list; the rotating log file is left intact.
+    slowlog.clear()
+
+
+@router.get("/page-cache")
+def get_page_cache_stats():
+    """Size and hit/miss counters of this worker's /api/media page cache."""
+    return pagecache.cache.stats()
+
+
+@router.delete("/page-cache", status_code=204)
+def clear_page_cache():
+    pagecache.cache.clear()
+
+
+@router.get("/maintenance")
+def get_maintenance_stats():
+    """Last run of each maintenance task, whether it is due, and the database's size and activity."""
+    return maintenance.stats(current_library())
+
+
+@router.post("/backup")
+def create_backup():
+    """Snapshot the library and its covers into its backups folder (data/backups for the default library).
+
+    Runs in the worker thread pool; the database is copied in page steps, so
+    other requests, including writes, keep being served meanwhile. Restoring
+    is offline only: ``python run.py restore <archive>``.
+    """
+    try:
+        return backup.create_backup()
+    except backup.BackupBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
@@ -0,0 +1,30 @@
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+
+from .. import analytics
+from ..database import get_db
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+_MEDIA_TYPES = {"arrow": "application/vnd.apache.arrow.file", "parquet": "application/vnd.apache.parquet"}
+
+
+@router.get("/snapshot")
+def get_snapshot(
+    format: Literal["arrow", "parquet"] = "arrow",
+    db: Session = Depends(get_db),
+):
+    """The whole library as one columnar file (see backend/analytics.py).
+
+    Rebuilt only when something changed since the last snapshot; otherwise
+    the cached file is sent as is.
+    """
+    try:
+        path = analytics.snapshot(db, format)
+    except analytics.AnalyticsUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    return FileResponse(path, media_type=_MEDIA_TYPES[format],
+                        filename=f"media-tracker{analytics.FORMATS[format]}")
@@ -0,0 +1,113 @@
+"""POST /api/_batch: several read requests in one round-trip.
+
+A view that needs overview stats, recent items, tags and a few field lists
+can ask for all of them at once. Each sub-request is dispatched through the
+app itself, so it gets exactly the response (and validation) the endpoint
+would give on its own, but every sub-request shares one database session
+inside one read transaction — the results come from the same snapshot even
+if writes land in between.
+"""
+import json
+from urllib.parse import urlsplit
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response
+from sqlalchemy import text
+
+from ..database import DEFAULT_LIBRARY, current_library, shared_session
+from ..schemas import BatchRequest
+
+router = APIRouter(tags=["batch"])
+
+# Never batched: the batch endpoint itself, the SSE stream, which does not
+# end, and the binary analytics snapshot and cover sprite sheets.
+_EXCLUDED = ("/api/_batch", "/api/events", "/api/analytics/snapshot")
+_EXCLUDED_PREFIXES = ("/api/media/sprite/",)
+
+
+def _check(sub) -> None:
+    if sub.method.upper() != "GET":
+        raise HTTPException(status_code=400, detail="Only GET requests can be batched")
+    path = urlsplit(sub.path).path
+    if (not path.startswith("/api/") or path.rstrip("/") in _EXCLUDED
+            or path.startswith(_EXCLUDED_PREFIXES)):
+        raise HTTPException(status_code=400, detail=f"Cannot batch {sub.path}")
+
+
+async def _dispatch(request: Request, path: str) -> tuple[int, str, bytes]:
+    """Run one GET through the app; returns (status, content type, body)."""
+    url = urlsplit(path)
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": request.url.scheme,
+        "path": url.path,
+        "raw_path": url.path.encode(),
+        "root_path": "",
+        "query_string": url.query.encode(),
+        "headers": [(b"host", request.headers.get("host", "localhost").encode()),
+                    (b"accept", b"application/json")],
+        "client": request.scope.get("client"),
+        "server": request.scope.get("server"),
+        "state": request.scope.get("state", {}),
+    }
+    library = current_library()
+    if library is not DEFAULT_LIBRARY:
+        # Sub-requests carry no /lib/<name> prefix; name the library explicitly.
+        scope["headers"].append((b"x-library", library.name.encode()))
+    status, content_type, body = 500, b"", []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status, content_type
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            content_type = dict(message.get("headers", [])).get(b"content-type", b"")
+        elif message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+
+    try:
+        await request.app(scope, receive, send)
+    except Exception:
+        # The server error middleware has already sent the 500 it re-raises for.
+        pass
+    return status, content_type.decode("latin-1"), b"".join(body)
+
+
+@router.post("/_batch")
+async def batch(data: BatchRequest, request: Request):
+    """Run GET sub-requests against one snapshot; returns ``{"responses": [...]}``.
+
+    Each response is ``{"status": ..., "body": ...}`` in request order. A
+    failing sub-request only fails its own entry.
+    """
+    for sub in data.requests:
+        _check(sub)
+
+    db = current_library().SessionLocal()
+    try:
+        # Begin the read transaction explicitly: the driver otherwise runs each
+        # SELECT on its own, each seeing the latest commit. Reading the schema
+        # table pins the WAL snapshot for everything that follows.
+        db.execute(text("BEGIN"))
+        db.execute(text("SELECT count(*) FROM sqlite_master"))
+        with shared_session(db):
+            results = [await _dispatch(request, sub.path) for sub in data.requests]
+    finally:
+        db.rollback()
+        db.close()
+
+    # Sub-responses are already JSON; splice them in instead of decoding
+    # and re-encoding every body.
+    parts = []
+    for status, content_type, body in results:
+        if not body:
+            body = b"null"
+        elif not content_type.startswith("application/json"):
+            body = json.dumps(body.decode("utf-8", "replace")).encode()
+        parts.append(b'{"status":%d,"body":%s}' % (status, body))
+    return Response(b'{"responses":[' + b",".join(parts) + b"]}", media_type="application/json")
@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from ..database import get_db
+from ..schemas import CollectionCreate, CollectionRules, CollectionUpdate
+from .. import crud, smart_collections
+
+router = APIRouter(prefix="/collections", tags=["collections"])
+
+
+def _check_rules(rules: CollectionRules | None) -> None:
+    if rules is None:
+        return
+    for grade in (rules.rating, rules.min_rating):
+        if grade is not None and grade not in smart_collections.GRADES:
+            raise HTTPException(status_code=400, detail=f"Unknown grade {grade!r}")
+
+
+@router.get("")
+def list_collections(db: Session = Depends(get_db)):
+    """Smart collections with their current item counts, by name."""
+    return crud.list_collections(db)
+
+
+@router.post("", status_code=201)
+def create_collection(data: CollectionCreate, db: Session = Depends(get_db)):
+    _check_rules(data.rules)
+    result, reason = crud.create_collection(db, data)
+    if reason == "exists":
+        raise HTTPException(status_code=409, detail="A collection with this name already exists")
+    return result
+
+
+@router.put("/{collection_id}")
+def update_collection(collection_id: int, data: CollectionUpdate, db: Session = Depends(get_db)):
+    _check_rules(data.rules)
+    result, reason = crud.update_collection(db, collection_id, data)
+    if reason == "not_found":
+        raise HTTPException(status_code=404, detail="Collection not found")
+    if reason == "exists":
+        raise HTTPException(status_code=409, detail="A collection with this name already exists")
+    return result
+
+
+@router.delete("/{collection_id}", status_code=204)
+def delete_collection(collection_id: int, db: Session = Depends(get_db)):
+    if not crud.delete_collection(db, collection_id):
+        raise HTTPException(status_code=404, detail="Collection not found")
@@ -0,0 +1,79 @@
+import asyncio
+from typing import Callable, Optional
+
+from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from ..database import current_library
+from ..events import broker_for
+
+router = APIRouter(tags=["events"])
+
+# Seconds of silence before a heartbeat comment is sent. Keeps proxies from
+# closing idle connections and lets the server notice dead clients.
+HEARTBEAT_SECONDS = 15
+
+
+class _EventStream(StreamingResponse):
+    """A StreamingResponse that runs ``on_close`` however the response ends.
+
+    The generator's own ``finally`` only runs once iteration has started; a
+    client that goes away before the first chunk (or a response that is never
+    sent) would otherwise keep its subscriber slot forever.
+    """
+
+    def __init__(self, content, on_close: Callable[[], None], **kwargs):
+        super().__init__(content, **kwargs)
+        self._on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._on_close()
+
+
+@router.get("/events")
+async def stream_events(request: Request, last_event_id: Optional[str] = Header(None)):
+    """Server-Sent Events stream of compact change events.
+
+    Each event is ``event: change`` with a JSON body such as
+    ``{"type": "media.updated", "id": 42, "category_id": 3, "ts": ...}``.
+    ``{"type": "resync"}`` means the client missed events and should refetch.
+    Browsers send ``Last-Event-ID`` automatically when EventSource reconnects.
+    """
+    try:
+        last_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_id = None
+    broker = broker_for(current_library().engine)
+    sub = broker.subscribe(last_id)
+    if sub is None:
+        raise HTTPException(status_code=503, detail="Too many event stream clients")
+
+    async def stream():
+        try:
+            # Ask EventSource to reconnect after 3 s instead of its default.
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    # Lines starting with ":" are comments; EventSource ignores them.
+                    yield ": heartbeat\n\n"
+                    continue
+                yield event.to_sse()
+        finally:
+            broker.unsubscribe(sub)
+
+    return _EventStream(
+        stream(),
+        # unsubscribe() is idempotent, so running it here and in stream() is fine.
+        on_close=lambda: broker.unsubscribe(sub),
+        media_type="text/event-stream",
+        # no-cache stops intermediaries from buffering the stream;
+        # X-Accel-Buffering disables nginx response buffering if proxied.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -3,8 +3,8 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
 from ..database import get_db
-from ..schemas import FieldValueCreate, FieldValueUpdate, FieldValueRead
-from .. import crud
+from ..schemas import FieldValueCreate, FieldValueUpdate, FieldValueRead, FieldValueMerge
+from .. import crud, suggest
 
 router = APIRouter(prefix="/field-values", tags=["field-values"])
 
@@ -14,6 +14,7 @@ def get_field_values(
     field_type: Optional[str] = Query(None),
     category_id: Optional[int] = Query(None),
     scoped: bool = Query(False, description="If true, filter strictly by category_id (including NULL)"),
+    with_counts: bool = Query(False, description="If true, include how many items use each value"),
     db: Session = Depends(get_db),
 ):
     """
@@ -27,6 +28,22 @@ def get_field_values(
         field_type=field_type,
         category_id=category_id,
         category_id_filter=scoped,
+        with_counts=with_counts,
+    )
+
+
+@router.get("/suggest", response_model=list[FieldValueRead])
+def suggest_field_values(
+    field_type: str = Query(...),
+    prefix: str = Query(""),
+    limit: int = Query(10, ge=1, le=100),
+    category_id: Optional[int] = Query(None),
+    scoped: bool = Query(False, description="If true, only values with exactly this category_id"),
+    db: Session = Depends(get_db),
+):
+    """Typeahead for large lists: values starting with ``prefix``, ignoring case and accents."""
+    return suggest.suggest_field_values(
+        db, field_type, prefix, limit, category_id=category_id, scoped=scoped,
     )
 
 
@@ -42,12 +59,31 @@ def create_field_value(data: FieldValueCreate, db: Session = Depends(get_db)):
 
 @router.put("/{fv_id}", response_model=FieldValueRead)
 def update_field_value(fv_id: int, data: FieldValueUpdate, db: Session = Depends(get_db)):
-    result = crud.update_field_value(db, fv_id, data)
+    """Update a value. Renaming also rewrites the metadata of every item using it."""
+    try:
+        result = crud.update_field_value(db, fv_id, data)
+    except Exception as e:
+        # Renaming onto an existing value violates the unique constraint;
+        # the client should merge instead.
+        raise HTTPException(status_code=400, detail=str(e))
     if result is None:
         raise HTTPException(status_code=404, detail="Field value not found")
     return result
 
 
+@router.post("/{fv_id}/merge", response_model=FieldValueRead)
+def merge_field_value(fv_id: int, data: FieldValueMerge, db: Session = Depends(get_db)):
+    """Replace this value with ``into_id`` on every item, then delete it."""
+    result, status = crud.merge_field_value(db, fv_id, data.into_id)
+    if status == "not_found":
+        raise HTTPException(status_code=404, detail="Field value not found")
+    if status == "same":
+        raise HTTPException(status_code=400, detail="Cannot merge a value into itself")
+    if status == "mismatch":
+        raise HTTPException(status_code=400, detail="Values belong to different lists")
+    return result
+
+
 @router.delete("/{fv_id}", status_code=204)
 def delete_field_value(fv_id: int, db: Session = Depends(get_db)):
     if not crud.delete_field_value(db, fv_id):
@@ -0,0 +1,25 @@
+import os
+
+from fastapi import APIRouter, Depends
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ..database import get_db
+from .. import replica, workers
+
+router = APIRouter(tags=["health"])
+
+
+@router.get("/health")
+def health(db: Session = Depends(get_db)):
+    # Touch the database so "ok" means the worker can actually serve requests,
+    # not just that the socket is bound.
+    db.execute(text("SELECT 1"))
+    ready = workers.ready_workers()
+    return {
+        "status": "ok",
+        "pid": os.getpid(),
+        "workers": {"expected": workers.EXPECTED_WORKERS, "ready": len(ready)},
+        # Kiosk mode (see replica.py): when the in-memory copy was last loaded.
+        "replica": replica.replica.stats() if replica.replica else None,
+    }
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, HTTPException
+
+from .. import libraries
+from ..database import DEFAULT_LIBRARY, init_db
+from ..schemas import LibraryCreate
+
+router = APIRouter(prefix="/libraries", tags=["libraries"])
+
+
+@router.get("")
+def list_libraries():
+    """Every library, plus which ones this process currently has open."""
+    return {
+        "libraries": [DEFAULT_LIBRARY.name, *libraries.list_names()],
+        "pool": libraries.pool.stats(),
+    }
+
+
+@router.post("", status_code=201)
+def create_library(data: LibraryCreate):
+    """Create an empty, seeded library, served under /lib/<name>/."""
+    if data.name == DEFAULT_LIBRARY.name or libraries.exists(data.name):
+        raise HTTPException(status_code=400, detail=f"Library {data.name!r} already exists")
+    # Created outside the pool; the first request for it opens it there.
+    lib = libraries.open_library(data.name, create=True)
+    try:
+        init_db(lib.engine)
+    finally:
+        libraries.close(lib)
+    return {"name": data.name, "url": f"/lib/{data.name}/"}
@@ -1,14 +1,17 @@
+import base64
+import json
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 
-from ..database import get_db, UPLOADS_DIR
+from ..database import get_db, current_library
 from ..schemas import MediaItemCreate, MediaItemUpdate, PaginatedMedia
-from .. import crud
+from .. import crud, duplicates, pagecache, similar, sprites, suggest
 
 
 def _delete_upload_file(url: str | None) -> None:
-    """Delete a cover image from UPLOADS_DIR if it is a local upload.
+    """Delete a cover image from the library's uploads folder if it is a local upload.
 
     Only paths starting with /uploads/ are considered local; external URLs
     (http/https) are ignored. Errors are suppressed so a missing or
@@ -17,7 +20,7 @@ def _delete_upload_file(url: str | None) -> None:
     if not url or not url.startswith("/uploads/"):
         return
     filename = url.removeprefix("/uploads/")
-    path = UPLOADS_DIR / filename
+    path = current_library().uploads_dir / filename
     try:
         path.unlink(missing_ok=True)
     except OSError:
@@ -25,6 +28,35 @@ def _delete_upload_file(url: str | None) -> None:
 
 router = APIRouter(prefix="/media", tags=["media"])
 
+# Upper bound for ?ids=; keeps the IN list well below SQLite's bound-parameter limit.
+MAX_IDS = 500
+# A sprite sheet covers at most one page (list_media's largest limit).
+MAX_SPRITE_IDS = 200
+
+
+def _id_filter(value: Optional[str], name: str) -> Optional[str]:
+    """Canonical form of an AND-filter id list: sorted and unique, so that
+    ``3,1`` and ``1,3,3`` share one cache entry."""
+    try:
+        ids = sorted({int(x) for x in (value or "").split(",") if x.strip()})
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be comma-separated integers")
+    return ",".join(map(str, ids)) or None
+
+
+def _encode_cursor(keyset: tuple[str, int]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(keyset).encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[str, int]:
+    try:
+        key, item_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if isinstance(key, str) and isinstance(item_id, int):
+            return key, item_id
+    except (ValueError, TypeError):
+        pass
+    raise HTTPException(status_code=400, detail="after must be a next_cursor from a previous page")
+
 
 @router.get("", response_model=PaginatedMedia)
 def list_media(
@@ -38,17 +70,127 @@ def list_media(
     sort_by: str = "created_at",
     sort_dir: str = "desc",
     tag_ids: Optional[str] = None,
+    field_value_ids: Optional[str] = None,
+    collection_id: Optional[int] = Query(None, description="Only members of this smart collection"),
+    after: Optional[str] = Query(None, description="next_cursor of the previous page (sort_by=title only)"),
+    ids: Optional[str] = Query(None, description="Comma-separated item ids; fetches exactly these items"),
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
     db: Session = Depends(get_db),
 ):
-    items, total = crud.get_media_items(
-        db, q=q, category_id=category_id, status=status,
-        rating=rating,
-        sort_by=sort_by, sort_dir=sort_dir,
-        tag_ids=tag_ids, limit=limit, offset=offset,
+    if ids is not None:
+        # Multi-get: one IN query, items in the order requested, other
+        # filters and paging ignored. Unknown ids are left out.
+        try:
+            id_list = [int(x) for x in ids.split(",") if x.strip()]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+        if len(id_list) > MAX_IDS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_IDS} ids per request")
+        items = crud.get_media_items_by_ids(db, id_list)
+        return {"items": items, "total": len(items), "limit": len(items), "offset": 0}
+
+    sort_by = sort_by if sort_by in crud.SORT_COLUMNS else "created_at"
+    if after and sort_by != "title":
+        raise HTTPException(status_code=400, detail="after is only supported with sort_by=title")
+
+    # Normalised the way get_media_items() reads them, so equivalent
+    # requests share a page cache entry (see pagecache.py).
+    params = {
+        "q": q or None,
+        "category_id": category_id or None,
+        "status": status or None,
+        "rating": rating,
+        "sort_by": sort_by,
+        "sort_dir": "asc" if sort_dir == "asc" else "desc",
+        "tag_ids": _id_filter(tag_ids, "tag_ids"),
+        "field_value_ids": _id_filter(field_value_ids, "field_value_ids"),
+        "collection_id": collection_id or None,
+        "after": _decode_cursor(after) if after else None,
+        "limit": limit,
+        "offset": offset,
+    }
+
+    def build() -> bytes:
+        items, total, last = crud.get_media_items(db, **params)
+        # A full page may be followed by more; the next request after the
+        # last one comes back empty.
+        next_cursor = _encode_cursor(last) if last and len(items) == limit else None
+        page = PaginatedMedia(items=items, total=total, limit=limit, offset=offset, next_cursor=next_cursor)
+        return page.model_dump_json().encode()
+
+    return Response(pagecache.get_or_build(db, params, build), media_type="application/json")
+
+
+# The fixed paths below are declared before /{item_id} so that "suggest",
+# "duplicates" and "sprite" are not parsed as item ids.
+@router.get("/suggest")
+def suggest_media(
+    prefix: str = Query(""),
+    limit: int = Query(10, ge=1, le=100),
+    category_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
+    """Typeahead over titles, ignoring case and accents: ``[{id, title, category_id}]``."""
+    return suggest.suggest_titles(db, prefix, limit, category_id=category_id)
+
+
+@router.get("/duplicates")
+def list_duplicates(
+    threshold: float = Query(duplicates.DEFAULT_THRESHOLD, ge=0.1, le=1.0),
+    category_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+):
+    """Clusters of items with near-identical titles, per category, largest first."""
+    clusters = duplicates.find_duplicate_clusters(db, threshold, category_id=category_id)
+    return {"clusters": clusters[:limit], "total": len(clusters)}
+
+
+@router.get("/duplicates/check")
+def check_duplicates(
+    title: str = Query(..., min_length=1),
+    category_id: Optional[int] = None,
+    exclude_id: Optional[int] = None,
+    threshold: float = Query(duplicates.DEFAULT_THRESHOLD, ge=0.1, le=1.0),
+    limit: int = Query(5, ge=1, le=50),
+    db: Session = Depends(get_db),
+):
+    """Existing items similar to ``title`` — run by the add form before saving."""
+    return duplicates.find_similar_titles(
+        db, title, threshold, limit, category_id=category_id, exclude_id=exclude_id,
     )
-    return {"items": items, "total": total, "limit": limit, "offset": offset}
+
+
+@router.get("/sprite")
+def get_sprite(
+    ids: str = Query(..., description="Comma-separated item ids, in grid order"),
+    db: Session = Depends(get_db),
+):
+    """Where each item's cover is on the page's sprite sheet (see backend/sprites.py).
+
+    The sheet itself is at /api/media/sprite/{key}.
+    """
+    try:
+        id_list = [int(x) for x in ids.split(",") if x.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+    if len(id_list) > MAX_SPRITE_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_SPRITE_IDS} ids per sprite sheet")
+    try:
+        return sprites.sheet(db, id_list)
+    except sprites.SpritesUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+
+@router.get("/sprite/{key}")
+def get_sprite_image(key: str):
+    path = sprites.image_path(key)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Sprite sheet not found")
+    # The key names the sheet's exact content, so it never needs revalidating.
+    return FileResponse(path, media_type="image/webp",
+                        headers={"Cache-Control": "public, max-age=31536000, immutable"})
 
 
 @router.get("/{item_id}")
@@ -59,6 +201,27 @@ def get_media(item_id: int, db: Session = Depends(get_db)):
     return item
 
 
+@router.get("/{item_id}/similar")
+def get_similar_media(
+    item_id: int,
+    limit: int = Query(10, ge=1, le=50),
+    any_category: bool = Query(False, description="Also suggest items from other categories"),
+    db: Session = Depends(get_db),
+):
+    """Items most like this one by shared tags, genres, creators and rating.
+
+    Returns full items, best first, each with ``similarity`` (0–1) and
+    ``shared`` (the values that matched most).
+    """
+    found = similar.find_similar(db, item_id, limit, same_category=not any_category)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Media item not found")
+    scores = {r["id"]: r for r in found}
+    items = crud.get_media_items_by_ids(db, list(scores))
+    return [{**item, "similarity": scores[item["id"]]["similarity"],
+             "shared": scores[item["id"]]["shared"]} for item in items]
+
+
 @router.post("", status_code=201)
 def create_media(data: MediaItemCreate, db: Session = Depends(get_db)):
     return crud.create_media_item(db, data)
@@ -66,11 +229,9 @@ def create_media(data: MediaItemCreate, db: Session = Depends(get_db)):
 
 @router.put("/{item_id}")
 def update_media(item_id: int, data: MediaItemUpdate, db: Session = Depends(get_db)):
-    old = crud.get_media_item(db, item_id)
-    if not old:
+    item, old_url = crud.update_media_item(db, item_id, data)
+    if not item:
         raise HTTPException(status_code=404, detail="Media item not found")
-    old_url = old.get("cover_image_url")
-    item = crud.update_media_item(db, item_id, data)
     # Delete the old image only when it has been replaced with a different one.
     if old_url and old_url != item.get("cover_image_url"):
         _delete_upload_file(old_url)
@@ -81,11 +242,9 @@ def update_media(item_id: int, data: MediaItemUpdate, db: Session = Depends(get_
 # is gone and there is nothing to return in the response body.
 @router.delete("/{item_id}", status_code=204)
 def delete_media(item_id: int, db: Session = Depends(get_db)):
-    item = crud.get_media_item(db, item_id)
-    if not item:
+    deleted, cover_url = crud.delete_media_item(db, item_id)
+    if not deleted:
         raise HTTPException(status_code=404, detail="Media item not found")
-    cover_url = item.get("cover_image_url")
-    crud.delete_media_item(db, item_id)
     _delete_upload_file(cover_url)
 
 
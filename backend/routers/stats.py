@@ -1,15 +1,16 @@
-from fastapi import APIRouter, Depends
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 
 from ..database import get_db
-from .. import crud
+from .. import crud, rollups
 
 router = APIRouter(prefix="/stats", tags=["stats"])
 
 
 @router.get("/overview")
 def get_overview(db: Session = Depends(get_db)):
-    # Also used as the health-check endpoint by run.py's wait_for_server().
     return crud.get_overview_stats(db)
 
 
@@ -17,3 +18,22 @@ def get_overview(db: Session = Depends(get_db)):
 def get_recent(db: Session = Depends(get_db)):
     # Returns the 10 most recently updated "owned" items for the dashboard carousel.
     return crud.get_recent_completed(db, limit=10)
+
+
+@router.get("/timeseries")
+def get_timeseries(
+    bucket: Literal["week", "month"] = "month",
+    category_id: Optional[int] = None,
+    periods: Optional[int] = Query(None, ge=1, le=520, description="Default: 26 weeks or 12 months"),
+    db: Session = Depends(get_db),
+):
+    """Items added, items that became owned and ratings given per period, oldest first.
+
+    Served from the activity_rollups table, so the cost depends on the number
+    of periods asked for, not on the size or age of the library.
+    """
+    return {
+        "bucket": bucket,
+        "category_id": category_id,
+        "series": rollups.timeseries(db, bucket, category_id, periods),
+    }
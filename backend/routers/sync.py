@@ -0,0 +1,28 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from ..database import get_db
+from .. import crud
+
+router = APIRouter(prefix="/sync", tags=["sync"])
+
+
+@router.get("")
+def sync(
+    since: Optional[int] = Query(None, ge=0, description="Token returned by the previous sync call"),
+    limit: int = Query(1000, ge=1, le=10000, description="Max change-log rows consumed per call"),
+    db: Session = Depends(get_db),
+):
+    """
+    Delta sync for clients that keep a local copy of the library.
+    - No `since` → just the current token. Take it *before* bootstrapping from
+      the regular list endpoints, so nothing changed during the bootstrap is missed.
+    - `since=<token>` → entities created/updated after the token (latest state
+      only) plus tombstones for deleted ones, and a fresh token.
+    - `has_more=true` → call again with the new token to get the rest.
+    - `reset=true` → the token is no longer valid; bootstrap again.
+    """
+    if since is None:
+        return {"token": crud.get_sync_token(db), "reset": True, "has_more": False}
+    return crud.get_changes_since(db, since, limit)
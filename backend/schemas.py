@@ -105,6 +105,31 @@ class MediaItemRead(BaseModel):
     model_config = {"from_attributes": True}
 
 
+# ── Smart Collections ───────────────────────────────────────────────────────
+
+class CollectionRules(BaseModel):
+    """Filter of a smart collection; every rule given must hold."""
+    category_id: Optional[int] = None
+    status: Optional[str] = None
+    rating: Optional[str] = None            # exactly this grade
+    min_rating: Optional[str] = None        # this grade or better, e.g. "B+"
+    tag_ids: list[int] = []                 # all of these tags
+    field_value_ids: list[int] = []         # all of these field values (genre, platform, ...)
+    q: Optional[str] = None                 # in the title or notes
+
+
+class CollectionCreate(BaseModel):
+    name: str = Field(..., min_length=1)
+    icon: str = "✨"
+    rules: CollectionRules
+
+
+class CollectionUpdate(BaseModel):
+    name: Optional[str] = None
+    icon: Optional[str] = None
+    rules: Optional[CollectionRules] = None
+
+
 # ── Pagination ────────────────────────────────────────────────────────────────
 
 class PaginatedMedia(BaseModel):
@@ -112,6 +137,8 @@ class PaginatedMedia(BaseModel):
     total: int
     limit: int
     offset: int
+    # With sort_by=title: pass as ?after= for the next page (None on the last).
+    next_cursor: Optional[str] = None
 
 
 # ── Field Values (user-defined pick-lists) ────────────────────────────────────
@@ -134,5 +161,26 @@ class FieldValueRead(BaseModel):
     category_id: Optional[int]
     value: str
     sort_order: int
+    # Number of items using the value; only filled in when asked for.
+    usage_count: Optional[int] = None
 
     model_config = {"from_attributes": True}
+
+
+class FieldValueMerge(BaseModel):
+    into_id: int
+
+
+class BatchSubRequest(BaseModel):
+    method: str = "GET"
+    # Path under /api, optionally with a query string, e.g. "/api/media?ids=1,2".
+    path: str
+
+
+class BatchRequest(BaseModel):
+    requests: list[BatchSubRequest] = Field(..., min_length=1, max_length=25)
+
+
+class LibraryCreate(BaseModel):
+    # Used as a folder name and URL segment (/lib/<name>/).
+    name: str = Field(..., pattern=r"^[a-z0-9][a-z0-9_-]{0,63}$")
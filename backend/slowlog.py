@@ -0,0 +1,189 @@
+"""Slow-query log with automatic EXPLAIN QUERY PLAN capture.
+
+Every statement slower than MEDIA_TRACKER_SLOW_QUERY_MS (default 100 ms; a
+value of 0 or less turns the log off) is recorded with its SQL, bound
+parameters, duration, the ``crud`` function that issued it and SQLite's query
+plan. Plans that scan a whole table are flagged ``full_scan`` so missing
+indexes stand out.
+
+Entries go to two places:
+- ``data/logs/slow_queries.jsonl`` — one JSON object per line, rotated at
+  5 MB with three backups, for offline analysis.
+- an in-memory ring of the most recent entries, served by
+  ``GET /api/admin/slow-queries``.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .database import DATA_DIR
+
+THRESHOLD_MS = float(os.environ.get("MEDIA_TRACKER_SLOW_QUERY_MS", "100"))
+ENABLED = THRESHOLD_MS > 0
+
+LOG_PATH = DATA_DIR / "logs" / "slow_queries.jsonl"
+MAX_RECENT = 200
+# Bound parameter values longer than this are truncated in the log.
+MAX_PARAM_CHARS = 200
+# Plans are cached per SQL string: the same slow statement tends to recur and
+# EXPLAIN is not free.
+PLAN_CACHE_SIZE = 256
+
+_recent: deque[dict] = deque(maxlen=MAX_RECENT)
+_plan_cache: OrderedDict[str, list[str]] = OrderedDict()
+_lock = threading.Lock()
+_logger = logging.getLogger("media_tracker.slow_queries")
+
+
+def _caller() -> str | None:
+    """Name of the innermost backend.crud function on the current stack."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        if frame.f_globals.get("__name__") == "backend.crud":
+            return frame.f_code.co_name
+        frame = frame.f_back
+    return None
+
+
+def _safe_params(parameters, executemany: bool):
+    if executemany:
+        return {"executemany_rows": len(parameters)}
+    if parameters is None:
+        return None
+    values = parameters.values() if isinstance(parameters, dict) else parameters
+    out = []
+    for v in values:
+        if isinstance(v, (int, float, type(None))):
+            out.append(v)
+        else:
+            s = v if isinstance(v, str) else repr(v)
+            out.append(s if len(s) <= MAX_PARAM_CHARS else s[:MAX_PARAM_CHARS] + "…")
+    return out
+
+
+def _explain(cursor, statement: str, parameters) -> list[str]:
+    """Return EXPLAIN QUERY PLAN detail lines for a read statement."""
+    head = statement.lstrip()[:6].upper()
+    if not (head.startswith("SELECT") or head.startswith("WITH")):
+        return []
+    with _lock:
+        if statement in _plan_cache:
+            _plan_cache.move_to_end(statement)
+            return _plan_cache[statement]
+    try:
+        # A fresh raw DBAPI cursor on the same connection: it sees the same
+        # schema and transaction, and bypasses SQLAlchemy so it is neither
+        # counted by the metrics hooks nor logged again here.
+        explain = cursor.connection.cursor()
+        try:
+            rows = explain.execute("EXPLAIN QUERY PLAN " + statement, parameters or ()).fetchall()
+        finally:
+            explain.close()
+        plan = [row[-1] for row in rows]
+    except Exception as e:
+        plan = [f"(EXPLAIN failed: {e})"]
+    with _lock:
+        _plan_cache[statement] = plan
+        if len(_plan_cache) > PLAN_CACHE_SIZE:
+            _plan_cache.popitem(last=False)
+    return plan
+
+
+def _full_scans(plan: list[str]) -> list[str]:
+    """Tables the plan reads end to end.
+
+    SQLite reports these as ``SCAN <table>`` (``SCAN TABLE <table>`` before
+    3.36). ``SCAN CONSTANT ROW`` and scans of subquery/CTE results (named by
+    a preceding ``CO-ROUTINE``/``MATERIALIZE`` line) are not table scans. A
+    ``SCAN ... USING INDEX`` still visits every row, so it is flagged too.
+    """
+    derived = {d.split(" ", 1)[1] for d in plan
+               if d.startswith(("CO-ROUTINE ", "MATERIALIZE "))}
+    tables = []
+    for detail in plan:
+        if not detail.startswith("SCAN "):
+            continue
+        rest = detail[5:]
+        if rest.startswith("TABLE "):
+            rest = rest[6:]
+        name = rest.split(" ", 1)[0]
+        if name in ("CONSTANT", "SUBQUERY") or name.startswith("(") or name in derived:
+            continue
+        tables.append(name)
+    return tables
+
+
+def _record(entry: dict) -> None:
+    with _lock:
+        _recent.append(entry)
+    _logger.info(json.dumps(entry, default=str))
+
+
+# ── SQL hooks ────────────────────────────────────────────────────────────────
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # On the execution context, as in metrics.py: a statement that raises
+    # never reaches after_cursor_execute and must not leave a start behind.
+    if context is not None:
+        context._slowlog_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_slowlog_started", None)
+    if started is None:
+        return
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if elapsed_ms < THRESHOLD_MS:
+        return
+    plan = [] if executemany else _explain(cursor, statement, parameters)
+    scans = _full_scans(plan)
+    _record({
+        "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        "duration_ms": round(elapsed_ms, 2),
+        "crud_function": _caller(),
+        "sql": statement,
+        "params": _safe_params(parameters, executemany),
+        "plan": plan,
+        "full_scan": bool(scans),
+        "scanned_tables": scans,
+    })
+
+
+def install(engine: Engine) -> None:
+    """Attach the slow-query hooks to ``engine`` and open the log file."""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    if not _logger.handlers:
+        LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+        handler = RotatingFileHandler(LOG_PATH, maxBytes=5 * 1024 * 1024, backupCount=3, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _logger.addHandler(handler)
+        _logger.setLevel(logging.INFO)
+        # Keep JSON lines out of uvicorn's console output.
+        _logger.propagate = False
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def recent(limit: int = 50, full_scans_only: bool = False) -> list[dict]:
+    """Most recent slow queries, newest first."""
+    with _lock:
+        entries = list(_recent)
+    entries.reverse()
+    if full_scans_only:
+        entries = [e for e in entries if e["full_scan"]]
+    return entries[:limit]
+
+
+def clear() -> None:
+    with _lock:
+        _recent.clear()
@@ -0,0 +1,170 @@
+"""Smart collections: saved searches with materialised membership.
+
+A collection is a named filter — "owned RPGs on PC rated B+ or above, tagged
+favorite" is ``{"status": "owned", "min_rating": "B+", "tag_ids": [favorite],
+"field_value_ids": [RPG, PC]}`` (see ``schemas.CollectionRules``). The items
+matching it are stored in smart_collection_items, so the sidebar counts are a
+GROUP BY over that table and opening a collection is a join on it (see
+``crud.get_media_items``), however involved the filter is.
+
+Membership is maintained incrementally. When an item is created, updated or
+re-tagged, crud calls ``refresh_item()`` in the same transaction: that one
+item is read with its tag and field value ids and tested against each
+collection's rules in Python, and only its own membership rows are changed.
+A collection is evaluated over the whole library only when it is created or
+its rules change (``rebuild()``), or when a tag or field value it refers to
+is deleted or merged.
+"""
+import json
+from typing import Iterable, Optional
+
+from sqlalchemy import and_, delete, func, insert, literal, or_, select, text, true
+from sqlalchemy.orm import Session
+
+from .models import MediaFieldValue, MediaItem, MediaTag, SmartCollection, SmartCollectionItem
+
+# Ascending, as in the frontend's grade picker (components/rating.js).
+GRADES = ["F", "D-", "D", "D+", "C-", "C", "C+", "B-", "B", "B+", "A-", "A", "A+"]
+
+_ITEM_SQL = text("""
+    SELECT m.category_id, m.status, m.rating, m.title, m.notes,
+           (SELECT json_group_array(tag_id) FROM media_tags WHERE media_id = m.id),
+           (SELECT json_group_array(field_value_id) FROM media_field_values WHERE media_id = m.id)
+    FROM media_items m WHERE m.id = :id
+""")
+
+# SQLite's LIKE ignores case for ASCII letters only; matching in Python has
+# to fold the same way to agree with rebuild().
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+
+def _grades_from(grade: str) -> list[str]:
+    return GRADES[GRADES.index(grade):] if grade in GRADES else []
+
+
+def _condition(rules: dict):
+    """The rules as one SQL condition on MediaItem (see matches())."""
+    clauses = []
+    if rules.get("category_id"):
+        clauses.append(MediaItem.category_id == rules["category_id"])
+    if rules.get("status"):
+        clauses.append(MediaItem.status == rules["status"])
+    if rules.get("rating"):
+        clauses.append(MediaItem.rating == rules["rating"])
+    if rules.get("min_rating"):
+        clauses.append(MediaItem.rating.in_(_grades_from(rules["min_rating"])))
+    if rules.get("q"):
+        # LIKE, as get_media_items' search; the pattern is escaped so the
+        # query text matches literally.
+        like = "%" + rules["q"].replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        clauses.append(or_(MediaItem.title.like(like, escape="\\"), MediaItem.notes.like(like, escape="\\")))
+    for tag_id in rules.get("tag_ids") or []:
+        clauses.append(MediaItem.id.in_(select(MediaTag.media_id).where(MediaTag.tag_id == tag_id)))
+    for fv_id in rules.get("field_value_ids") or []:
+        clauses.append(MediaItem.id.in_(
+            select(MediaFieldValue.media_id).where(MediaFieldValue.field_value_id == fv_id)))
+    return and_(true(), *clauses)
+
+
+def matches(rules: dict, category_id: int, status: str, rating: Optional[str], title: str,
+            notes: Optional[str], tag_ids: set[int], field_value_ids: set[int]) -> bool:
+    """Whether one item satisfies ``rules``; agrees with _condition()."""
+    if rules.get("category_id") and category_id != rules["category_id"]:
+        return False
+    if rules.get("status") and status != rules["status"]:
+        return False
+    if rules.get("rating") and rating != rules["rating"]:
+        return False
+    if rules.get("min_rating") and rating not in _grades_from(rules["min_rating"]):
+        return False
+    if rules.get("q"):
+        q = rules["q"].translate(_ASCII_LOWER)
+        if q not in title.translate(_ASCII_LOWER) and q not in (notes or "").translate(_ASCII_LOWER):
+            return False
+    if not set(rules.get("tag_ids") or []) <= tag_ids:
+        return False
+    return set(rules.get("field_value_ids") or []) <= field_value_ids
+
+
+def _rules(collection: SmartCollection) -> dict:
+    try:
+        rules = json.loads(collection.rules or "{}")
+    except ValueError:
+        return {}
+    return rules if isinstance(rules, dict) else {}
+
+
+def rebuild(db: Session, collection: SmartCollection) -> None:
+    """Recompute a collection's members from its rules, in the caller's transaction."""
+    db.execute(delete(SmartCollectionItem).where(SmartCollectionItem.collection_id == collection.id))
+    db.execute(insert(SmartCollectionItem).from_select(
+        ["collection_id", "media_id"],
+        select(literal(collection.id), MediaItem.id).where(_condition(_rules(collection))),
+    ))
+
+
+def refresh_item(db: Session, item_id: int) -> None:
+    """Re-test one item against every collection after it was written.
+
+    Runs in the caller's transaction. Costs one query when there are no
+    collections, otherwise a read of the item and at most two small writes.
+    """
+    collections = db.query(SmartCollection.id, SmartCollection.rules).all()
+    if not collections:
+        return
+    # Sessions do not autoflush: the caller's pending field links must be
+    # written before the item is read back.
+    db.flush()
+    row = db.execute(_ITEM_SQL, {"id": item_id}).first()
+    if row is None:
+        remove_item(db, item_id)
+        return
+    category_id, status, rating, title, notes, tag_ids, fv_ids = row
+    tag_ids, fv_ids = set(json.loads(tag_ids)), set(json.loads(fv_ids))
+    member_of = [c.id for c in collections
+                 if matches(_rules(c), category_id, status, rating, title, notes, tag_ids, fv_ids)]
+
+    query = delete(SmartCollectionItem).where(SmartCollectionItem.media_id == item_id)
+    if member_of:
+        query = query.where(SmartCollectionItem.collection_id.not_in(member_of))
+    db.execute(query)
+    if member_of:
+        db.execute(
+            insert(SmartCollectionItem).prefix_with("OR IGNORE"),
+            [{"collection_id": cid, "media_id": item_id} for cid in member_of],
+        )
+
+
+def remove_item(db: Session, item_id: int) -> None:
+    db.execute(delete(SmartCollectionItem).where(SmartCollectionItem.media_id == item_id))
+
+
+def rebuild_referencing(db: Session, tag_ids: Iterable[int] = (), field_value_ids: Iterable[int] = ()) -> None:
+    """Rebuild the collections whose rules name any of these tags or field values."""
+    tag_ids, field_value_ids = set(tag_ids), set(field_value_ids)
+    db.flush()  # the caller's deletes first (see refresh_item)
+    for collection in db.query(SmartCollection).all():
+        rules = _rules(collection)
+        if tag_ids & set(rules.get("tag_ids") or []) or field_value_ids & set(rules.get("field_value_ids") or []):
+            rebuild(db, collection)
+
+
+def merge_field_value(db: Session, source_id: int, target_id: int) -> None:
+    """Point rules at ``target_id`` after ``source_id`` was merged into it.
+
+    The merged items are linked to the target now, so every collection
+    naming the target is rebuilt.
+    """
+    for collection in db.query(SmartCollection).all():
+        rules = _rules(collection)
+        ids = rules.get("field_value_ids") or []
+        if source_id in ids:
+            rules["field_value_ids"] = list(dict.fromkeys(target_id if i == source_id else i for i in ids))
+            collection.rules = json.dumps(rules)
+    rebuild_referencing(db, field_value_ids=[target_id])
+
+
+def counts(db: Session) -> dict[int, int]:
+    """Number of members per collection id."""
+    return dict(db.query(SmartCollectionItem.collection_id, func.count())
+                .group_by(SmartCollectionItem.collection_id).all())
@@ -0,0 +1,261 @@
+"""Cover sprite sheets: one image for all the covers on a grid page.
+
+A grid page of 50–200 items otherwise makes one /uploads request per cover.
+``sheet()`` packs the covers of the given items into a single WebP image
+and returns where each one is on it:
+
+    {"key": "<hex>", "width": 2000, "height": 1500,
+     "tiles": {"12": {"x": 0, "y": 0, "w": 200, "h": 300}, ...},
+     "missing": [15]}
+
+Every tile has the card's shape (see ``_aspect``): 2:3, or square for albums.
+The cover is fitted inside it without cropping and the rest is left
+transparent, as ``object-fit: contain`` does for a single <img>. The client
+shows a tile by using the sheet as a CSS background. Only uploaded covers are
+packed. Items with an external cover URL or none at all get no tile.
+Uploaded covers whose file is missing or cannot be decoded are listed in
+``missing``.
+
+Sheets are cached in the library's ``sprites`` folder (``data/sprites`` for
+the default library). The key is a hash of the item ids, their cover URLs and
+tile shapes, in page order. Uploaded files are never rewritten in place (each
+upload gets a new name), so a key always describes the same image. A changed
+cover or a different page is a new key, and old sheets are evicted least
+recently used first once the folder is over ``MAX_BYTES``. A hit sets the
+files' modification time, which serves as the last-used time.
+
+Covers are decoded and scaled in a thread pool of ``WORKERS`` threads.
+Pillow releases the GIL while it decodes and resizes, so the tiles of one
+sheet are built in parallel. Concurrent requests for the same key wait for
+one build.
+
+Pillow is an optional dependency: without it ``SpritesUnavailable`` is
+raised.
+"""
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from .database import current_library
+from .models import Category, MediaItem
+
+TILE_WIDTH = 200
+COLUMNS = 10
+QUALITY = 80
+MAX_BYTES = int(float(os.environ.get("MEDIA_TRACKER_SPRITE_CACHE_MB", "256")) * 1024 * 1024)
+WORKERS = int(os.environ.get("MEDIA_TRACKER_SPRITE_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+
+# Bump when the layout or encoding changes, so old sheets are not reused.
+_FORMAT = 1
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+# Builds in progress, by sheet path; later requests wait on the same future.
+_building: dict[Path, Future] = {}
+_building_lock = threading.Lock()
+
+
+class SpritesUnavailable(RuntimeError):
+    """Pillow is not installed."""
+
+
+def _pil():
+    try:
+        from PIL import Image, ImageOps
+    except ImportError as e:
+        raise SpritesUnavailable(
+            "Cover sprites need Pillow: pip install Pillow") from e
+    return Image, ImageOps
+
+
+def _workers() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="sprites")
+        return _pool
+
+
+def _aspect(category_name: Optional[str]) -> str:
+    # Mirrors getCoverAspectClass in frontend/js/views/library.js.
+    name = (category_name or "").lower()
+    return "square" if "album" in name or "music" in name else "portrait"
+
+
+def _tile_size(aspect: str) -> tuple[int, int]:
+    return (TILE_WIDTH, TILE_WIDTH) if aspect == "square" else (TILE_WIDTH, TILE_WIDTH * 3 // 2)
+
+
+def _sprite_dir() -> Path:
+    return current_library().data_dir / "sprites"
+
+
+def _upload_path(url: str) -> Optional[Path]:
+    name = url.removeprefix("/uploads/")
+    # Stored names are a bare uuid and extension; anything else is not ours.
+    if not name or Path(name).name != name or name.startswith("."):
+        return None
+    return current_library().uploads_dir / name
+
+
+def _load_tile(path: Path, size: tuple[int, int]):
+    """The cover at ``path`` scaled to fit ``size``, or None if unreadable."""
+    Image, ImageOps = _pil()
+    try:
+        with Image.open(path) as img:
+            # JPEGs can be decoded at 1/2, 1/4 or 1/8 scale, which is much
+            # faster for large covers; draft() picks the smallest that fits.
+            img.draft("RGB", size)
+            img = ImageOps.exif_transpose(img)
+            img = img.convert("RGBA")
+            return ImageOps.contain(img, size, Image.Resampling.LANCZOS)
+    except Exception:
+        return None
+
+
+def _layout(entries: list[tuple[int, str, str]]) -> tuple[dict, int, int]:
+    """Rows of COLUMNS tiles, each row as tall as its tallest tile."""
+    tiles, x, y, row_height = {}, 0, 0, 0
+    for i, (item_id, _, aspect) in enumerate(entries):
+        if i and i % COLUMNS == 0:
+            x, y, row_height = 0, y + row_height, 0
+        w, h = _tile_size(aspect)
+        tiles[item_id] = {"x": x, "y": y, "w": w, "h": h}
+        x += w
+        row_height = max(row_height, h)
+    width = min(len(entries), COLUMNS) * TILE_WIDTH
+    return tiles, width, y + row_height
+
+
+def _build(key: str, entries: list[tuple[int, str, str]]) -> dict:
+    """Decode every cover in the pool, paste them into one sheet and save it."""
+    Image, _ = _pil()
+    paths = [_upload_path(url) for _, url, _ in entries]
+    sizes = [_tile_size(aspect) for _, _, aspect in entries]
+    images = list(_workers().map(
+        lambda args: _load_tile(*args) if args[0] is not None else None, zip(paths, sizes)))
+
+    present = [(entry, img) for entry, img in zip(entries, images) if img is not None]
+    tiles, width, height = _layout([entry for entry, _ in present])
+    result = {"key": key, "width": width, "height": height,
+              "tiles": {str(item_id): rect for item_id, rect in tiles.items()},
+              "missing": [entry[0] for entry, img in zip(entries, images) if img is None]}
+
+    directory = _sprite_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    suffix = f".{os.getpid()}.{threading.get_ident()}.partial"
+    if present:
+        sheet = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+        for (item_id, _, _), img in present:
+            rect = tiles[item_id]
+            # Centred in its tile, like object-fit: contain.
+            sheet.paste(img, (rect["x"] + (rect["w"] - img.width) // 2,
+                              rect["y"] + (rect["h"] - img.height) // 2))
+        partial = directory / f"{key}.webp{suffix}"
+        sheet.save(partial, format="WEBP", quality=QUALITY)
+        partial.replace(directory / f"{key}.webp")
+    # The map is written last: its presence means the sheet is complete.
+    partial = directory / f"{key}.json{suffix}"
+    partial.write_text(json.dumps(result))
+    partial.replace(directory / f"{key}.json")
+    return result
+
+
+def _entries(db: Session, ids: list[int]) -> list[tuple[int, str, str]]:
+    """(id, cover URL, aspect) of the items with an uploaded cover, in ``ids`` order."""
+    rows = (db.query(MediaItem.id, MediaItem.cover_image_url, Category.name)
+            .join(Category, MediaItem.category_id == Category.id)
+            .filter(MediaItem.id.in_(ids)).all())
+    by_id = {item_id: (url, _aspect(name)) for item_id, url, name in rows}
+    return [(item_id, *by_id[item_id]) for item_id in dict.fromkeys(ids)
+            if item_id in by_id and (by_id[item_id][0] or "").startswith("/uploads/")]
+
+
+def _key(entries: list[tuple[int, str, str]]) -> str:
+    digest = hashlib.sha256(f"{_FORMAT}:{TILE_WIDTH}:{COLUMNS}:{QUALITY}".encode())
+    for item_id, url, aspect in entries:
+        digest.update(f"\n{item_id}\t{url}\t{aspect}".encode())
+    return digest.hexdigest()[:32]
+
+
+def _touch(*paths: Path) -> None:
+    for path in paths:
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+
+def _evict(keep: str) -> None:
+    """Delete the least recently used sheets until the folder fits MAX_BYTES."""
+    sheets: dict[str, list] = {}
+    for path in _sprite_dir().iterdir():
+        if path.name.endswith(".partial"):
+            continue
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entry = sheets.setdefault(path.name.split(".", 1)[0], [0.0, 0, []])
+        entry[0] = max(entry[0], stat.st_mtime)
+        entry[1] += stat.st_size
+        entry[2].append(path)
+    total = sum(size for _, size, _ in sheets.values())
+    for key, (_, size, paths) in sorted(sheets.items(), key=lambda kv: kv[1][0]):
+        if total <= MAX_BYTES:
+            break
+        if key == keep:
+            continue
+        for path in paths:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+        total -= size
+
+
+def sheet(db: Session, ids: list[int]) -> dict:
+    """The sprite map for the covers of ``ids``, building the sheet if needed."""
+    _pil()
+    entries = _entries(db, ids)
+    key = _key(entries)
+    map_path = _sprite_dir() / f"{key}.json"
+    try:
+        result = json.loads(map_path.read_text())
+        _touch(map_path, _sprite_dir() / f"{key}.webp")
+        return result
+    except (OSError, ValueError):
+        pass
+
+    with _building_lock:
+        future = _building.get(map_path)
+        owner = future is None
+        if owner:
+            future = _building[map_path] = Future()
+    if not owner:
+        return future.result()
+    try:
+        result = _build(key, entries)
+        future.set_result(result)
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _building_lock:
+            del _building[map_path]
+    _evict(keep=key)
+    return result
+
+
+def image_path(key: str) -> Optional[Path]:
+    """Path of a cached sheet image, or None if it is not (or no longer) cached."""
+    if len(key) != 32 or any(c not in "0123456789abcdef" for c in key):
+        return None
+    path = _sprite_dir() / f"{key}.webp"
+    return path if path.is_file() else None
@@ -0,0 +1,228 @@
+"""Typeahead suggestions for field values and media titles.
+
+``list_field_values`` returns a whole list, which is fine for ten platforms but
+not for a 30k-entry shared ``cast`` or ``author`` list. Suggestions are served
+instead from in-memory indexes sorted by *folded* text (see textkeys.fold), so
+matching is case- and accent-insensitive and a keystroke costs a binary search
+plus a scan of at most ``limit`` matches.
+
+Indexes are built from the database on first use (or by ``warm()`` at
+startup) and kept current through the change feed: a ``DirtySet`` listener
+notes which ids changed, and the next lookup re-reads just those rows. Because the feed tails change_log, writes made by
+other worker processes are picked up too.
+"""
+import threading
+from bisect import bisect_left, insort
+from typing import Iterable, Iterator, Optional
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import changefeed
+from .database import latest_session
+from .models import FieldValue, MediaItem
+from .textkeys import fold
+
+# Ids re-read per query when applying changes; stays well below SQLite's
+# bound-parameter limit.
+_CHUNK = 500
+
+
+class PrefixIndex:
+    """Ids ordered by folded text, searchable by prefix."""
+
+    def __init__(self):
+        self._keys: list[tuple[str, int]] = []
+        self._by_id: dict[int, tuple[str, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def load(self, rows: Iterable[tuple[int, str]]) -> None:
+        self._keys = sorted((fold(text), id_) for id_, text in rows)
+        self._by_id = {key[1]: key for key in self._keys}
+
+    def add(self, id_: int, text: str) -> None:
+        self.remove(id_)
+        key = (fold(text), id_)
+        insort(self._keys, key)
+        self._by_id[id_] = key
+
+    def remove(self, id_: int) -> None:
+        key = self._by_id.pop(id_, None)
+        if key is not None:
+            del self._keys[bisect_left(self._keys, key)]
+
+    def search(self, prefix: str) -> Iterator[int]:
+        """Ids whose folded text starts with ``prefix`` (already folded), in order."""
+        # (prefix,) sorts before every (prefix..., id) key.
+        i = bisect_left(self._keys, (prefix,))
+        while i < len(self._keys) and self._keys[i][0].startswith(prefix):
+            yield self._keys[i][1]
+            i += 1
+
+
+# Selected as plain columns: building ORM objects for a 30k-entry list would
+# dominate the cost of loading the index.
+_VALUE_COLUMNS = (FieldValue.id, FieldValue.field_type, FieldValue.category_id,
+                  FieldValue.value, FieldValue.sort_order)
+
+
+def _value_row(row) -> dict:
+    # Same shape as crud.list_field_values rows.
+    return {"id": row.id, "field_type": row.field_type, "category_id": row.category_id,
+            "value": row.value, "sort_order": row.sort_order}
+
+
+def _chunks(ids: list[int]) -> Iterator[list[int]]:
+    for i in range(0, len(ids), _CHUNK):
+        yield ids[i:i + _CHUNK]
+
+
+class Suggester:
+    """Title and field-value indexes for one database."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.dirty = changefeed.DirtySet("media", "field_value")
+        self._titles = PrefixIndex()
+        self._items: dict[int, dict] = {}
+        self._values: dict[str, PrefixIndex] = {}
+        self._field_values: dict[int, dict] = {}
+
+    # ── Index maintenance (caller holds _lock) ──
+
+    def _put_item(self, id_: int, title: str, category_id: int) -> None:
+        self._items[id_] = {"id": id_, "title": title, "category_id": category_id}
+        self._titles.add(id_, title)
+
+    def _drop_item(self, id_: int) -> None:
+        if self._items.pop(id_, None) is not None:
+            self._titles.remove(id_)
+
+    def _put_value(self, fv) -> None:
+        self._drop_value(fv.id)
+        self._field_values[fv.id] = _value_row(fv)
+        self._values.setdefault(fv.field_type, PrefixIndex()).add(fv.id, fv.value)
+
+    def _drop_value(self, id_: int) -> None:
+        old = self._field_values.pop(id_, None)
+        if old is not None:
+            self._values[old["field_type"]].remove(id_)
+
+    def _load(self, db: Session) -> None:
+        self.dirty.activate()
+        rows = db.query(MediaItem.id, MediaItem.title, MediaItem.category_id).all()
+        self._items = {id_: {"id": id_, "title": title, "category_id": cat_id}
+                       for id_, title, cat_id in rows}
+        self._titles.load((id_, title) for id_, title, _ in rows)
+
+        self._values, self._field_values = {}, {}
+        by_type: dict[str, list[tuple[int, str]]] = {}
+        for fv in db.query(*_VALUE_COLUMNS).all():
+            self._field_values[fv.id] = _value_row(fv)
+            by_type.setdefault(fv.field_type, []).append((fv.id, fv.value))
+        for field_type, pairs in by_type.items():
+            self._values[field_type] = index = PrefixIndex()
+            index.load(pairs)
+
+    def _sync(self, db: Session) -> None:
+        if not self.dirty.active:
+            self._load(db)
+            return
+        changed = self.dirty.take()
+        for ids in _chunks(sorted(changed["media"])):
+            rows = (db.query(MediaItem.id, MediaItem.title, MediaItem.category_id)
+                    .filter(MediaItem.id.in_(ids)).all())
+            for id_ in ids:
+                self._drop_item(id_)
+            for id_, title, category_id in rows:
+                self._put_item(id_, title, category_id)
+        for ids in _chunks(sorted(changed["field_value"])):
+            rows = db.query(*_VALUE_COLUMNS).filter(FieldValue.id.in_(ids)).all()
+            for id_ in ids:
+                self._drop_value(id_)
+            for fv in rows:
+                self._put_value(fv)
+
+    # ── Lookups ──
+
+    def field_values(self, db: Session, field_type: str, prefix: str, limit: int,
+                     category_id: Optional[int] = None, scoped: bool = False) -> list[dict]:
+        folded = fold(prefix)
+        with self._lock:
+            with latest_session(db) as current:
+                self._sync(current)
+            index = self._values.get(field_type)
+            if index is None:
+                return []
+            result = []
+            for id_ in index.search(folded):
+                fv = self._field_values[id_]
+                if scoped and fv["category_id"] != category_id:
+                    continue
+                result.append(dict(fv))
+                if len(result) >= limit:
+                    break
+            return result
+
+    def titles(self, db: Session, prefix: str, limit: int,
+               category_id: Optional[int] = None) -> list[dict]:
+        folded = fold(prefix)
+        with self._lock:
+            with latest_session(db) as current:
+                self._sync(current)
+            result = []
+            for id_ in self._titles.search(folded):
+                item = self._items[id_]
+                if category_id is not None and item["category_id"] != category_id:
+                    continue
+                result.append(dict(item))
+                if len(result) >= limit:
+                    break
+            return result
+
+
+_suggesters: dict[Engine, Suggester] = {}
+
+
+def _attach(feed: changefeed.ChangeFeed) -> None:
+    # A new feed (fresh start, or a reopened one) gets a fresh Suggester, so
+    # an index never misses changes from before its feed existed.
+    suggester = _suggesters[feed.engine] = Suggester()
+    feed.listen(suggester.dirty)
+
+
+changefeed.on_new_feed(_attach)
+changefeed.on_feed_closed(lambda feed: _suggesters.pop(feed.engine, None))
+
+
+def _for_session(db: Session) -> Suggester:
+    bind = db.get_bind()
+    engine = bind if isinstance(bind, Engine) else bind.engine
+    changefeed.get_feed(engine)  # attaches a Suggester on first use
+    return _suggesters[engine]
+
+
+def warm(engine: Engine) -> None:
+    """Build the indexes now instead of on the first keystroke."""
+    changefeed.get_feed(engine)
+    suggester = _suggesters[engine]
+    with Session(engine) as db, suggester._lock:
+        suggester._sync(db)
+
+
+def suggest_field_values(db: Session, field_type: str, prefix: str = "", limit: int = 10,
+                         category_id: Optional[int] = None, scoped: bool = False) -> list[dict]:
+    """Values of ``field_type`` starting with ``prefix``, alphabetically.
+
+    With ``scoped`` only values whose category_id equals ``category_id``
+    (None meaning the shared list) are returned, as in list_field_values.
+    """
+    return _for_session(db).field_values(db, field_type, prefix, limit, category_id, scoped)
+
+
+def suggest_titles(db: Session, prefix: str = "", limit: int = 10,
+                   category_id: Optional[int] = None) -> list[dict]:
+    """Media items whose title starts with ``prefix``, alphabetically."""
+    return _for_session(db).titles(db, prefix, limit, category_id)
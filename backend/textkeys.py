@@ -0,0 +1,37 @@
+"""Text normalisation shared by the in-memory search indexes and sort keys."""
+import re
+import unicodedata
+
+# Leading words ignored when sorting titles ("The Matrix" files under M).
+_ARTICLES = ("the ", "a ", "an ")
+_LEADING_PUNCTUATION = re.compile(r"^[\W_]+")
+_NUMBER = re.compile(r"\d+")
+# Digits a number is padded to, so "Part 2" sorts before "Part 10".
+NUMBER_WIDTH = 10
+
+
+def fold(text: str) -> str:
+    """Case- and accent-insensitive form of ``text`` ("Amélie" → "amelie")."""
+    if text.isascii():
+        # Fast path for the common case: no accents to strip, and casefold()
+        # is the same as lower() for ASCII.
+        return text.lower()
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def title_sort_key(title: str) -> str:
+    """The stored natural sort form of a title (``MediaItem.title_sort``).
+
+    Case- and accent-folded, without a leading article or punctuation, and
+    with every number zero-padded: "The Godfather Part 2" →
+    "godfather part 0000000002". Changing this needs a migration that
+    recomputes the column (see database.init_db).
+    """
+    key = fold(title).strip()
+    for article in _ARTICLES:
+        if key.startswith(article) and key[len(article):].strip():
+            key = key[len(article):].lstrip()
+            break
+    key = _LEADING_PUNCTUATION.sub("", key) or key
+    return _NUMBER.sub(lambda m: m.group().zfill(NUMBER_WIDTH), key)
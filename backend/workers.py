@@ -0,0 +1,58 @@
+"""Worker readiness tracking for ``run.py --workers N``.
+
+Uvicorn's worker processes share one listening socket, so an HTTP health
+check cannot choose which worker answers it. Instead each worker drops a
+marker file named after its pid into a directory unique to this launch
+(MEDIA_TRACKER_BOOT_ID) once its startup has finished, and the health
+endpoint reports how many live workers have done so.
+"""
+import os
+from pathlib import Path
+
+from .database import DATA_DIR
+
+BOOT_ID = os.environ.get("MEDIA_TRACKER_BOOT_ID", "")
+EXPECTED_WORKERS = int(os.environ.get("MEDIA_TRACKER_WORKERS", "1"))
+
+
+def run_dir(boot_id: str = BOOT_ID) -> Path:
+    return DATA_DIR / "run" / (boot_id or "default")
+
+
+def mark_ready() -> None:
+    d = run_dir()
+    d.mkdir(parents=True, exist_ok=True)
+    (d / f"{os.getpid()}.ready").touch()
+
+
+def mark_stopped() -> None:
+    (run_dir() / f"{os.getpid()}.ready").unlink(missing_ok=True)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by someone else
+    return True
+
+
+def ready_workers() -> list[int]:
+    """Pids of live workers in this launch that have finished starting up.
+
+    Marker files of workers that died without cleaning up are ignored.
+    """
+    d = run_dir()
+    if not d.is_dir():
+        return []
+    pids = []
+    for f in d.glob("*.ready"):
+        try:
+            pid = int(f.stem)
+        except ValueError:
+            continue
+        if _alive(pid):
+            pids.append(pid)
+    return sorted(pids)
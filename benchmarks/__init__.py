@@ -0,0 +1,6 @@
+"""Performance benchmarks for the Media Tracker backend.
+
+Every benchmark runs against a scratch data directory (never ``data/``) that
+is populated by the seeded generator in ``datagen.py``, so results from two
+commits are comparable as long as the same ``--size`` and ``--seed`` are used.
+"""
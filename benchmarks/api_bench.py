@@ -0,0 +1,219 @@
+"""Latency benchmark for every API router, run in-process through the ASGI app.
+
+Usage:
+    python -m benchmarks.api_bench --size 10k [--iterations 50] [--seed 42]
+                                   [--out report.json] [--baseline old.json]
+
+Each scenario issues real HTTP requests via Starlette's TestClient, so routing,
+validation, the DB session dependency and JSON serialisation are all included
+in the timings. Read scenarios run before write scenarios so the writes cannot
+skew the read numbers.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+from . import datagen, harness
+
+# Smallest valid PNG (1×1 transparent pixel) for the upload scenario.
+PNG_1PX = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c63000100000500010d0a2db40000000049454e44ae426082"
+)
+
+
+class Context:
+    """Mutable state shared between scenarios (ids to hit, ids created)."""
+
+    def __init__(self, client, rng: random.Random):
+        self.client = client
+        self.rng = rng
+        self.max_item_id = 0
+        self.category_ids: list[int] = []
+        self.tag_ids: list[int] = []
+        self.field_value_ids: list[int] = []
+        self.created_ids: list[int] = []
+        self.created_tag_ids: list[int] = []
+
+    def item_id(self) -> int:
+        return self.rng.randint(1, self.max_item_id)
+
+
+def _new_item(ctx: Context) -> dict:
+    return {
+        "title": f"Benchmark Item {ctx.rng.randint(0, 10**9)}",
+        "category_id": ctx.rng.choice(ctx.category_ids),
+        "status": "owned",
+        "rating": "B+",
+        "notes": "Created by the benchmark suite.",
+        "metadata": {"year": "2024", "genre": "Drama"},
+        "tag_ids": ctx.rng.sample(ctx.tag_ids, 2),
+    }
+
+
+def _create(ctx: Context):
+    r = ctx.client.post("/api/media", json=_new_item(ctx))
+    ctx.created_ids.append(r.json()["id"])
+    return r
+
+
+def _delete(ctx: Context):
+    return ctx.client.delete(f"/api/media/{ctx.created_ids.pop()}")
+
+
+def _create_tag(ctx: Context):
+    r = ctx.client.post("/api/tags", json={"name": f"bench-{ctx.rng.randint(0, 10**9)}"})
+    ctx.created_tag_ids.append(r.json()["id"])
+    return r
+
+
+# (name, router, method, path template, callable). Read scenarios first.
+SCENARIOS = [
+    ("media.list_default", "media", "GET", "/api/media",
+     lambda c: c.client.get("/api/media")),
+    ("media.list_category", "media", "GET", "/api/media?category_id={id}",
+     lambda c: c.client.get("/api/media", params={"category_id": c.rng.choice(c.category_ids)})),
+    ("media.list_status_rating", "media", "GET", "/api/media?status=owned&rating={grade}",
+     lambda c: c.client.get("/api/media", params={"status": "owned", "rating": c.rng.choice(datagen.GRADES)})),
+    ("media.search", "media", "GET", "/api/media?q={word}",
+     lambda c: c.client.get("/api/media", params={"q": c.rng.choice(datagen._WORDS).lower()})),
+    ("media.tag_filter", "media", "GET", "/api/media?tag_ids={a},{b}",
+     lambda c: c.client.get("/api/media", params={"tag_ids": ",".join(map(str, c.rng.sample(c.tag_ids, 2)))})),
+    ("media.sort_title", "media", "GET", "/api/media?sort_by=title&sort_dir=asc&offset={n}",
+     lambda c: c.client.get("/api/media", params={"sort_by": "title", "sort_dir": "asc",
+                                                   "offset": c.rng.randint(0, 20) * 50})),
+    ("media.get", "media", "GET", "/api/media/{id}",
+     lambda c: c.client.get(f"/api/media/{c.item_id()}")),
+    ("media.multi_get", "media", "GET", "/api/media?ids={20 ids}",
+     lambda c: c.client.get("/api/media", params={"ids": ",".join(str(c.item_id()) for _ in range(20))})),
+    ("stats.overview", "stats", "GET", "/api/stats/overview",
+     lambda c: c.client.get("/api/stats/overview")),
+    ("stats.recent", "stats", "GET", "/api/stats/recent",
+     lambda c: c.client.get("/api/stats/recent")),
+    ("stats.timeseries", "stats", "GET", "/api/stats/timeseries?bucket=week",
+     lambda c: c.client.get("/api/stats/timeseries", params={"bucket": "week", "periods": 52})),
+    ("tags.list", "tags", "GET", "/api/tags",
+     lambda c: c.client.get("/api/tags")),
+    ("categories.list", "categories", "GET", "/api/categories",
+     lambda c: c.client.get("/api/categories")),
+    ("field_values.list_all", "field_values", "GET", "/api/field-values",
+     lambda c: c.client.get("/api/field-values")),
+    ("field_values.by_type", "field_values", "GET", "/api/field-values?field_type=cast",
+     lambda c: c.client.get("/api/field-values", params={"field_type": "cast"})),
+    ("field_values.suggest", "field_values", "GET", "/api/field-values/suggest?field_type=cast&prefix={p}",
+     lambda c: c.client.get("/api/field-values/suggest",
+                            params={"field_type": "cast", "prefix": c.rng.choice(datagen._FIRST)[:2]})),
+    ("media.suggest", "media", "GET", "/api/media/suggest?prefix={p}",
+     lambda c: c.client.get("/api/media/suggest", params={"prefix": c.rng.choice(datagen._WORDS)[:3]})),
+    ("media.duplicates_check", "media", "GET", "/api/media/duplicates/check?title={title}",
+     lambda c: c.client.get("/api/media/duplicates/check",
+                            params={"title": " ".join(c.rng.sample(datagen._WORDS, 2))})),
+    ("batch.editor", "batch", "POST", "/api/_batch (tags, field values, item)",
+     lambda c: c.client.post("/api/_batch", json={"requests": [
+         {"path": "/api/tags"}, {"path": "/api/field-values"}, {"path": f"/api/media/{c.item_id()}"}]})),
+    # ── Writes ──
+    ("media.create", "media", "POST", "/api/media", _create),
+    ("media.update", "media", "PUT", "/api/media/{id}",
+     lambda c: c.client.put(f"/api/media/{c.item_id()}",
+                            json={"rating": c.rng.choice(datagen.GRADES),
+                                  "tag_ids": c.rng.sample(c.tag_ids, 3)})),
+    ("media.set_tags", "media", "POST", "/api/media/{id}/tags",
+     lambda c: c.client.post(f"/api/media/{c.item_id()}/tags", json=c.rng.sample(c.tag_ids, 2))),
+    ("media.delete", "media", "DELETE", "/api/media/{id}", _delete),
+    ("tags.create", "tags", "POST", "/api/tags", _create_tag),
+    ("tags.update", "tags", "PUT", "/api/tags/{id}",
+     lambda c: c.client.put(f"/api/tags/{c.rng.choice(c.created_tag_ids)}", json={"color": "#123456"})),
+    ("categories.update", "categories", "PUT", "/api/categories/{id}",
+     lambda c: c.client.put(f"/api/categories/{c.rng.choice(c.category_ids)}", json={"color": "#654321"})),
+    ("field_values.update", "field_values", "PUT", "/api/field-values/{id}",
+     lambda c: c.client.put(f"/api/field-values/{c.rng.choice(c.field_value_ids)}",
+                            json={"sort_order": c.rng.randint(0, 100)})),
+    ("upload.cover", "upload", "POST", "/api/upload/cover",
+     lambda c: c.client.post("/api/upload/cover", files={"file": ("cover.png", PNG_1PX, "image/png")})),
+]
+
+
+def run(iterations: int, warmup: int, seed: int, only: set[str] | None) -> tuple[dict, dict]:
+    # Imported here: backend.database must only be imported after
+    # prepare_data_dir() has pointed it at the scratch directory.
+    from fastapi.testclient import TestClient
+    from backend.main import app
+
+    results = {}
+    with TestClient(app) as client, harness.QueryCounter() as counter:
+        ctx = Context(client, random.Random(seed))
+        ctx.category_ids = [c["id"] for c in client.get("/api/categories").json()]
+        ctx.tag_ids = [t["id"] for t in client.get("/api/tags").json()]
+        ctx.field_value_ids = [f["id"] for f in client.get("/api/field-values").json()]
+        ctx.max_item_id = client.get("/api/media", params={"limit": 1}).json()["total"]
+
+        for name, router, method, path, fn in SCENARIOS:
+            if only and name not in only:
+                continue
+            # Deletes consume items made by media.create; make sure there are enough.
+            if name == "media.delete":
+                while len(ctx.created_ids) < iterations + warmup:
+                    _create(ctx)
+            if name == "tags.update" and not ctx.created_tag_ids:
+                _create_tag(ctx)
+
+            for _ in range(warmup):
+                fn(ctx).raise_for_status()
+
+            latencies, queries = [], []
+            for _ in range(iterations):
+                before = counter.count
+                started = time.perf_counter()
+                response = fn(ctx)
+                latencies.append((time.perf_counter() - started) * 1000)
+                queries.append(counter.count - before)
+                response.raise_for_status()
+
+            results[name] = {"router": router, "method": method, "path": path,
+                             **harness.summarize(latencies, queries)}
+            print(f"{name:<28} p50 {results[name]['p50_ms']:>8.2f} ms  "
+                  f"p95 {results[name]['p95_ms']:>8.2f} ms  "
+                  f"q/req {results[name]['queries_per_request']}", file=sys.stderr)
+
+    return results, {"peak_rss_kb": harness.peak_rss_kb()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Media Tracker API benchmark")
+    parser.add_argument("--size", default="10k", help="1k, 10k, 100k, 1m or an item count")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--only", help="Comma-separated scenario names to run")
+    parser.add_argument("--data-dir", type=Path, help="Working directory (default: a temp dir)")
+    parser.add_argument("--fresh", action="store_true", help="Regenerate the cached dataset")
+    parser.add_argument("--out", type=Path, help="Write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", type=Path, help="Earlier report to compare against")
+    args = parser.parse_args()
+
+    size = datagen.parse_size(args.size)
+    data_dir, dataset = harness.prepare_data_dir(size, args.seed, args.data_dir, args.fresh)
+    print(f"Dataset: {dataset} in {data_dir}", file=sys.stderr)
+
+    only = set(args.only.split(",")) if args.only else None
+    results, process = run(args.iterations, args.warmup, args.seed, only)
+
+    report = {
+        "benchmark": "api",
+        "environment": harness.environment_info(),
+        "dataset": dataset,
+        "iterations": args.iterations,
+        "warmup": args.warmup,
+        "results": results,
+        **process,
+    }
+    harness.write_report(report, args.out)
+    if args.baseline:
+        print(harness.compare_reports(json.loads(args.baseline.read_text()), report), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
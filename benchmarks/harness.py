@@ -0,0 +1,215 @@
+"""Shared plumbing for the benchmark scripts.
+
+Dataset preparation, SQL statement counting, latency percentiles and the
+environment block that makes two JSON reports comparable.
+"""
+import hashlib
+import json
+import os
+import platform
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from contextvars import ContextVar
+from pathlib import Path
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from . import datagen
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+CACHE_DIR = Path(tempfile.gettempdir()) / "media-tracker-bench"
+
+
+def _generator_fingerprint() -> str:
+    """Hash of the files that determine a dataset's contents.
+
+    Cached pristine datasets are keyed by this so editing the generator or the
+    models never silently reuses a stale database.
+    """
+    h = hashlib.sha256()
+    for rel in ("benchmarks/datagen.py", "backend/models.py"):
+        h.update((REPO_DIR / rel).read_bytes())
+    return h.hexdigest()[:12]
+
+
+def prepare_data_dir(size: int, seed: int, data_dir: Path | None = None, fresh: bool = False) -> tuple[Path, dict]:
+    """Create a scratch data directory holding a generated library.
+
+    A pristine copy of each (size, seed, generator) dataset is cached so
+    repeated runs only pay the generation cost once; every run then works on
+    its own copy because the write scenarios mutate the database.
+
+    MEDIA_TRACKER_DATA_DIR is set before ``backend`` is imported, so this must
+    be called before anything imports ``backend.database``.
+    """
+    if "backend.database" in sys.modules:
+        raise RuntimeError("prepare_data_dir() must run before backend.database is imported")
+
+    pristine = CACHE_DIR / f"{size}-{seed}-{_generator_fingerprint()}"
+    marker = pristine / "dataset.json"
+    if fresh or not marker.exists():
+        shutil.rmtree(pristine, ignore_errors=True)
+        pristine.mkdir(parents=True)
+        summary = _generate(pristine, size, seed)
+        marker.write_text(json.dumps(summary))
+
+    work = data_dir or Path(tempfile.mkdtemp(prefix="media-tracker-run-"))
+    shutil.rmtree(work, ignore_errors=True)
+    (work / "uploads").mkdir(parents=True)
+    shutil.copy2(pristine / "media_tracker.db", work / "media_tracker.db")
+
+    os.environ["MEDIA_TRACKER_DATA_DIR"] = str(work)
+    return work, json.loads(marker.read_text())
+
+
+def _generate(target: Path, size: int, seed: int) -> dict:
+    # Generation runs in a child process so the parent can still import
+    # backend.database against the run's own data directory afterwards.
+    code = (
+        "import json, sys\n"
+        "from backend.database import engine, init_db\n"
+        "from benchmarks import datagen\n"
+        "init_db()\n"
+        f"print(json.dumps(datagen.populate(engine, {size}, {seed})))\n"
+    )
+    env = dict(os.environ, MEDIA_TRACKER_DATA_DIR=str(target))
+    started = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=REPO_DIR, env=env,
+        check=True, capture_output=True, text=True,
+    ).stdout
+    summary = json.loads(out.strip().splitlines()[-1])
+    summary["generated_in_s"] = round(time.perf_counter() - started, 2)
+    return summary
+
+
+# Set while a request passes through an app wrapped by in_requests().
+_in_request: ContextVar[bool] = ContextVar("bench_in_request", default=False)
+
+
+def in_requests(app):
+    """``app``, marking the statements its HTTP requests run.
+
+    For ``QueryCounter(requests_only=True)``. Sync endpoints run in a thread
+    pool with a copy of the request's context, so their statements are
+    marked too; the lifespan's background tasks (index warm-up, upload purge)
+    are not.
+    """
+    async def wrapped(scope, receive, send):
+        token = _in_request.set(scope["type"] == "http")
+        try:
+            await app(scope, receive, send)
+        finally:
+            _in_request.reset(token)
+    return wrapped
+
+
+class QueryCounter:
+    """Count SQL statements executed by any engine in this process.
+
+    Listening on the Engine class (rather than one engine instance) means the
+    counter keeps working however the app builds its engines. With
+    ``requests_only`` only statements run by a request through an app wrapped
+    in ``in_requests()`` count, not those of threads working in the
+    background meanwhile.
+    """
+
+    def __init__(self, requests_only: bool = False):
+        self.count = 0
+        self.statements: list[str] = []
+        self.capture = False
+        self.requests_only = requests_only
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.requests_only and not _in_request.get():
+            return
+        self.count += 1
+        if self.capture:
+            self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(Engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(Engine, "before_cursor_execute", self._on_execute)
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies_ms: list[float], queries: list[int]) -> dict:
+    lat = sorted(latencies_ms)
+    return {
+        "samples": len(lat),
+        "p50_ms": round(percentile(lat, 50), 3),
+        "p95_ms": round(percentile(lat, 95), 3),
+        "p99_ms": round(percentile(lat, 99), 3),
+        "mean_ms": round(sum(lat) / len(lat), 3) if lat else 0.0,
+        "queries_per_request": round(sum(queries) / len(queries), 2) if queries else 0.0,
+        "queries_max": max(queries) if queries else 0,
+    }
+
+
+def peak_rss_kb() -> int:
+    """Peak resident set size of this process in KiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports kilobytes.
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def environment_info() -> dict:
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=REPO_DIR, capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def write_report(report: dict, out: Path | None) -> None:
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if out:
+        out.write_text(text + "\n")
+        print(f"Wrote {out}", file=sys.stderr)
+    else:
+        print(text)
+
+
+def compare_reports(baseline: dict, current: dict) -> str:
+    """Render a p50/p95/queries comparison table between two reports."""
+    lines = [f"{'scenario':<28} {'p50 ms':>16} {'p95 ms':>16} {'queries':>12}"]
+    for name, cur in sorted(current["results"].items()):
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            lines.append(f"{name:<28} {'(new)':>16}")
+            continue
+
+        def cell(key, width=16):
+            a, b = old[key], cur[key]
+            delta = f"{(b - a) / a * 100:+.0f}%" if a else "n/a"
+            return f"{a:.2f}→{b:.2f} {delta}".rjust(width)
+
+        lines.append(f"{name:<28} {cell('p50_ms')} {cell('p95_ms')} "
+                     f"{old['queries_per_request']:>5}→{cur['queries_per_request']:<5}")
+    return "\n".join(lines)
@@ -0,0 +1,137 @@
+"""Correctness checks for the in-memory indexes (suggest, duplicates).
+
+Usage:
+    python -m benchmarks.index_checks [--size 200] [--seed 42]
+
+The indexes are shared by every request and kept current through the change
+feed, so a lookup that re-reads changed rows through the wrong session can
+store stale data that outlives the request. Each check drives the app
+through Starlette's TestClient against a generated library and prints
+``ok`` or ``FAIL``; the exit status is 1 if any check failed.
+
+- batch.suggest — an item is renamed while a ``POST /api/_batch`` holds its
+  snapshot, and the batch runs ``/api/media/suggest``. Once the batch is
+  done, suggest and ``/api/media/duplicates/check`` must return the new
+  title, not the one the batch's snapshot still had.
+- duplicates.examples — "The Witcher 3" and "Witcher 3: Wild Hunt" are
+  duplicates; sequels ("The Witcher 2", "Saga Part 10" and "Saga part 2")
+  are not, in the check and in the clusters.
+"""
+import argparse
+import asyncio
+import sys
+
+from . import datagen, harness
+
+
+def _rename(item_id: int, title: str) -> None:
+    from backend import crud
+    from backend.database import SessionLocal
+    from backend.schemas import MediaItemUpdate
+
+    with SessionLocal() as db:
+        crud.update_media_item(db, item_id, MediaItemUpdate(title=title))
+
+
+def check_batch_suggest(client) -> list[str]:
+    """Problems found, or an empty list."""
+    from backend.routers import batch
+
+    item_id = client.get("/api/media", params={"limit": 1}).json()["items"][0]["id"]
+    client.put(f"/api/media/{item_id}", json={"title": "Alpha Quillfeather"}).raise_for_status()
+    # Loads the indexes with the old title.
+    client.get("/api/media/suggest", params={"prefix": "Alpha Quill"}).raise_for_status()
+    client.get("/api/media/duplicates/check", params={"title": "Alpha Quillfeather"}).raise_for_status()
+
+    # Rename the item once the batch has pinned its snapshot, before the
+    # sub-requests run, as a write from another client would.
+    dispatch = batch._dispatch
+
+    async def rename_first(request, path):
+        batch._dispatch = dispatch
+        await asyncio.to_thread(_rename, item_id, "Beta Quillfeather")
+        return await dispatch(request, path)
+
+    batch._dispatch = rename_first
+    try:
+        response = client.post("/api/_batch", json={"requests": [
+            {"path": "/api/media/suggest?prefix=Alpha%20Quill"},
+            {"path": "/api/media/duplicates/check?title=Alpha%20Quillfeather"},
+        ]})
+    finally:
+        batch._dispatch = dispatch
+    response.raise_for_status()
+
+    problems = []
+
+    def suggested(prefix):
+        return {s["id"]: s["title"] for s in client.get("/api/media/suggest", params={"prefix": prefix}).json()}
+    if item_id in suggested("Alpha Quill"):
+        problems.append("suggest still returns the old title after the batch")
+    if suggested("Beta Quill").get(item_id) != "Beta Quillfeather":
+        problems.append("suggest does not return the new title after the batch")
+    matches = client.get("/api/media/duplicates/check", params={"title": "Beta Quillfeather"}).json()
+    if not any(m["id"] == item_id and m["title"] == "Beta Quillfeather" for m in matches):
+        problems.append(f"duplicates/check has a stale title: {matches}")
+    return problems
+
+
+def check_duplicate_examples(client) -> list[str]:
+    """Problems found, or an empty list."""
+    # A category of its own, so generated titles cannot join the clusters.
+    category_id = client.post("/api/categories", json={"name": "Duplicate examples"}).json()["id"]
+    ids = {}
+    for title in ("The Witcher 3", "Witcher 3: Wild Hunt", "The Witcher 2", "Saga Part 10", "Saga part 2"):
+        response = client.post("/api/media", json={"title": title, "category_id": category_id, "status": "owned"})
+        ids[title] = response.json()["id"]
+
+    def matches(title):
+        return {m["id"] for m in client.get("/api/media/duplicates/check", params={
+            "title": title, "category_id": category_id, "exclude_id": ids.get(title)}).json()}
+
+    problems = []
+    if ids["The Witcher 3"] not in matches("Witcher 3: Wild Hunt"):
+        problems.append("'Witcher 3: Wild Hunt' does not match 'The Witcher 3'")
+    for title, other in (("The Witcher 2", "The Witcher 3"), ("Saga part 2", "Saga Part 10")):
+        if ids[other] in matches(title):
+            problems.append(f"{title!r} matches its sequel {other!r}")
+    clusters = client.get("/api/media/duplicates", params={"category_id": category_id}).json()["clusters"]
+    found = sorted(sorted(item["title"] for item in c["items"]) for c in clusters)
+    if found != [["The Witcher 3", "Witcher 3: Wild Hunt"]]:
+        problems.append(f"clusters are {found}, expected only the two Witcher 3 titles")
+    return problems
+
+
+CHECKS = [
+    ("batch.suggest", check_batch_suggest),
+    ("duplicates.examples", check_duplicate_examples),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Media Tracker in-memory index checks")
+    parser.add_argument("--size", default="200", help="Item count of the generated library")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    harness.prepare_data_dir(datagen.parse_size(args.size), args.seed)
+    from fastapi.testclient import TestClient
+    from backend.main import app
+
+    failures = []
+    with TestClient(app) as client:
+        for name, check in CHECKS:
+            problems = check(client)
+            print(f"{'FAIL' if problems else 'ok  '} {name}", file=sys.stderr)
+            for problem in problems:
+                print(f"      {problem}", file=sys.stderr)
+            if problems:
+                failures.append(name)
+    if failures:
+        print(f"{len(failures)} check(s) failed", file=sys.stderr)
+        sys.exit(1)
+    print("All checks passed", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+"""SQL statement budgets per API route, to catch N+1 queries.
+
+Usage:
+    python -m benchmarks.query_budget [--small 200] [--large 5000] [--seed 42]
+                                      [--iterations 3] [--only a,b] [--out report.json]
+
+Every route of the app is called against a small and a large generated
+library, each in a fresh process. The statements each call executes are
+counted with ``harness.QueryCounter``, which only counts statements run by
+the request itself: the lifespan's index warm-up is still reading the
+library while the first routes are measured. A route fails when
+
+- its largest count on either dataset is over the budget declared in
+  ``ROUTES``, or
+- it runs more statements on the large library than on the small one
+  (beyond ``GROWTH_SLACK``). Statement counts should not depend on how
+  many rows there are; when they do, something is querying once per row.
+
+The statements of a failing route are printed with how often each ran, and
+the exit status is 1. A route added to the app without an entry in
+``ROUTES`` (or ``UNMEASURED``) fails as well, so every new endpoint gets a
+budget.
+
+The page cache is switched off and the scheduler is kept from running
+maintenance, so every call reaches the database. Each route is called
+``iterations`` times and its highest count kept: the first call also pays
+for building any in-memory index it uses.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+from . import api_bench, datagen, harness
+
+
+class Context(api_bench.Context):
+    """api_bench's context plus the ids only these routes need."""
+
+    def __init__(self, client, rng: random.Random):
+        super().__init__(client, rng)
+        self.collection_ids: list[int] = []
+        self.created_category_ids: list[int] = []
+        self.created_collection_ids: list[int] = []
+        self.created_field_value_ids: list[int] = []
+        # Most used first: renaming or merging these rewrites the most items.
+        self.busy_field_value_ids: list[int] = []
+        self.sprite_key = ""
+        self.title_cursor = ""
+        self.cover_item_id = 0
+
+
+def _created(ids: list[int]):
+    def record(response):
+        ids.append(response.json()["id"])
+        return response
+    return record
+
+
+def _create_category(c: Context):
+    return _created(c.created_category_ids)(
+        c.client.post("/api/categories", json={"name": f"budget-{c.rng.randint(0, 10**9)}"}))
+
+
+def _create_collection(c: Context):
+    return _created(c.created_collection_ids)(c.client.post("/api/collections", json={
+        "name": f"budget-{c.rng.randint(0, 10**9)}",
+        "rules": {"status": "owned", "tag_ids": [c.rng.choice(c.tag_ids)]}}))
+
+
+def _create_field_value(c: Context):
+    return _created(c.created_field_value_ids)(c.client.post("/api/field-values", json={
+        "field_type": "genre", "value": f"Budget {c.rng.randint(0, 10**9)}"}))
+
+
+def _sprite(c: Context):
+    # Generated covers point at files that don't exist; one real one makes a sheet.
+    ids = ",".join(str(i) for i in [c.cover_item_id] + [c.item_id() for _ in range(49)])
+    response = c.client.get("/api/media/sprite", params={"ids": ids})
+    c.sprite_key = response.json().get("key", "")
+    return response
+
+
+def _merge(c: Context):
+    # Into the busiest value: every item of the source is relinked.
+    source = c.busy_field_value_ids.pop(1)
+    return c.client.post(f"/api/field-values/{source}/merge", json={"into_id": c.busy_field_value_ids[0]})
+
+
+# (name, method, route path as declared in the app, budget, callable).
+# The budget is the most statements one call may run; keep it at what the
+# route needs today so that a new query per request shows up here too.
+ROUTES = [
+    ("media.list", "GET", "/api/media", 2,
+     lambda c: c.client.get("/api/media", params={"limit": 200})),
+    ("media.list_filtered", "GET", "/api/media", 2,
+     lambda c: c.client.get("/api/media", params={
+         "category_id": c.rng.choice(c.category_ids), "status": "owned",
+         "tag_ids": c.rng.choice(c.tag_ids), "q": c.rng.choice(datagen._WORDS).lower()})),
+    ("media.list_collection", "GET", "/api/media", 2,
+     lambda c: c.client.get("/api/media", params={"collection_id": c.rng.choice(c.collection_ids)})),
+    ("media.list_title_after", "GET", "/api/media", 2,
+     lambda c: c.client.get("/api/media", params={"sort_by": "title", "sort_dir": "asc",
+                                                  "after": c.title_cursor})),
+    ("media.multi_get", "GET", "/api/media", 1,
+     lambda c: c.client.get("/api/media", params={"ids": ",".join(str(c.item_id()) for _ in range(50))})),
+    ("media.suggest", "GET", "/api/media/suggest", 1,
+     lambda c: c.client.get("/api/media/suggest", params={"prefix": c.rng.choice(datagen._WORDS)[:3]})),
+    ("media.duplicates", "GET", "/api/media/duplicates", 1,
+     lambda c: c.client.get("/api/media/duplicates")),
+    ("media.duplicates_check", "GET", "/api/media/duplicates/check", 1,
+     lambda c: c.client.get("/api/media/duplicates/check",
+                            params={"title": " ".join(c.rng.sample(datagen._WORDS, 2))})),
+    ("media.sprite", "GET", "/api/media/sprite", 1, _sprite),
+    ("media.sprite_image", "GET", "/api/media/sprite/{key}", 0,
+     lambda c: c.client.get(f"/api/media/sprite/{c.sprite_key}")),
+    ("media.get", "GET", "/api/media/{item_id}", 1,
+     lambda c: c.client.get(f"/api/media/{c.item_id()}")),
+    ("media.similar", "GET", "/api/media/{item_id}/similar", 2,
+     lambda c: c.client.get(f"/api/media/{c.item_id()}/similar")),
+    ("categories.list", "GET", "/api/categories", 2,
+     lambda c: c.client.get("/api/categories")),
+    ("tags.list", "GET", "/api/tags", 2,
+     lambda c: c.client.get("/api/tags")),
+    ("collections.list", "GET", "/api/collections", 2,
+     lambda c: c.client.get("/api/collections")),
+    ("stats.overview", "GET", "/api/stats/overview", 5,
+     lambda c: c.client.get("/api/stats/overview")),
+    ("stats.recent", "GET", "/api/stats/recent", 1,
+     lambda c: c.client.get("/api/stats/recent")),
+    ("stats.timeseries", "GET", "/api/stats/timeseries", 1,
+     lambda c: c.client.get("/api/stats/timeseries", params={"bucket": "week", "periods": 52})),
+    ("field_values.list", "GET", "/api/field-values", 2,
+     lambda c: c.client.get("/api/field-values", params={"with_counts": True})),
+    ("field_values.suggest", "GET", "/api/field-values/suggest", 1,
+     lambda c: c.client.get("/api/field-values/suggest",
+                            params={"field_type": "cast", "prefix": c.rng.choice(datagen._FIRST)[:2]})),
+    ("sync.bootstrap", "GET", "/api/sync", 1,
+     lambda c: c.client.get("/api/sync")),
+    ("sync.since", "GET", "/api/sync", 9,
+     lambda c: c.client.get("/api/sync", params={"since": 0})),
+    ("health", "GET", "/api/health", 1,
+     lambda c: c.client.get("/api/health")),
+    ("analytics.snapshot", "GET", "/api/analytics/snapshot", 6,
+     lambda c: c.client.get("/api/analytics/snapshot")),
+    ("libraries.list", "GET", "/api/libraries", 0,
+     lambda c: c.client.get("/api/libraries")),
+    ("admin.slow_queries", "GET", "/api/admin/slow-queries", 0,
+     lambda c: c.client.get("/api/admin/slow-queries")),
+    ("admin.clear_slow_queries", "DELETE", "/api/admin/slow-queries", 0,
+     lambda c: c.client.delete("/api/admin/slow-queries")),
+    ("admin.page_cache", "GET", "/api/admin/page-cache", 0,
+     lambda c: c.client.get("/api/admin/page-cache")),
+    ("admin.clear_page_cache", "DELETE", "/api/admin/page-cache", 0,
+     lambda c: c.client.delete("/api/admin/page-cache")),
+    ("admin.maintenance", "GET", "/api/admin/maintenance", 0,
+     lambda c: c.client.get("/api/admin/maintenance")),
+    ("batch", "POST", "/api/_batch", 7,
+     lambda c: c.client.post("/api/_batch", json={"requests": [
+         {"path": "/api/tags"}, {"path": "/api/categories"}, {"path": f"/api/media/{c.item_id()}"}]})),
+    # ── Writes ──
+    ("media.create", "POST", "/api/media", 10, api_bench._create),
+    ("media.update", "PUT", "/api/media/{item_id}", 15,
+     lambda c: c.client.put(f"/api/media/{c.item_id()}",
+                            json={"rating": c.rng.choice(datagen.GRADES), "tag_ids": c.rng.sample(c.tag_ids, 3),
+                                  "metadata": {"genre": "Drama", "year": "2001"}})),
+    ("media.set_tags", "POST", "/api/media/{item_id}/tags", 8,
+     lambda c: c.client.post(f"/api/media/{c.item_id()}/tags", json=c.rng.sample(c.tag_ids, 2))),
+    ("media.delete", "DELETE", "/api/media/{item_id}", 7, api_bench._delete),
+    ("categories.create", "POST", "/api/categories", 4, _create_category),
+    ("categories.update", "PUT", "/api/categories/{cat_id}", 5,
+     lambda c: c.client.put(f"/api/categories/{c.rng.choice(c.category_ids)}", json={"color": "#654321"})),
+    ("categories.delete", "DELETE", "/api/categories/{cat_id}", 5,
+     lambda c: c.client.delete(f"/api/categories/{c.created_category_ids.pop()}")),
+    ("tags.create", "POST", "/api/tags", 4, api_bench._create_tag),
+    ("tags.update", "PUT", "/api/tags/{tag_id}", 5,
+     lambda c: c.client.put(f"/api/tags/{c.rng.choice(c.created_tag_ids)}", json={"color": "#123456"})),
+    ("tags.delete", "DELETE", "/api/tags/{tag_id}", 6,
+     lambda c: c.client.delete(f"/api/tags/{c.created_tag_ids.pop()}")),
+    ("collections.create", "POST", "/api/collections", 7, _create_collection),
+    ("collections.update", "PUT", "/api/collections/{collection_id}", 7,
+     lambda c: c.client.put(f"/api/collections/{c.rng.choice(c.created_collection_ids)}",
+                            json={"rules": {"min_rating": "B"}})),
+    ("collections.delete", "DELETE", "/api/collections/{collection_id}", 5,
+     lambda c: c.client.delete(f"/api/collections/{c.created_collection_ids.pop()}")),
+    ("field_values.create", "POST", "/api/field-values", 8, _create_field_value),
+    ("field_values.rename", "PUT", "/api/field-values/{fv_id}", 9,
+     lambda c: c.client.put(f"/api/field-values/{c.busy_field_value_ids[0]}",
+                            json={"value": f"Renamed {c.rng.randint(0, 10**9)}"})),
+    ("field_values.merge", "POST", "/api/field-values/{fv_id}/merge", 13, _merge),
+    ("field_values.delete", "DELETE", "/api/field-values/{fv_id}", 6,
+     lambda c: c.client.delete(f"/api/field-values/{c.created_field_value_ids.pop()}")),
+    # Creates and migrates a new database: init_db's statements, none per row.
+    ("libraries.create", "POST", "/api/libraries", 97,
+     lambda c: c.client.post("/api/libraries", json={"name": f"budget-{c.rng.randint(0, 10**9)}"})),
+    ("admin.backup", "POST", "/api/admin/backup", 0,
+     lambda c: c.client.post("/api/admin/backup")),
+    ("upload.cover", "POST", "/api/upload/cover", 0,
+     lambda c: c.client.post("/api/upload/cover", files={"file": ("cover.png", api_bench.PNG_1PX, "image/png")})),
+]
+
+# Writes take a branch or two more or less depending on the item picked
+# (a rating that didn't change, a tag already set). A query per row grows by
+# far more than this: each library gets ``size // 100`` extra categories and
+# tags (2 and 50 at the default sizes), and the large one 25 times the items.
+GROWTH_SLACK = 2
+
+# Routes that are not called, and why.
+UNMEASURED = {
+    ("GET", "/api/events"): "server-sent event stream; it never ends",
+}
+
+
+def _uncovered(app) -> list[str]:
+    declared = {(method, path) for _, method, path, _, _ in ROUTES} | set(UNMEASURED)
+    missing = []
+    for route in app.routes:
+        path = getattr(route, "path", "")
+        if not path.startswith("/api/"):
+            continue
+        for method in sorted(getattr(route, "methods", None) or ()):
+            if method != "HEAD" and (method, path) not in declared:
+                missing.append(f"{method} {path}")
+    return missing
+
+
+def _setup(ctx: Context, extra: int) -> None:
+    client = ctx.client
+    ctx.category_ids = [c["id"] for c in client.get("/api/categories").json()]
+    ctx.tag_ids = [t["id"] for t in client.get("/api/tags").json()]
+    values = client.get("/api/field-values", params={"with_counts": True}).json()
+    ctx.field_value_ids = [f["id"] for f in values]
+    # The genres of one category, busiest first (merges stay within one list).
+    genres = sorted((f for f in values if f["field_type"] == "genre"), key=lambda f: -f["usage_count"])
+    ctx.busy_field_value_ids = [f["id"] for f in genres if f["category_id"] == genres[0]["category_id"]]
+    ctx.max_item_id = client.get("/api/media", params={"limit": 1}).json()["total"]
+    ctx.title_cursor = client.get("/api/media", params={"sort_by": "title", "sort_dir": "asc"}).json()["next_cursor"]
+    cover = client.post("/api/upload/cover", files={"file": ("cover.png", api_bench.PNG_1PX, "image/png")})
+    ctx.cover_item_id = ctx.item_id()
+    client.put(f"/api/media/{ctx.cover_item_id}", json={"cover_image_url": cover.json()["url"]})
+    # The generator always makes the same categories and tags, so the
+    # large library also gets more of them: a query per category or tag
+    # has to show up as growth too. Collections make every item write
+    # re-test membership.
+    for _ in range(extra):
+        _create_category(ctx)
+        api_bench._create_tag(ctx)
+    for _ in range(max(extra, 2)):
+        _create_collection(ctx)
+    ctx.category_ids += ctx.created_category_ids
+    ctx.tag_ids += ctx.created_tag_ids
+    ctx.collection_ids = list(ctx.created_collection_ids)
+    for ids in (ctx.created_category_ids, ctx.created_tag_ids, ctx.created_collection_ids):
+        ids.clear()
+
+
+def measure(iterations: int, seed: int, only: set[str] | None, extra: int) -> dict:
+    """Statement counts per route on the library in MEDIA_TRACKER_DATA_DIR.
+
+    ``extra`` categories and tags are added first (see _setup).
+    """
+    from fastapi.testclient import TestClient
+    from backend.main import app
+
+    results = {"uncovered": _uncovered(app), "routes": {}}
+    with TestClient(harness.in_requests(app)) as client, harness.QueryCounter(requests_only=True) as counter:
+        ctx = Context(client, random.Random(seed))
+        _setup(ctx, extra)
+        counter.capture = True
+        for name, method, path, budget, fn in ROUTES:
+            if only and name not in only:
+                continue
+            # Make sure the deletes have something of their own to delete.
+            if name == "categories.delete":
+                while len(ctx.created_category_ids) < iterations:
+                    _create_category(ctx)
+            if name in ("tags.delete", "tags.update"):
+                while len(ctx.created_tag_ids) < iterations:
+                    api_bench._create_tag(ctx)
+            if name in ("collections.delete", "collections.update"):
+                while len(ctx.created_collection_ids) < iterations:
+                    _create_collection(ctx)
+            if name == "field_values.delete":
+                while len(ctx.created_field_value_ids) < iterations:
+                    _create_field_value(ctx)
+            if name == "media.delete":
+                while len(ctx.created_ids) < iterations:
+                    api_bench._create(ctx)
+
+            worst: list[str] = []
+            for _ in range(iterations):
+                counter.statements = []
+                response = fn(ctx)
+                response.raise_for_status()
+                if len(counter.statements) >= len(worst):
+                    worst = counter.statements
+            results["routes"][name] = {"method": method, "path": path, "budget": budget,
+                                       "count": len(worst), "statements": worst}
+    return results
+
+
+def _measure_in_subprocess(size: int, args, scratch: Path) -> dict:
+    out = scratch / f"{size}.json"
+    env = dict(os.environ, MEDIA_TRACKER_PAGE_CACHE_MB="0", MEDIA_TRACKER_MAINTENANCE="0")
+    command = [sys.executable, "-m", "benchmarks.query_budget", "--measure", str(size),
+               "--seed", str(args.seed), "--iterations", str(args.iterations),
+               "--data-dir", str(scratch / str(size)), "--out", str(out)]
+    if args.only:
+        command += ["--only", args.only]
+    subprocess.run(command, cwd=harness.REPO_DIR, env=env, check=True)
+    return json.loads(out.read_text())
+
+
+def _print_statements(statements: list[str]) -> None:
+    for statement, times in Counter(" ".join(s.split()) for s in statements).most_common():
+        print(f"      {times:>4} × {statement[:200]}", file=sys.stderr)
+
+
+def check(small: dict, large: dict) -> list[str]:
+    """Names of the failing routes; prints why each failed."""
+    failures = []
+    for name in large["uncovered"]:
+        print(f"FAIL {name}: no budget declared in benchmarks/query_budget.py", file=sys.stderr)
+        failures.append(name)
+    for name, result in large["routes"].items():
+        before = small["routes"][name]["count"]
+        problems = []
+        if max(before, result["count"]) > result["budget"]:
+            problems.append(f"over budget ({max(before, result['count'])} > {result['budget']})")
+        if result["count"] > before + GROWTH_SLACK:
+            problems.append(f"grows with data size ({before} → {result['count']} statements)")
+        status = "FAIL" if problems else "ok  "
+        print(f"{status} {name:<28} {before:>4} → {result['count']:<4} budget {result['budget']:<4}"
+              f"{'  ' + '; '.join(problems) if problems else ''}", file=sys.stderr)
+        if problems:
+            _print_statements(result["statements"])
+            failures.append(name)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Media Tracker per-route SQL statement budgets")
+    parser.add_argument("--small", default="200", help="Item count of the small library")
+    parser.add_argument("--large", default="5000", help="Item count of the large library")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--only", help="Comma-separated route names to check")
+    parser.add_argument("--out", type=Path, help="Write the JSON report here")
+    # Internal: measure one dataset (run in a child process per size).
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    parser.add_argument("--data-dir", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    only = set(args.only.split(",")) if args.only else None
+
+    if args.measure:
+        size = datagen.parse_size(args.measure)
+        harness.prepare_data_dir(size, args.seed, args.data_dir)
+        harness.write_report(measure(args.iterations, args.seed, only, extra=size // 100), args.out)
+        return
+
+    small_size, large_size = datagen.parse_size(args.small), datagen.parse_size(args.large)
+    with tempfile.TemporaryDirectory(prefix="media-tracker-budget-") as tmp:
+        small = _measure_in_subprocess(small_size, args, Path(tmp))
+        large = _measure_in_subprocess(large_size, args, Path(tmp))
+
+    print(f"Statements per request, {small_size} → {large_size} items:", file=sys.stderr)
+    failures = check(small, large)
+    if args.out:
+        harness.write_report({"benchmark": "query_budget", "environment": harness.environment_info(),
+                              "sizes": [small_size, large_size], "small": small, "large": large,
+                              "failures": failures}, args.out)
+    if failures:
+        print(f"{len(failures)} route(s) failed", file=sys.stderr)
+        sys.exit(1)
+    print("All routes within budget", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
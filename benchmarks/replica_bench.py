@@ -0,0 +1,94 @@
+"""Read latency of kiosk mode (in-memory replica) against the disk-backed path.
+
+Usage:
+    python -m benchmarks.replica_bench --size 10k [--iterations 50] [--seed 42]
+                                       [--page-cache] [--out report.json]
+
+Runs every GET scenario of ``api_bench`` twice, each time in a fresh process
+on its own copy of the generated library: once as usual, once with
+``MEDIA_TRACKER_READ_REPLICA=1``. The page cache is off unless ``--page-cache``
+is given, so list pages are measured against the database rather than the
+cache. The comparison table is printed with the disk run as the baseline,
+followed by how long loading the in-memory copy took.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from . import api_bench, datagen, harness
+
+
+def _run_mode(replica: bool, args, scratch: Path) -> dict:
+    out = scratch / ("replica.json" if replica else "disk.json")
+    env = dict(os.environ, MEDIA_TRACKER_READ_REPLICA="1" if replica else "0")
+    if not args.page_cache:
+        env["MEDIA_TRACKER_PAGE_CACHE_MB"] = "0"
+    reads = [name for name, _, method, _, _ in api_bench.SCENARIOS if method == "GET"]
+    subprocess.run(
+        [sys.executable, "-m", "benchmarks.api_bench", "--size", args.size, "--seed", str(args.seed),
+         "--iterations", str(args.iterations), "--warmup", str(args.warmup),
+         "--only", ",".join(reads), "--data-dir", str(scratch / ("replica" if replica else "disk")),
+         "--out", str(out)],
+        cwd=harness.REPO_DIR, env=env, check=True,
+    )
+    return json.loads(out.read_text())
+
+
+def _load_ms(data_dir: Path, iterations: int) -> dict:
+    """Time loading the library into memory, as at startup and after each change on disk."""
+    code = (
+        "import json\n"
+        "from backend.database import DEFAULT_LIBRARY\n"
+        "from backend.replica import Replica\n"
+        "r = Replica(DEFAULT_LIBRARY)\n"
+        "samples = []\n"
+        f"for _ in range({iterations}):\n"
+        "    r.load(); samples.append(r.load_ms)\n"
+        "print(json.dumps({'samples': samples, 'size_bytes': r.size_bytes}))\n"
+    )
+    env = dict(os.environ, MEDIA_TRACKER_DATA_DIR=str(data_dir))
+    out = subprocess.run([sys.executable, "-c", code], cwd=harness.REPO_DIR, env=env,
+                         check=True, capture_output=True, text=True).stdout
+    result = json.loads(out)
+    return {**harness.summarize(result["samples"], []), "size_bytes": result["size_bytes"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Media Tracker read-replica benchmark")
+    parser.add_argument("--size", default="10k", help="1k, 10k, 100k, 1m or an item count")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--page-cache", action="store_true", help="Leave the /api/media page cache on")
+    parser.add_argument("--out", type=Path, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    datagen.parse_size(args.size)
+
+    with tempfile.TemporaryDirectory(prefix="media-tracker-replica-") as tmp:
+        scratch = Path(tmp)
+        disk = _run_mode(False, args, scratch)
+        replica = _run_mode(True, args, scratch)
+        # The replica run's library: the same data the reads were timed on.
+        load = _load_ms(scratch / "replica", max(args.iterations // 5, 3))
+
+    print(harness.compare_reports(disk, replica), file=sys.stderr)
+    print(f"load into memory: p50 {load['p50_ms']:.1f} ms for {load['size_bytes'] / 1e6:.1f} MB",
+          file=sys.stderr)
+    harness.write_report({
+        "benchmark": "replica",
+        "environment": harness.environment_info(),
+        "dataset": disk["dataset"],
+        "iterations": args.iterations,
+        "page_cache": args.page_cache,
+        "disk": disk["results"],
+        "replica": replica["results"],
+        "load": load,
+    }, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Cold-start benchmark: time from launching ``run.py`` to the first answered request.
+
+Usage:
+    python -m benchmarks.startup --size 10k [--iterations 5] [--seed 42]
+                                 [--out report.json] [--baseline old.json]
+
+Each sample starts a real server process and polls ``/api/health`` until it
+answers, so interpreter start-up, imports, ``init_db()`` and the lifespan hook
+are all included. Three scenarios are measured:
+
+- ``first_run``: an empty data directory — schema creation and seeding.
+- ``slow_path``: the generated library with its schema version cleared, as
+  after an upgrade — ``init_db()`` has to inspect and migrate the database.
+- ``fast_path``: the same library with the schema version current.
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+from . import datagen, harness
+
+TIMEOUT_S = 60
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _time_to_first_request(data_dir: Path) -> float:
+    """Launch the server against ``data_dir``; return seconds until /api/health answers."""
+    port = _free_port()
+    env = dict(os.environ, MEDIA_TRACKER_DATA_DIR=str(data_dir))
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "run.py", "--no-browser", "--port", str(port)],
+        cwd=harness.REPO_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < TIMEOUT_S:
+            if proc.poll() is not None:
+                raise RuntimeError(f"server exited with status {proc.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/health", timeout=1):
+                    return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.005)
+        raise RuntimeError(f"server did not answer within {TIMEOUT_S}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def _clear_schema_version(db_path: Path) -> None:
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("PRAGMA user_version = 0")
+
+
+def run(data_dir: Path, iterations: int, warmup: int) -> dict:
+    scratch = Path(tempfile.mkdtemp(prefix="media-tracker-startup-"))
+
+    def first_run():
+        shutil.rmtree(scratch, ignore_errors=True)
+        return _time_to_first_request(scratch)
+
+    def slow_path():
+        _clear_schema_version(data_dir / "media_tracker.db")
+        return _time_to_first_request(data_dir)
+
+    def fast_path():
+        return _time_to_first_request(data_dir)
+
+    results = {}
+    try:
+        for name, fn in (("first_run", first_run), ("slow_path", slow_path), ("fast_path", fast_path)):
+            # The warm-up launch also brings the database to the current schema
+            # version, so fast_path really measures the fast path.
+            for _ in range(warmup):
+                fn()
+            latencies = [fn() * 1000 for _ in range(iterations)]
+            results[name] = harness.summarize(latencies, [])
+            print(f"{name:<12} p50 {results[name]['p50_ms']:>8.1f} ms  "
+                  f"p95 {results[name]['p95_ms']:>8.1f} ms", file=sys.stderr)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Media Tracker startup benchmark")
+    parser.add_argument("--size", default="10k", help="1k, 10k, 100k, 1m or an item count")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--data-dir", type=Path, help="Working directory (default: a temp dir)")
+    parser.add_argument("--fresh", action="store_true", help="Regenerate the cached dataset")
+    parser.add_argument("--out", type=Path, help="Write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", type=Path, help="Earlier report to compare against")
+    args = parser.parse_args()
+
+    size = datagen.parse_size(args.size)
+    data_dir, dataset = harness.prepare_data_dir(size, args.seed, args.data_dir, args.fresh)
+    print(f"Dataset: {dataset} in {data_dir}", file=sys.stderr)
+
+    results = run(data_dir, args.iterations, max(args.warmup, 1))
+
+    report = {
+        "benchmark": "startup",
+        "environment": harness.environment_info(),
+        "dataset": dataset,
+        "iterations": args.iterations,
+        "warmup": args.warmup,
+        "results": results,
+    }
+    harness.write_report(report, args.out)
+    if args.baseline:
+        print(harness.compare_reports(json.loads(args.baseline.read_text()), report), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,13 @@
-const BASE = 'http://127.0.0.1:8765/api';
+// When the app is served under /lib/<name>/ every request goes to that
+// library (see backend/libraries.py); at the root it is the default library.
+const LIBRARY_PREFIX = (location.pathname.match(/^\/lib\/[a-z0-9][a-z0-9_-]*/) || [''])[0];
+const BASE = `http://127.0.0.1:8765${LIBRARY_PREFIX}/api`;
+
+// Uploaded covers are stored as /uploads/<file>; they live in the library's
+// own uploads folder, so the prefix has to be added when displaying them.
+export function coverUrl(url) {
+  return url && url.startsWith('/uploads/') ? LIBRARY_PREFIX + url : url;
+}
 
 async function request(method, path, body = undefined) {
   const opts = {
@@ -28,12 +37,62 @@ export function getMedia(params = {}) {
   return request('GET', `/media${q ? '?' + q : ''}`);
 }
 
+// Typeahead over titles: [{id, title, category_id}], case/accent-insensitive.
+export function suggestMedia(prefix, limit = 10) {
+  const qs = new URLSearchParams({ prefix, limit });
+  return request('GET', `/media/suggest?${qs}`);
+}
+
+// Existing items whose titles look like near-duplicates of `title`.
+export function checkDuplicateTitle(title, categoryId) {
+  const qs = new URLSearchParams({ title });
+  if (categoryId) qs.set('category_id', categoryId);
+  return request('GET', `/media/duplicates/check?${qs}`);
+}
+
+// Several items by id in one request (unknown ids are left out).
+export function getMediaItems(ids) {
+  return request('GET', `/media?ids=${ids.join(',')}`).then(page => page.items);
+}
+// Where each item's uploaded cover is on one sprite sheet for the page:
+// {key, width, height, tiles: {id: {x, y, w, h}}, missing: [id]}.
+export function getCoverSprite(ids) {
+  return request('GET', `/media/sprite?ids=${ids.join(',')}`);
+}
+export function spriteUrl(key) {
+  return `${BASE}/media/sprite/${key}`;
+}
+// Items most like `id` (shared tags, genres, creators), each with
+// `similarity` and the `shared` values that matched.
+export function getSimilarMedia(id, limit = 10) {
+  return request('GET', `/media/${id}/similar?limit=${limit}`);
+}
 export function getMediaItem(id)        { return request('GET',    `/media/${id}`); }
 export function createMedia(data)       { return request('POST',   '/media', data); }
 export function updateMedia(id, data)   { return request('PUT',    `/media/${id}`, data); }
 export function deleteMedia(id)         { return request('DELETE', `/media/${id}`); }
 export function setMediaTags(id, tagIds){ return request('POST',   `/media/${id}/tags`, tagIds); }
 
+// ── Batching ───────────────────────────────────────────────────────────────
+// Several GETs (paths relative to /api) in one round-trip, all read from the
+// same database snapshot. Resolves to the bodies in order, or rejects with
+// the first failed sub-request's error.
+export async function batch(paths) {
+  const { responses } = await request('POST', '/_batch', {
+    requests: paths.map(path => ({ path: '/api' + path })),
+  });
+  return responses.map(r => {
+    if (r.status >= 400) throw new Error(r.body?.detail || `HTTP ${r.status}`);
+    return r.body;
+  });
+}
+
+// ── Smart Collections ─────────────────────────────────────────────────────
+export function getCollections()             { return request('GET',    '/collections'); }
+export function createCollection(data)       { return request('POST',   '/collections', data); }
+export function updateCollection(id, data)   { return request('PUT',    `/collections/${id}`, data); }
+export function deleteCollection(id)         { return request('DELETE', `/collections/${id}`); }
+
 // ── Categories ─────────────────────────────────────────────────────────────
 export function getCategories()           { return request('GET',    '/categories'); }
 export function createCategory(data)      { return request('POST',   '/categories', data); }
@@ -59,9 +118,27 @@ export function getFieldValues(params = {}) {
   const q = qs.toString();
   return request('GET', `/field-values${q ? '?' + q : ''}`);
 }
+// Typeahead for large lists (cast, author…): values starting with prefix.
+export function suggestFieldValues(fieldType, prefix, params = {}) {
+  const qs = new URLSearchParams({ field_type: fieldType, prefix });
+  for (const [k, v] of Object.entries(params)) {
+    if (v !== null && v !== undefined && v !== '') qs.set(k, v);
+  }
+  return request('GET', `/field-values/suggest?${qs}`);
+}
 export function createFieldValue(data)      { return request('POST',   '/field-values', data); }
 export function updateFieldValue(id, data)  { return request('PUT',    `/field-values/${id}`, data); }
 export function deleteFieldValue(id)        { return request('DELETE', `/field-values/${id}`); }
+export function mergeFieldValue(id, intoId) { return request('POST',   `/field-values/${id}/merge`, { into_id: intoId }); }
+
+// ── Change Events (SSE) ──────────────────────────────────────────────────────
+// EventSource reconnects on its own and resends the last event id, so the
+// server can replay anything missed during a brief disconnect.
+export function subscribeEvents(onChange) {
+  const source = new EventSource(`${BASE}/events`);
+  source.addEventListener('change', (e) => onChange(JSON.parse(e.data)));
+  return source;
+}
 
 // ── Cover Upload ─────────────────────────────────────────────────────────────
 export async function uploadCoverImage(file) {
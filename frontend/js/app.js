@@ -23,21 +23,24 @@ function parseHash() {
   // the library can pre-filter to that category.
   const catMatch = hash.match(/^#library\/category\/(\d+)$/);
   if (catMatch) return { view: '#library', categoryId: parseInt(catMatch[1]) };
+  // Smart collections open the library the same way: #library/collection/7.
+  const colMatch = hash.match(/^#library\/collection\/(\d+)$/);
+  if (colMatch) return { view: '#library', collectionId: parseInt(colMatch[1]) };
   return { view: hash, categoryId: null };
 }
 
 async function navigate() {
-  const { view, categoryId } = parseHash();
+  const { view, categoryId, collectionId } = parseHash();
   const content = document.getElementById('app-content');
   // Replace content with a spinner immediately so the user sees feedback
   // while the async view function fetches data from the backend.
   content.innerHTML = '<div class="loading-spinner">Loading...</div>';
 
-  updateActiveNav(view, categoryId);
+  updateActiveNav(view, categoryId, collectionId);
 
   try {
     const fn = routes[view] || renderDashboard;
-    await fn(content, { categoryId });
+    await fn(content, { categoryId, collectionId });
   } catch (err) {
     content.innerHTML = `<div class="empty-state">
       <div class="empty-state-icon">⚠️</div>
@@ -47,11 +50,14 @@ async function navigate() {
   }
 }
 
-function updateActiveNav(view, categoryId) {
+function updateActiveNav(view, categoryId, collectionId) {
   document.querySelectorAll('.nav-link').forEach(el => el.classList.remove('active'));
   if (categoryId) {
     const catLink = document.querySelector(`[data-cat-id="${categoryId}"]`);
     if (catLink) catLink.classList.add('active');
+  } else if (collectionId) {
+    const colLink = document.querySelector(`[data-collection-id="${collectionId}"]`);
+    if (colLink) colLink.classList.add('active');
   } else {
     const link = document.querySelector(`[data-view="${view.slice(1)}"]`);
     if (link) link.classList.add('active');
@@ -60,9 +66,9 @@ function updateActiveNav(view, categoryId) {
 
 // ── Sidebar Categories ────────────────────────────────────────────────────
 async function loadSidebar() {
-  state.categories = await api.getCategories();
-  state.tags = await api.getTags();
+  [state.categories, state.tags, state.collections] = await api.batch(['/categories', '/tags', '/collections']);
   renderSidebarCategories();
+  renderSidebarCollections();
 }
 
 function renderSidebarCategories() {
@@ -78,22 +84,87 @@ function renderSidebarCategories() {
   `).join('');
 }
 
+// Smart collections with their live item counts (kept current by the backend
+// on every write, so refreshing them is a single cheap request).
+function renderSidebarCollections() {
+  const container = document.getElementById('sidebar-collections');
+  container.innerHTML = state.collections.length
+    ? state.collections.map(c => `
+      <a href="#library/collection/${c.id}"
+         class="nav-link"
+         data-collection-id="${c.id}">
+        <span class="nav-icon">${c.icon}</span>
+        <span>${c.name}</span>
+        <span style="margin-left:auto;font-size:11px;color:var(--text-muted)">${c.item_count}</span>
+      </a>
+    `).join('')
+    : '<div class="nav-hint">Filter the library, then "Save as Collection".</div>';
+}
+
 // ── Event Listeners ───────────────────────────────────────────────────────
+// Timestamp of this tab's own last save; see applyRemoteChanges().
+let lastLocalChange = 0;
+
 bus.addEventListener('media-saved', async () => {
+  lastLocalChange = Date.now();
   await loadSidebar();
   navigate();
 });
 
 bus.addEventListener('media-deleted', async () => {
+  lastLocalChange = Date.now();
+  await loadSidebar();
+  navigate();
+});
+
+bus.addEventListener('collections-changed', async () => {
+  lastLocalChange = Date.now();
   await loadSidebar();
   navigate();
 });
 
 bus.addEventListener('categories-changed', async () => {
+  lastLocalChange = Date.now();
   await loadSidebar();
   navigate();
 });
 
+// ── Live Updates ──────────────────────────────────────────────────────────
+// Changes made in other tabs or on other devices arrive over /api/events.
+// A burst of events (e.g. several quick edits) is coalesced into one refresh.
+let remoteTimer = null;
+const pendingKinds = new Set(); // 'media' | 'tag' | 'category' | 'field_value' | 'collection' | 'resync'
+
+function onRemoteChange(evt) {
+  pendingKinds.add(evt.type === 'resync' ? 'resync' : evt.type.split('.')[0]);
+  clearTimeout(remoteTimer);
+  remoteTimer = setTimeout(applyRemoteChanges, 300);
+}
+
+async function applyRemoteChanges() {
+  const kinds = new Set(pendingKinds);
+  pendingKinds.clear();
+  // The SSE echo of this tab's own save arrives right after the bus listeners
+  // above have already refreshed everything; skip it.
+  if (Date.now() - lastLocalChange < 1500) return;
+
+  const all = kinds.has('resync');
+  if (all || kinds.has('tag')) state.tags = await api.getTags();
+  if (all || kinds.has('category') || kinds.has('media')) {
+    // Sidebar item counts change with every media create/delete/move.
+    state.categories = await api.getCategories();
+    renderSidebarCategories();
+  }
+  if (all || kinds.has('collection') || kinds.has('media') || kinds.has('tag') || kinds.has('field_value')) {
+    // Any write can move items into or out of a collection.
+    state.collections = await api.getCollections();
+    renderSidebarCollections();
+  }
+  // Never re-render underneath an open modal — it would discard the edit.
+  const modalOpen = !document.getElementById('modal-overlay').classList.contains('hidden');
+  if (!modalOpen) navigate();
+}
+
 // ── Init ──────────────────────────────────────────────────────────────────
 async function init() {
   await loadSidebar();
@@ -101,6 +172,8 @@ async function init() {
   window.addEventListener('hashchange', navigate);
   navigate();
 
+  api.subscribeEvents(onRemoteChange);
+
   // modal.js is imported dynamically (lazily) to break the circular dependency:
   // app.js → modal.js → state.js → (back) is fine, but a static import of
   // modal.js at the top of app.js would create a cycle during module resolution.
@@ -68,19 +68,14 @@ export async function openModal(itemId, defaultCategoryId = null) {
   const title   = document.getElementById('modal-title');
   const body    = document.getElementById('modal-body');
 
-  // Load tags and all field values fresh
-  [allTags] = await Promise.all([
-    api.getTags(),
-    loadFieldValueCache(),
-  ]);
-
-  let item = null;
-  if (itemId) {
-    item = await api.getMediaItem(itemId);
-    title.textContent = 'Edit Media';
-  } else {
-    title.textContent = 'Add Media';
-  }
+  // Load tags, all field values and (when editing) the item fresh, in one
+  // batched round-trip read from a single snapshot.
+  const paths = ['/tags', '/field-values'];
+  if (itemId) paths.push(`/media/${itemId}`);
+  const [tags, allValues, item = null] = await api.batch(paths);
+  allTags = tags;
+  indexFieldValues(allValues);
+  title.textContent = itemId ? 'Edit Media' : 'Add Media';
 
   formState = {
     id: item?.id || null,
@@ -144,20 +139,15 @@ export async function openModal(itemId, defaultCategoryId = null) {
   document.getElementById('modal-save-btn').addEventListener('click', () => saveForm(itemId));
 }
 
-async function loadFieldValueCache() {
-  // Fetch all field values in a single request and index them locally by
+function indexFieldValues(allValues) {
+  // All field values arrive in a single request; index them locally by
   // composite key "fieldType|categoryId" (e.g. "genre|3", "director|null").
   // This avoids a separate API call for each form field when the modal opens.
-  try {
-    const allValues = await api.getFieldValues();
-    fieldValueCache = {};
-    for (const fv of allValues) {
-      const key = `${fv.field_type}|${fv.category_id ?? 'null'}`;
-      if (!fieldValueCache[key]) fieldValueCache[key] = [];
-      fieldValueCache[key].push(fv.value);
-    }
-  } catch (e) {
-    fieldValueCache = {};
+  fieldValueCache = {};
+  for (const fv of allValues) {
+    const key = `${fv.field_type}|${fv.category_id ?? 'null'}`;
+    if (!fieldValueCache[key]) fieldValueCache[key] = [];
+    fieldValueCache[key].push(fv.value);
   }
 }
 
@@ -208,7 +198,7 @@ function buildForm() {
       <label class="form-label">Cover Image</label>
       <div class="cover-upload-group">
         ${formState.cover_image_url
-          ? `<img class="cover-preview" id="cover-preview" src="${esc(formState.cover_image_url)}" alt="Cover">`
+          ? `<img class="cover-preview" id="cover-preview" src="${esc(api.coverUrl(formState.cover_image_url))}" alt="Cover">`
           : `<img class="cover-preview hidden" id="cover-preview" alt="Cover">`
         }
         <div class="cover-upload-controls">
@@ -260,7 +250,7 @@ function initCoverUpload(body) {
     try {
       const result = await api.uploadCoverImage(file);
       formState.cover_image_url = result.url;
-      preview.src = result.url;
+      preview.src = api.coverUrl(result.url);
       preview.classList.remove('hidden');
       filename.textContent = file.name;
     } catch (err) {
@@ -455,6 +445,16 @@ async function saveForm(itemId) {
     }
   });
 
+  // Warn before adding something that looks like an item already in the
+  // library. A failed check must not block saving, so errors are ignored.
+  if (!itemId) {
+    const similar = await api.checkDuplicateTitle(title, category_id).catch(() => []);
+    if (similar.length) {
+      const list = similar.map(m => `• ${m.title}`).join('\n');
+      if (!confirm(`Similar titles are already in your library:\n${list}\n\nAdd anyway?`)) return;
+    }
+  }
+
   const data = {
     title,
     category_id,
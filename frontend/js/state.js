@@ -4,6 +4,7 @@
 export const state = {
   categories: [],
   tags: [],
+  collections: [],
 };
 
 export const bus = new EventTarget();
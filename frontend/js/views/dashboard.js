@@ -13,7 +13,12 @@ const STATUS_COLORS = {
 };
 
 export async function renderDashboard(container) {
-  const [stats, recent] = await Promise.all([api.getStats(), api.getRecent()]);
+  const [stats, recent, activity] = await api.batch(
+    ['/stats/overview', '/stats/recent', '/stats/timeseries?bucket=month&periods=12']);
+  // "More like" the most recently owned item; a failure just hides the section.
+  const similar = recent.length > 0
+    ? await api.getSimilarMedia(recent[0].id, 6).catch(() => [])
+    : [];
 
   // maxCat is the largest category count, used to scale bar widths to 100%.
   // Math.max(1, ...) prevents division by zero when all categories are empty.
@@ -58,6 +63,13 @@ export async function renderDashboard(container) {
       </div>
       ` : ''}
 
+      ${activity.series.some(p => p.items_added || p.items_owned || p.ratings_given) ? `
+      <div class="dashboard-section">
+        <h2>Activity — Last 12 Months</h2>
+        ${activityChart(activity.series)}
+      </div>
+      ` : ''}
+
       ${/* The Ratings section is only shown when avg_rating > 0, which only
            happens if the backend's numeric AVG() is non-null. With string-based
            letter grades this section is currently hidden; it will appear once a
@@ -96,6 +108,15 @@ export async function renderDashboard(container) {
       </div>
       ` : ''}
 
+      ${similar.length > 0 ? `
+      <div class="dashboard-section">
+        <h2>More Like ${esc(recent[0].title)}</h2>
+        <div class="recent-grid">
+          ${similar.map(item => recentCard(item, item.shared.join(' · '))).join('')}
+        </div>
+      </div>
+      ` : ''}
+
       ${stats.total_items === 0 ? `
       <div class="empty-state" style="padding:60px 0">
         <div class="empty-state-icon">🗂️</div>
@@ -112,9 +133,41 @@ export async function renderDashboard(container) {
   });
 }
 
-function recentCard(item) {
+const ACTIVITY_SERIES = [
+  ['items_added',   'Added', '#818cf8'],
+  ['items_owned',   'Owned', '#4ade80'],
+  ['ratings_given', 'Rated', '#f59e0b'],
+];
+
+function activityChart(series) {
+  // One group of three bars per month, scaled to the largest count shown.
+  const max = Math.max(1, ...series.flatMap(p => ACTIVITY_SERIES.map(([key]) => p[key])));
+  const month = start => new Date(start + 'T00:00:00').toLocaleString(undefined, { month: 'short' });
+  return `
+    <div class="activity-chart">
+      ${series.map(p => `
+        <div class="activity-period">
+          <div class="activity-bars">
+            ${ACTIVITY_SERIES.map(([key, label, color]) => `
+              <div class="activity-bar" title="${label}: ${p[key]}"
+                   style="height:${Math.round(p[key] / max * 100)}%; background:${color}"></div>
+            `).join('')}
+          </div>
+          <div class="activity-label">${month(p.period_start)}</div>
+        </div>
+      `).join('')}
+    </div>
+    <div class="activity-legend">
+      ${ACTIVITY_SERIES.map(([, label, color]) => `
+        <span><span class="activity-swatch" style="background:${color}"></span>${label}</span>
+      `).join('')}
+    </div>
+  `;
+}
+
+function recentCard(item, note = '') {
   const cover = item.cover_image_url
-    ? `<img class="card-cover" src="${item.cover_image_url}" alt="${esc(item.title)}" onerror="this.style.display='none';this.nextElementSibling.style.display='flex'">`
+    ? `<img class="card-cover" src="${api.coverUrl(item.cover_image_url)}" alt="${esc(item.title)}" onerror="this.style.display='none';this.nextElementSibling.style.display='flex'">`
     : '';
   return `
     <div class="media-card" data-item-id="${item.id}" style="cursor:pointer">
@@ -125,6 +178,7 @@ function recentCard(item) {
       <div class="card-body">
         <div class="card-title">${esc(item.title)}</div>
         <div>${renderStars(item.rating || 0, true)}</div>
+        ${note ? `<div class="card-note">${esc(note)}</div>` : ''}
       </div>
     </div>
   `;
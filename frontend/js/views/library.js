@@ -19,6 +19,7 @@ const STATUS_LABELS = {
 let currentFilters = {
   q: '',
   category_id: null,
+  collection_id: null,
   status: null,
   rating: null,
   sort_by: 'created_at',
@@ -36,19 +37,31 @@ export async function renderLibrary(container, opts = {}) {
   } else if (!location.hash.includes('category')) {
     currentFilters.category_id = null;
   }
+  // A smart collection replaces the category; its own rules already apply.
+  currentFilters.collection_id = opts.collectionId || null;
 
   currentFilters.offset = 0;
 
-  const catName = opts.categoryId
-    ? (state.categories.find(c => c.id === opts.categoryId)?.name || 'Library')
-    : 'All Media';
+  const collection = opts.collectionId
+    ? state.collections.find(c => c.id === opts.collectionId)
+    : null;
+  const catName = collection
+    ? collection.name
+    : opts.categoryId
+      ? (state.categories.find(c => c.id === opts.categoryId)?.name || 'Library')
+      : 'All Media';
 
   container.innerHTML = `
     <div class="page-header">
       <div>
-        <div class="page-title">${catName}</div>
+        <div class="page-title">${esc(catName)}</div>
+      </div>
+      <div style="display:flex;gap:8px">
+        ${collection
+          ? '<button class="btn btn-secondary" id="delete-collection-btn">Delete Collection</button>'
+          : '<button class="btn btn-secondary" id="save-collection-btn">Save as Collection</button>'}
+        <button class="btn btn-primary" id="add-btn">+ Add Media</button>
       </div>
-      <button class="btn btn-primary" id="add-btn">+ Add Media</button>
     </div>
 
     <div class="library-toolbar">
@@ -87,6 +100,38 @@ export async function renderLibrary(container, opts = {}) {
     openModal(null, opts.categoryId);
   });
 
+  // Save the current filters as a smart collection in the sidebar.
+  container.querySelector('#save-collection-btn')?.addEventListener('click', async () => {
+    const name = prompt('Name for this collection:');
+    if (!name || !name.trim()) return;
+    const rules = {};
+    for (const key of ['category_id', 'status', 'rating', 'q']) {
+      if (currentFilters[key]) rules[key] = currentFilters[key];
+    }
+    try {
+      const created = await api.createCollection({ name: name.trim(), rules });
+      showToast(`Saved "${created.name}" (${created.item_count} items)`, 'success');
+      // pushState does not fire hashchange; the event below reloads the
+      // sidebar first and then navigates once, to the new collection.
+      history.pushState(null, '', `#library/collection/${created.id}`);
+      bus.dispatchEvent(new Event('collections-changed'));
+    } catch (err) {
+      showToast(err.message, 'error');
+    }
+  });
+
+  container.querySelector('#delete-collection-btn')?.addEventListener('click', async () => {
+    if (!confirm(`Delete the collection "${collection.name}"? Its items are not deleted.`)) return;
+    try {
+      await api.deleteCollection(collection.id);
+      showToast('Collection deleted', 'success');
+      history.pushState(null, '', '#library');
+      bus.dispatchEvent(new Event('collections-changed'));
+    } catch (err) {
+      showToast(err.message, 'error');
+    }
+  });
+
   // Debounced search: wait 300 ms after the user stops typing before fetching,
   // so we don't fire an API request on every single keystroke.
   container.querySelector('#search-input').addEventListener('input', (e) => {
@@ -180,6 +225,7 @@ async function loadItems(container) {
 
   const params = { ...currentFilters };
   if (!params.category_id) delete params.category_id;
+  if (!params.collection_id) delete params.collection_id;
   if (!params.status) delete params.status;
   if (!params.rating) delete params.rating;
   if (!params.q) delete params.q;
@@ -198,7 +244,8 @@ async function loadItems(container) {
 
   let html = '';
   if (viewMode === 'grid') {
-    html = `<div class="media-grid">${data.items.map(gridCard).join('')}</div>`;
+    const sprite = await loadCoverSprite(data.items);
+    html = `<div class="media-grid">${data.items.map(item => gridCard(item, sprite)).join('')}</div>`;
   } else {
     html = `<div class="media-list">${data.items.map(listRow).join('')}</div>`;
   }
@@ -306,14 +353,56 @@ function getSecondaryInfo(item) {
   return parts.join(' · ');
 }
 
-function gridCard(item) {
+// One sheet with every uploaded cover on the page (see backend/sprites.py),
+// so the grid makes one image request instead of one per card. Resolves to
+// null when there is nothing to pack or the sheet can't be had; the cards
+// then load their covers individually.
+async function loadCoverSprite(items) {
+  const ids = items.filter(i => (i.cover_image_url || '').startsWith('/uploads/')).map(i => i.id);
+  if (!ids.length) return null;
+  try {
+    const sprite = await api.getCoverSprite(ids);
+    if (Object.keys(sprite.tiles).length) {
+      // Loaded before the grid is drawn: a background image has no onerror
+      // to fall back on.
+      await new Promise((resolve, reject) => {
+        const img = new Image();
+        img.onload = resolve;
+        img.onerror = reject;
+        img.src = api.spriteUrl(sprite.key);
+      });
+    }
+    return sprite;
+  } catch {
+    return null;
+  }
+}
+
+function spriteStyle(sprite, tile) {
+  // Scale the sheet so one tile fills the element, then shift it into view.
+  // Percentage positions are relative to (sheet - tile), hence the guards.
+  const px = sprite.width > tile.w ? tile.x / (sprite.width - tile.w) * 100 : 0;
+  const py = sprite.height > tile.h ? tile.y / (sprite.height - tile.h) * 100 : 0;
+  return `background-image:url(${api.spriteUrl(sprite.key)});`
+    + `background-size:${sprite.width / tile.w * 100}% ${sprite.height / tile.h * 100}%;`
+    + `background-position:${px}% ${py}%`;
+}
+
+function gridCard(item, sprite = null) {
   const aspect = getCoverAspectClass(item);
-  const cover = item.cover_image_url
+  const tile = sprite && sprite.tiles[item.id];
+  // Listed as missing: the uploaded file is gone, so go straight to the placeholder.
+  const missing = sprite && sprite.missing.includes(item.id);
+  let cover = '';
+  if (tile) {
+    cover = `<div class="card-cover card-cover--${aspect} card-cover--sprite" role="img"
+                 aria-label="${esc(item.title)}" style="${spriteStyle(sprite, tile)}"></div>`;
+  } else if (item.cover_image_url && !missing) {
     // onerror: if the uploaded image file is missing or the URL is broken,
     // hide the <img> and show the sibling placeholder (category icon) instead.
-    ? `<img class="card-cover card-cover--${aspect}" src="${item.cover_image_url}" alt="${esc(item.title)}"
-           onerror="this.style.display='none';this.nextElementSibling.style.display='flex'">`
-    : '';
+    cover = `<img class="card-cover card-cover--${aspect}" src="${api.coverUrl(item.cover_image_url)}" alt="${esc(item.title)}"
+           onerror="this.style.display='none';this.nextElementSibling.style.display='flex'">`;
+  }
   const creator = getPrimaryCreator(item);
   const secondary = getSecondaryInfo(item);
   const tagChips = item.tags && item.tags.length
@@ -324,7 +413,7 @@ function gridCard(item) {
   return `
     <div class="media-card" data-item-id="${item.id}">
       ${cover}
-      <div class="card-cover-placeholder card-cover--${aspect}" ${item.cover_image_url ? 'style="display:none"' : ''}>
+      <div class="card-cover-placeholder card-cover--${aspect}" ${cover ? 'style="display:none"' : ''}>
         ${item.category_icon}
       </div>
       <div class="card-menu">
@@ -352,7 +441,7 @@ function listRow(item) {
   const aspect = getCoverAspectClass(item);
   const thumbClass = `list-thumb list-thumb--${aspect}`;
   const thumb = item.cover_image_url
-    ? `<div class="${thumbClass}"><img src="${item.cover_image_url}" alt="" onerror="this.parentNode.innerHTML='${item.category_icon}'"></div>`
+    ? `<div class="${thumbClass}"><img src="${api.coverUrl(item.cover_image_url)}" alt="" onerror="this.parentNode.innerHTML='${item.category_icon}'"></div>`
     : `<div class="${thumbClass}">${item.category_icon}</div>`;
   const creator = getPrimaryCreator(item);
   const secondary = getSecondaryInfo(item);
@@ -253,7 +253,7 @@ async function loadPanel(container, fieldType, categoryId, label) {
     // scoped=true tells the backend to filter strictly by category_id,
     // including NULL (shared lists). Without scoped, all values for the
     // field_type would be returned regardless of category.
-    const params = { field_type: fieldType, scoped: true };
+    const params = { field_type: fieldType, scoped: true, with_counts: true };
     if (categoryId !== null) params.category_id = categoryId;
     const values = await api.getFieldValues(params);
 
@@ -272,6 +272,7 @@ function renderPanel(panel, fieldType, categoryId, label, values, container) {
   const rows = values.map(fv => `
     <div class="settings-value-row" data-fv-id="${fv.id}">
       <span class="settings-value-display">${esc(fv.value)}</span>
+      <span class="settings-value-usage">${fv.usage_count ?? 0} item${fv.usage_count !== 1 ? 's' : ''}</span>
       <input class="form-input settings-value-input hidden"
              value="${esc(fv.value)}"
              style="flex:1;padding:4px 8px;font-size:13px">
@@ -392,9 +393,23 @@ async function handleSaveRename(btn, panel, fieldType, categoryId, label, contai
   const row = btn.closest('.settings-value-row');
   const newValue = row.querySelector('.settings-value-input').value.trim();
   if (!newValue) return;
+
+  // Renaming onto another value in this list is a merge: its items are
+  // moved over and this value is deleted.
+  const target = [...panel.querySelectorAll('.settings-value-row')].find(r =>
+    parseInt(r.dataset.fvId) !== fvId &&
+    r.querySelector('.settings-value-display').textContent.trim() === newValue);
   try {
-    await api.updateFieldValue(fvId, { value: newValue });
-    showToast('Renamed successfully', 'success');
+    if (target) {
+      const oldValue = row.querySelector('.settings-value-display').textContent.trim();
+      if (!confirm(`"${newValue}" already exists. Merge "${oldValue}" into it?`)) return;
+      await api.mergeFieldValue(fvId, parseInt(target.dataset.fvId));
+      showToast(`Merged into "${newValue}"`, 'success');
+    } else {
+      const updated = await api.updateFieldValue(fvId, { value: newValue });
+      const n = updated.usage_count || 0;
+      showToast(n ? `Renamed — ${n} item${n !== 1 ? 's' : ''} updated` : 'Renamed successfully', 'success');
+    }
     await reloadPanel(panel, fieldType, categoryId, label, container);
   } catch (err) {
     showToast(err.message || 'Failed to rename', 'error');
@@ -405,7 +420,7 @@ async function handleSaveRename(btn, panel, fieldType, categoryId, label, contai
 
 async function reloadPanel(panel, fieldType, categoryId, label, container) {
   try {
-    const params = { field_type: fieldType, scoped: true };
+    const params = { field_type: fieldType, scoped: true, with_counts: true };
     if (categoryId !== null) params.category_id = categoryId;
     const values = await api.getFieldValues(params);
     renderPanel(panel, fieldType, categoryId, label, values, container);
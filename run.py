@@ -4,15 +4,21 @@ Media Tracker — Entry Point
 Starts the FastAPI server and opens the system browser.
 
 Usage:
-    python run.py [--port 8765] [--no-browser]
+    python run.py [--port 8765] [--no-browser] [--workers N] [--metrics]
+                  [--slow-query-ms 100] [--kiosk] [--log-level info]
+    python run.py rebuild-rollups [--library NAME]
+    python run.py backup [--out FILE] [--library NAME]
+    python run.py restore ARCHIVE [--verify-only] [--library NAME]
+    python run.py maintain [--only analyze,vacuum] [--library NAME]
 """
 import argparse
+import json
+import os
+import shutil
 import sys
 import time
 import threading
-import webbrowser
-import urllib.request
-import urllib.error
+import uuid
 
 import uvicorn
 
@@ -20,57 +26,222 @@ HOST = "127.0.0.1"
 DEFAULT_PORT = 8765
 
 
-def wait_for_server(url: str, timeout: int = 15) -> bool:
-    """Poll the given URL until it responds or timeout elapses.
+def wait_for_server(url: str, timeout: int = 15, workers: int = 1) -> bool:
+    """Poll the health endpoint until every worker is ready or timeout elapses.
 
-    Uses the stats overview endpoint as a health check because it exercises
-    the database layer, confirming the app is fully ready (not just bound).
+    /api/health runs a database query, confirming the app is fully ready (not
+    just bound), and reports how many worker processes have finished startup.
+    With several workers any one of them may answer, so the count — not the
+    mere response — decides readiness.
     """
+    # Imported here rather than at module level: only the readiness check
+    # needs the HTTP client, and it is not on the server's startup path.
+    import urllib.request
+
     deadline = time.time() + timeout
     while time.time() < deadline:
         try:
-            urllib.request.urlopen(url, timeout=1)
-            return True
+            with urllib.request.urlopen(url, timeout=1) as resp:
+                body = json.load(resp)
+            if body.get("workers", {}).get("ready", 0) >= workers:
+                return True
         except Exception:
-            time.sleep(0.3)
+            pass
+        time.sleep(0.3)
     return False
 
 
-def run_server(port: int):
+def run_server(port: int, log_level: str = "warning", workers: int = 1):
     uvicorn.run(
         "backend.main:app",
         host=HOST,
         port=port,
-        # Suppress info-level request logs to keep the console clean for users.
-        log_level="warning",
+        # With workers > 1 uvicorn supervises that many processes sharing the
+        # listening socket; they all open the same WAL-mode database.
+        workers=workers,
+        # The app serves no WebSocket routes (live updates use SSE), so skip
+        # loading a WebSocket implementation at startup.
+        ws="none",
+        # Defaults to "warning" to suppress info-level request logs and keep
+        # the console clean for users; --log-level overrides it when debugging.
+        log_level=log_level,
         # reload=True is for development only; keep it off so the server
         # doesn't watch files and restart unexpectedly in production.
         reload=False,
     )
 
 
+def open_library(name: str, create: bool = False):
+    """The library a command works on; exits with a message for unknown names."""
+    from backend import libraries
+    try:
+        return libraries.open_library(name, create=create)
+    except libraries.LibraryNotFound as e:
+        sys.exit(str(e))
+
+
+def rebuild_rollups(library: str):
+    """Recompute the dashboard's activity rollups from the media items."""
+    from backend import libraries, rollups
+    from backend.database import init_db
+    lib = open_library(library)
+    init_db(lib.engine)
+    with lib.SessionLocal() as db:
+        rows = rollups.rebuild(db)
+        db.commit()
+    libraries.close(lib)
+    print(f"Rebuilt activity rollups: {rows} rows.")
+
+
+def backup(out: str | None, library: str):
+    """Write a backup archive; safe while the server is running."""
+    from backend import backup, libraries
+    from backend.database import init_db
+    lib = open_library(library)
+    init_db(lib.engine)
+    try:
+        result = backup.create_backup(out, lib)
+    finally:
+        libraries.close(lib)
+    print(f"Backed up {result['items']} items and {len(result['uploads'])} covers "
+          f"to {result['path']} ({result['size_bytes'] / 1e6:.1f} MB, {result['total_ms'] / 1000:.1f}s).")
+    if result["missing_uploads"]:
+        print(f"Note: {result['missing_uploads']} referenced covers were already missing.")
+
+
+def restore(archive: str | None, verify_only: bool, library: str):
+    """Verify an archive and, unless --verify-only, restore it. Stop the server first."""
+    from backend import backup, libraries
+    if not archive:
+        sys.exit("Usage: python run.py restore ARCHIVE [--verify-only] [--library NAME]")
+    try:
+        if verify_only:
+            manifest = backup.verify_backup(archive)
+            print(f"OK: {manifest['items']} items and {len(manifest['uploads'])} covers "
+                  f"from {manifest['created_at']}.")
+            return
+        # Restoring into a library that does not exist yet creates it.
+        lib = open_library(library, create=True)
+        try:
+            result = backup.restore_backup(archive, library=lib)
+        finally:
+            libraries.close(lib)
+    except backup.BackupError as e:
+        sys.exit(f"Backup not usable, nothing was changed: {e}")
+    print(f"Restored {result['restored_items']} items and {len(result['uploads'])} covers "
+          f"from {result['created_at']}.")
+    if result["previous_library_backup"]:
+        print(f"The previous library was saved to {result['previous_library_backup']}.")
+
+
+def maintain(library: str, only: str | None):
+    """Run database maintenance now, whether due or not; safe while serving."""
+    from backend import libraries, maintenance
+    from backend.database import init_db
+    tasks = [t.strip() for t in only.split(",")] if only else list(maintenance.TASKS)
+    unknown = set(tasks) - set(maintenance.TASKS)
+    if unknown:
+        sys.exit(f"Unknown task(s): {', '.join(sorted(unknown))}; choose from {', '.join(maintenance.TASKS)}")
+    lib = open_library(library)
+    init_db(lib.engine)
+    try:
+        outcomes = maintenance.run(lib, tasks, force=True)
+    finally:
+        libraries.close(lib)
+    for task, outcome in outcomes.items():
+        details = {k: v for k, v in outcome.items() if k not in ("reason", "duration_ms")}
+        took = f" in {outcome['duration_ms']:.0f} ms" if "duration_ms" in outcome else ""
+        print(f"{task}{took}: {json.dumps(details)}")
+
+
 def main():
     parser = argparse.ArgumentParser(description="Media Tracker")
+    parser.add_argument("command", nargs="?", default="serve",
+                        choices=["serve", "rebuild-rollups", "backup", "restore", "maintain"],
+                        help="What to do (default: serve)")
+    parser.add_argument("archive", nargs="?", help="Backup archive to restore")
+    parser.add_argument("--out", help="backup: archive path (default: data/backups/<timestamp>.tar.gz)")
+    parser.add_argument("--verify-only", action="store_true",
+                        help="restore: only check the archive, change nothing")
+    parser.add_argument("--only", help="maintain: comma-separated tasks (default: all)")
+    parser.add_argument("--library", default="default",
+                        help="rebuild-rollups/backup/restore/maintain: which library (default: the default library)")
     parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
     parser.add_argument("--no-browser", action="store_true", help="Don't open the browser")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes (default 1)")
+    parser.add_argument("--metrics", action="store_true",
+                        help="Enable request/SQL instrumentation at /api/_metrics and Server-Timing headers")
+    parser.add_argument("--slow-query-ms", type=float,
+                        help="Log statements slower than this many ms with their query plan (0 disables; default 100)")
+    parser.add_argument("--kiosk", action="store_true",
+                        help="Read-only: serve from an in-memory copy of the library, refreshed as it changes on disk")
+    parser.add_argument("--log-level", default="warning",
+                        choices=["critical", "error", "warning", "info", "debug", "trace"],
+                        help="Uvicorn log level")
     args = parser.parse_args()
 
+    if args.command == "rebuild-rollups":
+        rebuild_rollups(args.library)
+        return
+    if args.command == "backup":
+        backup(args.out, args.library)
+        return
+    if args.command == "restore":
+        restore(args.archive, args.verify_only, args.library)
+        return
+    if args.command == "maintain":
+        maintain(args.library, args.only)
+        return
+
+    if args.metrics:
+        # Read by backend.metrics at import time, which happens when uvicorn
+        # imports backend.main inside run_server().
+        os.environ["MEDIA_TRACKER_METRICS"] = "1"
+    if args.slow_query_ms is not None:
+        os.environ["MEDIA_TRACKER_SLOW_QUERY_MS"] = str(args.slow_query_ms)
+    if args.kiosk:
+        os.environ["MEDIA_TRACKER_READ_REPLICA"] = "1"
+    # Identifies this launch so workers' readiness markers from earlier runs
+    # are never counted (see backend/workers.py).
+    os.environ["MEDIA_TRACKER_BOOT_ID"] = uuid.uuid4().hex
+    os.environ["MEDIA_TRACKER_WORKERS"] = str(args.workers)
+
     url = f"http://{HOST}:{args.port}"
-    print(f"Starting Media Tracker at {url}")
+    print(f"Starting Media Tracker at {url}"
+          + (f" with {args.workers} workers" if args.workers > 1 else ""))
+
+    try:
+        if args.workers > 1:
+            run_multi_worker(args, url)
+        else:
+            run_single(args, url)
+    finally:
+        from backend.workers import run_dir
+        shutil.rmtree(run_dir(os.environ["MEDIA_TRACKER_BOOT_ID"]), ignore_errors=True)
+
+
+def announce_when_ready(url: str, workers: int, open_browser: bool):
+    print("Waiting for server to start...")
+    if wait_for_server(f"{url}/api/health", timeout=15 + 2 * workers, workers=workers):
+        if workers > 1:
+            print(f"All {workers} workers ready.")
+        if open_browser:
+            import webbrowser
+            print("Opening browser...")
+            webbrowser.open(url)
+    else:
+        print(f"Server took too long to start. Open {url} manually.")
 
+
+def run_single(args, url: str):
     # Run the server in a daemon thread so it dies automatically when the main
     # thread exits (e.g. after Ctrl+C), without needing an explicit shutdown call.
-    thread = threading.Thread(target=run_server, args=(args.port,), daemon=True)
+    thread = threading.Thread(target=run_server, args=(args.port, args.log_level), daemon=True)
     thread.start()
 
     if not args.no_browser:
-        health_url = f"{url}/api/stats/overview"
-        print("Waiting for server to start...")
-        if wait_for_server(health_url):
-            print("Opening browser...")
-            webbrowser.open(url)
-        else:
-            print(f"Server took too long to start. Open {url} manually.")
+        announce_when_ready(url, 1, open_browser=True)
 
     print("Press Ctrl+C to stop.")
     try:
@@ -82,5 +253,23 @@ def main():
         sys.exit(0)
 
 
+def run_multi_worker(args, url: str):
+    # Create and seed the database once, here, before any worker starts:
+    # N workers racing through first-run seeding would each insert the
+    # built-in categories. Each worker's own init_db() then finds it done.
+    from backend.database import init_db
+    init_db()
+
+    # Uvicorn's process supervisor installs signal handlers, which only works
+    # in the main thread — so here the server owns the main thread and the
+    # readiness check / browser launch runs in the helper thread instead.
+    threading.Thread(
+        target=announce_when_ready, args=(url, args.workers, not args.no_browser), daemon=True,
+    ).start()
+    print("Press Ctrl+C to stop.")
+    run_server(args.port, args.log_level, args.workers)
+    print("\nMedia Tracker stopped.")
+
+
 if __name__ == "__main__":
     main()